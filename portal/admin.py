@@ -1,9 +1,11 @@
 import logging
-from time import sleep
 
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
+from django.urls import reverse
+from django.utils.html import format_html
 
+from portal import discord_sync, tasks
 from portal.models import (
     Enrollment,
     Meeting,
@@ -38,21 +40,27 @@ def make_approved(modeladmin, request, queryset):
     queryset.update(is_approved=True)
 
 
-@admin.action(description="Sync roles and channels on Discord")
+@admin.action(description="Sync roles on Discord")
 def sync_discord(modeladmin, request, queryset):
     semester = Semester.get_active()
-
-    for object in queryset:
-        try:
-            object.sync_discord(semester)
-            logger.info(f"Synced Discord roles and channels for project {object}")
-        except Exception as err:
-            logger.exception(
-                "Failed to sync Discord roles and channels for {object}", exc_info=err
-            )
-        print("Sleeping")
-        sleep(1)
-        print("Awake")
+    if semester is None:
+        modeladmin.message_user(
+            request, "There is no active semester to sync.", messages.ERROR
+        )
+        return
+
+    job = discord_sync.create_discord_sync_job(
+        semester, list(queryset.values_list("pk", flat=True))
+    )
+    tasks.run_discord_sync.delay(job["id"])
+    modeladmin.message_user(
+        request,
+        format_html(
+            'Syncing Discord roles in the background. <a href="{}?job={}">View progress</a>',
+            reverse("discord_admin_sync"),
+            job["id"],
+        ),
+    )
 
 
 @admin.action(description="Mark selected as published")
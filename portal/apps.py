@@ -5,3 +5,14 @@ class PortalConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "portal"
     verbose_name = "RCOS IO Portal"
+
+    def ready(self):
+        # Connect signal handlers defined outside of models.py
+        from portal import (  # noqa: F401
+            attendance,
+            attendance_codes,
+            cache,
+            contributions,
+            search,
+            small_groups,
+        )
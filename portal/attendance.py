@@ -0,0 +1,264 @@
+"""This module contains the semester attendance matrix, a compact rollup of every student's attendance
+at every meeting they are expected to attend in a semester."""
+
+from array import array
+from collections.abc import Iterable, Iterator
+from typing import TypedDict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from portal.cache import (
+    format_tagged_key,
+    invalidate_tags,
+    tag_version_key,
+    tagged_get_or_set,
+)
+from portal.models import Enrollment, Meeting, MeetingAttendance, User
+
+NOT_ATTENDED = 0
+NEEDS_VERIFICATION = 1
+ATTENDED = 2
+
+GROUP_MEETING_TYPES = (Meeting.SMALL_GROUP, Meeting.LARGE_GROUP)
+EXPECTED_MEETING_TYPES = (*GROUP_MEETING_TYPES, Meeting.WORKSHOP)
+
+MATRIX_CACHE_TIMEOUT = 60 * 60
+"""How long a matrix lives in the cache. Attendance changes update the cached matrix in place,
+so this only bounds how long a missed update (e.g. a bulk delete that skips signals) can linger."""
+
+
+def matrix_cache_key(semester_id: str):
+    return f"semester_attendance_matrix:{semester_id}"
+
+
+def matrix_tag(semester_id: str):
+    return f"semester_attendance_matrix:{semester_id}"
+
+
+class AttendanceTotals(TypedDict):
+    group_meetings_total: int
+    group_meetings_attended: int
+    workshops_total: int
+    workshops_attended: int
+
+
+class SemesterAttendanceMatrix:
+    """A user x meeting grid of attendance statuses for a semester.
+
+    Each cell is one byte (`NOT_ATTENDED`, `NEEDS_VERIFICATION`, or `ATTENDED`) stored row-major in a
+    single `bytearray`. Per-user and per-meeting attended counts are kept alongside the grid and adjusted
+    whenever a cell changes, so totals never require rescanning the grid.
+    """
+
+    def __init__(
+        self,
+        semester_id: str,
+        meetings: list[tuple[int, str, bool]],
+        user_ids: list[int],
+    ) -> None:
+        self.semester_id = semester_id
+        self.meetings = meetings
+        """(meeting ID, meeting type, is attendance taken) for each column, in chronological order."""
+        self.user_ids = user_ids
+
+        self.meeting_columns = {meeting[0]: column for column, meeting in enumerate(meetings)}
+        self.user_rows = {user_id: row for row, user_id in enumerate(user_ids)}
+
+        self.cells = bytearray(len(user_ids) * len(meetings))
+        self.group_meetings_attended = array("H", bytes(2 * len(user_ids)))
+        self.workshops_attended = array("H", bytes(2 * len(user_ids)))
+        self.meeting_attended = array("H", bytes(2 * len(meetings)))
+
+        self.group_meetings_total = sum(
+            1 for _, type, is_taken in meetings if is_taken and type in GROUP_MEETING_TYPES
+        )
+        self.workshops_total = sum(
+            1 for _, type, is_taken in meetings if is_taken and type == Meeting.WORKSHOP
+        )
+
+    @classmethod
+    def build(cls, semester_id: str):
+        """Builds the matrix for a semester with three queries: meetings, students, and attendances."""
+        meetings = list(
+            Meeting.objects.filter(
+                semester_id=semester_id, type__in=EXPECTED_MEETING_TYPES
+            )
+            .order_by("starts_at")
+            .values_list("pk", "type", "is_attendance_taken")
+        )
+        user_ids = list(
+            User.rpi.filter(enrollments__semester_id=semester_id)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+            .distinct()
+        )
+        matrix = cls(semester_id, meetings, user_ids)
+
+        for user_id, meeting_id, is_verified in MeetingAttendance.objects.filter(
+            meeting__semester_id=semester_id, meeting__type__in=EXPECTED_MEETING_TYPES
+        ).values_list("user_id", "meeting_id", "is_verified"):
+            matrix.set_status(
+                user_id, meeting_id, ATTENDED if is_verified else NEEDS_VERIFICATION
+            )
+
+        return matrix
+
+    def has_cell(self, user_id: int, meeting_id: int):
+        return user_id in self.user_rows and meeting_id in self.meeting_columns
+
+    def get_status(self, user_id: int, meeting_id: int):
+        return self.cells[
+            self.user_rows[user_id] * len(self.meetings) + self.meeting_columns[meeting_id]
+        ]
+
+    def set_status(self, user_id: int, meeting_id: int, status: int):
+        """Sets a single cell and adjusts the attended counts it contributes to. Unknown users
+        and meetings (e.g. non-students or mentor meetings) are ignored."""
+        if not self.has_cell(user_id, meeting_id):
+            return
+
+        row = self.user_rows[user_id]
+        column = self.meeting_columns[meeting_id]
+        index = row * len(self.meetings) + column
+
+        previous_status = self.cells[index]
+        if previous_status == status:
+            return
+        self.cells[index] = status
+
+        if ATTENDED not in (previous_status, status):
+            return
+        change = 1 if status == ATTENDED else -1
+
+        self.meeting_attended[column] += change
+        _, type, is_attendance_taken = self.meetings[column]
+        if is_attendance_taken:
+            if type in GROUP_MEETING_TYPES:
+                self.group_meetings_attended[row] += change
+            elif type == Meeting.WORKSHOP:
+                self.workshops_attended[row] += change
+
+    def get_row(self, user_id: int):
+        row = self.user_rows[user_id]
+        return self.cells[row * len(self.meetings) : (row + 1) * len(self.meetings)]
+
+    def get_totals(self, user_id: int) -> AttendanceTotals:
+        row = self.user_rows[user_id]
+        return {
+            "group_meetings_total": self.group_meetings_total,
+            "group_meetings_attended": self.group_meetings_attended[row],
+            "workshops_total": self.workshops_total,
+            "workshops_attended": self.workshops_attended[row],
+        }
+
+    def iter_rows(self) -> Iterator[tuple[int, bytearray, AttendanceTotals]]:
+        """Yields (user ID, statuses by meeting column, totals) for every student in one pass."""
+        for user_id in self.user_ids:
+            yield user_id, self.get_row(user_id), self.get_totals(user_id)
+
+
+def get_semester_attendance_matrix(semester_id: str) -> SemesterAttendanceMatrix:
+    """Fetches the semester's attendance matrix from the cache, building it if missing.
+
+    The matrix is cached under its tag's version as of before it was built, so a matrix built while
+    attendance changed is stored under an outdated version and never served."""
+    return tagged_get_or_set(
+        matrix_cache_key(semester_id),
+        lambda: SemesterAttendanceMatrix.build(semester_id),
+        [matrix_tag(semester_id)],
+        MATRIX_CACHE_TIMEOUT,
+    )
+
+
+def invalidate_semester_attendance_matrix(semester_id: str):
+    invalidate_tags(matrix_tag(semester_id))
+
+
+def update_semester_attendance_matrix(
+    semester_id: str, user_id: int, meeting_id: int, status: int
+):
+    """Applies a single attendance change to the cached matrix (if one is cached) without rebuilding it."""
+    update_semester_attendance_matrix_cells(semester_id, [(user_id, meeting_id, status)])
+
+
+def update_semester_attendance_matrix_cells(
+    semester_id: str, changes: Iterable[tuple[int, int, int]]
+):
+    """Applies many (user ID, meeting ID, status) changes to the cached matrix with one read and one write.
+
+    Each update atomically bumps the matrix's version and only patches the matrix cached under the
+    version before its own, so concurrent updates can't overwrite each other's changes: whichever
+    finds the matrix already outdated leaves it to be rebuilt on the next read. Changes at meetings
+    that aren't columns (e.g. mentor meetings) should be left out, since every update bumps the version."""
+    changes = list(changes)
+    if not changes:
+        return
+
+    tag = matrix_tag(semester_id)
+    key = matrix_cache_key(semester_id)
+    try:
+        version = cache.incr(tag_version_key(tag))
+    except ValueError:
+        # No version means no matrix was ever cached
+        return
+
+    matrix: SemesterAttendanceMatrix | None = cache.get(
+        format_tagged_key(key, {tag: version - 1})
+    )
+    if matrix is None:
+        return
+
+    for user_id, meeting_id, status in changes:
+        matrix.set_status(user_id, meeting_id, status)
+    cache.set(format_tagged_key(key, {tag: version}), matrix, MATRIX_CACHE_TIMEOUT)
+
+
+def get_attendance_meeting(attendance: MeetingAttendance) -> tuple[str, str] | None:
+    """Returns the (semester ID, type) of the attendance's meeting."""
+    if MeetingAttendance.meeting.is_cached(attendance):
+        return attendance.meeting.semester_id, attendance.meeting.type
+    return (
+        Meeting.objects.filter(pk=attendance.meeting_id)
+        .values_list("semester_id", "type")
+        .first()
+    )
+
+
+def update_matrix_on_attendance_change(attendance: MeetingAttendance, status: int):
+    meeting = get_attendance_meeting(attendance)
+    if meeting is None or meeting[1] not in EXPECTED_MEETING_TYPES:
+        return
+
+    # Once committed, so a matrix built in the meantime can't miss the change under the new version
+    transaction.on_commit(
+        lambda: update_semester_attendance_matrix(
+            meeting[0], attendance.user_id, attendance.meeting_id, status
+        )
+    )
+
+
+def update_matrix_on_attendance_save(sender, instance: MeetingAttendance, *args, **kwargs):
+    update_matrix_on_attendance_change(
+        instance, ATTENDED if instance.is_verified else NEEDS_VERIFICATION
+    )
+
+
+def update_matrix_on_attendance_delete(sender, instance: MeetingAttendance, *args, **kwargs):
+    update_matrix_on_attendance_change(instance, NOT_ATTENDED)
+
+
+def clear_matrix_cache(sender, instance: Meeting | Enrollment, *args, **kwargs):
+    """Meetings and enrollments change the shape of the matrix, so it must be rebuilt."""
+    transaction.on_commit(
+        lambda: invalidate_semester_attendance_matrix(instance.semester_id)
+    )
+
+
+post_save.connect(update_matrix_on_attendance_save, sender=MeetingAttendance)
+post_delete.connect(update_matrix_on_attendance_delete, sender=MeetingAttendance)
+post_save.connect(clear_matrix_cache, sender=Meeting)
+post_delete.connect(clear_matrix_cache, sender=Meeting)
+post_save.connect(clear_matrix_cache, sender=Enrollment)
+post_delete.connect(clear_matrix_cache, sender=Enrollment)
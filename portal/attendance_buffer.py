@@ -0,0 +1,177 @@
+"""This module contains the optional write-behind buffer for submitted attendance, enabled by the
+`ATTENDANCE_WRITE_BEHIND` setting. Instead of inserting a row per submission, submissions are appended
+to a Redis stream and recorded in a hash of pending attendances per meeting, and a Celery task drains
+the stream into the database in batches. Until then, `Meeting.get_attendance_data` merges the pending
+attendances in, and removing a pending attendance (e.g. a mentor denying it) keeps it from being inserted.
+
+The hashes are the source of truth for what is still pending; the stream only orders the work and keeps
+it from being lost when a flush dies before acknowledging it. A flush only removes an attendance from its
+hash after inserting it, and only if it is still the one it read, so one discarded in between (e.g. denied
+after the flush read it but before the row existed to delete) is deleted again instead of being kept."""
+
+import functools
+from collections.abc import Callable
+
+import redis
+from django.conf import settings
+
+STREAM_KEY = "attendance_buffer:stream"
+GROUP_NAME = "attendance_buffer:flushers"
+# Only one flush runs at a time (see the lock below), so a single consumer is enough
+CONSUMER_NAME = "flusher"
+FLUSH_LOCK_KEY = "attendance_buffer:flush_lock"
+FLUSH_LOCK_TIMEOUT = 60 * 5
+
+BufferedAttendance = tuple[int, int, bool]
+"""(meeting ID, user ID, is verified)"""
+
+# Removes each (hash, field) pair only if it still has the value the flush read, returning 1 for each
+# pair removed and 0 for each changed or discarded since
+REMOVE_FLUSHED_SCRIPT = """
+local removed = {}
+for index, key in ipairs(KEYS) do
+    local field, value = ARGV[2 * index - 1], ARGV[2 * index]
+    if redis.call("HGET", key, field) == value then
+        redis.call("HDEL", key, field)
+        removed[index] = 1
+    else
+        removed[index] = 0
+    end
+end
+return removed
+"""
+
+
+def pending_key(meeting_id: int):
+    return f"attendance_buffer:meeting:{meeting_id}"
+
+
+@functools.cache
+def get_client() -> redis.Redis:
+    return redis.Redis.from_url(settings.ATTENDANCE_BUFFER_REDIS_URL)
+
+
+def buffer_attendance(meeting_id: int, user_id: int, is_verified: bool):
+    """Queues an attendance to be inserted by the next flush."""
+    with get_client().pipeline() as pipeline:
+        pipeline.hset(pending_key(meeting_id), user_id, int(is_verified))
+        pipeline.xadd(STREAM_KEY, {"meeting_id": meeting_id, "user_id": user_id})
+        pipeline.execute()
+
+
+def get_buffered_attendances(meeting_id: int) -> dict[int, bool]:
+    """Returns whether each user's pending attendance at the meeting is verified, keyed by user ID."""
+    if not settings.ATTENDANCE_WRITE_BEHIND:
+        return {}
+
+    return {
+        int(user_id): is_verified == b"1"
+        for user_id, is_verified in get_client()
+        .hgetall(pending_key(meeting_id))
+        .items()
+    }
+
+
+def get_buffered_attendance(meeting_id: int, user_id: int) -> bool | None:
+    """Returns whether the user's pending attendance at the meeting is verified, or None if there is none."""
+    if not settings.ATTENDANCE_WRITE_BEHIND:
+        return None
+
+    is_verified = get_client().hget(pending_key(meeting_id), user_id)
+    return None if is_verified is None else is_verified == b"1"
+
+
+def discard_buffered_attendance(meeting_id: int, user_id: int) -> bool:
+    """Removes a pending attendance so it is never inserted. Returns whether there was one."""
+    if not settings.ATTENDANCE_WRITE_BEHIND:
+        return False
+
+    return bool(get_client().hdel(pending_key(meeting_id), user_id))
+
+
+def read_stream(client: redis.Redis, last_id: str, count: int):
+    response = client.xreadgroup(
+        GROUP_NAME, CONSUMER_NAME, {STREAM_KEY: last_id}, count=count
+    )
+    return response[0][1] if response else []
+
+
+def drain_attendance_buffer(
+    flush: Callable[[list[BufferedAttendance]], None],
+    unflush: Callable[[list[BufferedAttendance]], None],
+    batch_size=500,
+) -> int:
+    """Hands the pending attendances to `flush` in batches until the stream is empty, acknowledging
+    each batch only after `flush` returns. Attendances discarded or resubmitted while `flush` ran are
+    handed to `unflush` to be deleted again. Returns how many attendances were flushed, or 0 if another
+    drain is already running."""
+    client = get_client()
+    remove_flushed = client.register_script(REMOVE_FLUSHED_SCRIPT)
+    lock = client.lock(FLUSH_LOCK_KEY, timeout=FLUSH_LOCK_TIMEOUT)
+    if not lock.acquire(blocking=False):
+        return 0
+
+    try:
+        try:
+            client.xgroup_create(STREAM_KEY, GROUP_NAME, id="0", mkstream=True)
+        except redis.ResponseError as error:
+            if "BUSYGROUP" not in str(error):
+                raise
+
+        flushed = 0
+        while True:
+            # Entries delivered to a drain that died before acknowledging them come first
+            entries = read_stream(client, "0", batch_size) or read_stream(
+                client, ">", batch_size
+            )
+            if not entries:
+                return flushed
+
+            entry_ids = [entry_id for entry_id, _ in entries]
+            keys = [
+                (int(fields[b"meeting_id"]), int(fields[b"user_id"]))
+                for _, fields in entries
+            ]
+
+            with client.pipeline(transaction=False) as pipeline:
+                for meeting_id, user_id in keys:
+                    pipeline.hget(pending_key(meeting_id), user_id)
+                statuses = pipeline.execute()
+
+            # Entries missing from the hashes were discarded, or repeat an attendance already flushed
+            pending = {
+                (meeting_id, user_id): status
+                for (meeting_id, user_id), status in zip(keys, statuses)
+                if status is not None
+            }
+            if pending:
+                attendances = [
+                    (meeting_id, user_id, status == b"1")
+                    for (meeting_id, user_id), status in pending.items()
+                ]
+                flush(attendances)
+                removed = remove_flushed(
+                    keys=[pending_key(meeting_id) for meeting_id, _ in pending],
+                    args=[
+                        value
+                        for (_, user_id), status in pending.items()
+                        for value in (user_id, status)
+                    ],
+                )
+                unflushed = [
+                    attendance
+                    for attendance, was_removed in zip(attendances, removed)
+                    if not was_removed
+                ]
+                if unflushed:
+                    # Discarded (e.g. denied) since being read, maybe before there was a row to delete.
+                    # A resubmission stays pending, so its own stream entry inserts it again
+                    unflush(unflushed)
+                flushed += len(attendances) - len(unflushed)
+
+            with client.pipeline() as pipeline:
+                pipeline.xack(STREAM_KEY, GROUP_NAME, *entry_ids)
+                pipeline.xdel(STREAM_KEY, *entry_ids)
+                pipeline.execute()
+    finally:
+        lock.release()
@@ -0,0 +1,250 @@
+"""This module contains the attendance submission fast path, built for the first minutes of a meeting when
+every student submits its code at once. Codes are resolved from the cache along with their meeting's window
+and small group's members, repeat submissions are rejected with an atomic cache add, and attendances are
+inserted in batches that skip conflicts instead of raising, either right away or from the write-behind
+buffer in `portal.attendance_buffer`."""
+
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from portal.attendance import (
+    ATTENDED,
+    EXPECTED_MEETING_TYPES,
+    NEEDS_VERIFICATION,
+    update_semester_attendance_matrix_cells,
+)
+from portal.attendance_buffer import (
+    BufferedAttendance,
+    discard_buffered_attendance,
+    drain_attendance_buffer,
+)
+from portal.cache import MODEL_TAGS, invalidate_tags, tagged_get_or_set
+from portal.models import (
+    Enrollment,
+    MeetingAttendance,
+    MeetingAttendanceCode,
+    User,
+)
+from portal.small_groups import get_small_group_member_ids
+
+ATTENDANCE_CODE_CACHE_TIMEOUT = 60 * 60 * 6
+ENROLLED_CACHE_TIMEOUT = 60 * 60 * 24
+SUBMITTED_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+@dataclass(frozen=True)
+class AttendanceCodeEntry:
+    """Everything a submission needs to know about an attendance code, without touching the database."""
+
+    code: str
+    meeting_id: int
+    semester_id: str
+    meeting_name: str
+    meeting_url: str
+    starts_at: datetime
+    ends_at: datetime
+    verification_chance: float
+    """The chance a submission needs to be verified by a mentor."""
+    small_group_id: int | None
+
+    @property
+    def is_valid(self):
+        return self.starts_at < timezone.now() < self.ends_at
+
+    def allows(self, user_id: int):
+        """Whether the user may submit the code, i.e. is in its small group if it has one."""
+        return self.small_group_id is None or user_id in get_small_group_member_ids(
+            self.small_group_id
+        )
+
+
+def attendance_code_cache_key(code: str):
+    return f"attendance_code:{code}"
+
+
+def enrolled_cache_key(semester_id: str, user_id: int):
+    return f"attendance_enrolled:{semester_id}:{user_id}"
+
+
+def submitted_cache_key(meeting_id: int, user_id: int):
+    return f"attendance_submitted:{meeting_id}:{user_id}"
+
+
+def build_attendance_code_entry(code: MeetingAttendanceCode) -> AttendanceCodeEntry:
+    meeting = code.meeting
+    return AttendanceCodeEntry(
+        code=code.code,
+        meeting_id=meeting.pk,
+        semester_id=meeting.semester_id,
+        meeting_name=str(meeting),
+        meeting_url=meeting.get_absolute_url(),
+        starts_at=meeting.starts_at,
+        ends_at=meeting.ends_at,
+        verification_chance=float(meeting.attendance_chance_verification_required),
+        small_group_id=code.small_group_id,
+    )
+
+
+def get_attendance_code(code: str) -> AttendanceCodeEntry | None:
+    """Resolves a submitted code, in any case, from the cache.
+
+    Codes never change meeting once created, so which one a code belongs to is cached until the code
+    is saved or deleted. The rest of the entry is tagged with the meeting (its window). Small group
+    members are checked against the small group's cached members (see `portal.small_groups`).
+    """
+    code = MeetingAttendanceCode.normalize(code)
+    key = attendance_code_cache_key(code)
+
+    meeting_id = cache.get(key)
+    if meeting_id is None:
+        meeting_id = (
+            MeetingAttendanceCode.objects.filter(pk=code)
+            .values_list("meeting_id", flat=True)
+            .first()
+        )
+        if meeting_id is None:
+            return None
+        cache.set(key, meeting_id, ATTENDANCE_CODE_CACHE_TIMEOUT)
+
+    return tagged_get_or_set(
+        f"attendance_code_entry:{code}",
+        lambda: build_attendance_code_entry(
+            MeetingAttendanceCode.objects.select_related("meeting").get(pk=code)
+        ),
+        [f"meeting:{meeting_id}"],
+        ATTENDANCE_CODE_CACHE_TIMEOUT,
+    )
+
+
+def ensure_enrolled(user: User, semester_id: str):
+    """Enrolls the user in the semester if they aren't yet, checking the cache before the database."""
+    key = enrolled_cache_key(semester_id, user.pk)
+    if not cache.get(key):
+        user.enrollments.get_or_create(semester_id=semester_id)
+        cache.set(key, True, ENROLLED_CACHE_TIMEOUT)
+
+
+def claim_attendance(meeting_id: int, user_id: int):
+    """Atomically marks the user as having submitted attendance for the meeting. Returns False if they already had."""
+    if not cache.add(
+        submitted_cache_key(meeting_id, user_id), True, SUBMITTED_CACHE_TIMEOUT
+    ):
+        return False
+    # Claims expire and mentors can add attendance directly, so the attendance may already be stored,
+    # in which case inserting it would silently be skipped
+    return not MeetingAttendance.objects.filter(
+        meeting_id=meeting_id, user_id=user_id
+    ).exists()
+
+
+def release_attendance(meeting_id: int, user_id: int):
+    cache.delete(submitted_cache_key(meeting_id, user_id))
+
+
+def record_attendances(attendances: list[MeetingAttendance], batch_size=500):
+    """Inserts attendances in batches, skipping any that already exist, then applies what the `post_save`
+    signals that `bulk_create` skips would have: once committed, semester attendance matrices and cache
+    tags are updated from the rows actually stored."""
+    if not attendances:
+        return
+
+    MeetingAttendance.objects.bulk_create(
+        attendances, batch_size=batch_size, ignore_conflicts=True
+    )
+
+    keys = {(attendance.meeting_id, attendance.user_id) for attendance in attendances}
+    stored = MeetingAttendance.objects.filter(
+        meeting_id__in={meeting_id for meeting_id, _ in keys},
+        user_id__in={user_id for _, user_id in keys},
+    ).values_list(
+        "meeting_id",
+        "user_id",
+        "is_verified",
+        "meeting__semester_id",
+        "meeting__type",
+    )
+
+    changes_by_semester = defaultdict(list)
+    tags = set()
+    for meeting_id, user_id, is_verified, semester_id, meeting_type in stored:
+        if (meeting_id, user_id) not in keys:
+            continue
+        if meeting_type in EXPECTED_MEETING_TYPES:
+            changes_by_semester[semester_id].append(
+                (user_id, meeting_id, ATTENDED if is_verified else NEEDS_VERIFICATION)
+            )
+        tags.update(
+            MODEL_TAGS[MeetingAttendance](
+                MeetingAttendance(meeting_id=meeting_id, user_id=user_id)
+            )
+        )
+
+    def update_caches():
+        for semester_id, changes in changes_by_semester.items():
+            update_semester_attendance_matrix_cells(semester_id, changes)
+        invalidate_tags(*tags)
+
+    transaction.on_commit(update_caches)
+
+
+def flush_buffered_attendances(batch_size=500):
+    """Inserts the attendances waiting in the write-behind buffer (see `portal.attendance_buffer`)."""
+    if not settings.ATTENDANCE_WRITE_BEHIND:
+        return 0
+
+    def flush(buffered: list[BufferedAttendance]):
+        record_attendances(
+            [
+                MeetingAttendance(
+                    meeting_id=meeting_id, user_id=user_id, is_verified=is_verified
+                )
+                for meeting_id, user_id, is_verified in buffered
+            ],
+            batch_size=batch_size,
+        )
+
+    def unflush(discarded: list[BufferedAttendance]):
+        query = Q(pk__in=[])
+        for meeting_id, user_id, _ in discarded:
+            query |= Q(meeting_id=meeting_id, user_id=user_id)
+        MeetingAttendance.objects.filter(query).delete()
+
+    return drain_attendance_buffer(flush, unflush, batch_size=batch_size)
+
+
+def remove_buffered_attendance(meeting_id: int, user_id: int):
+    """Keeps a submission still waiting in the write-behind buffer from being inserted and lets the
+    student resubmit, like deleting an inserted attendance does."""
+    if discard_buffered_attendance(meeting_id, user_id):
+        release_attendance(meeting_id, user_id)
+        return True
+    return False
+
+
+def clear_attendance_code_cache(
+    sender, instance: MeetingAttendanceCode, *args, **kwargs
+):
+    cache.delete(attendance_code_cache_key(instance.code))
+
+
+def clear_enrolled_cache(sender, instance: Enrollment, *args, **kwargs):
+    cache.delete(enrolled_cache_key(instance.semester_id, instance.user_id))
+
+
+def release_deleted_attendance(sender, instance: MeetingAttendance, *args, **kwargs):
+    """Lets a student resubmit a code after their attendance is denied or removed."""
+    release_attendance(instance.meeting_id, instance.user_id)
+
+
+post_save.connect(clear_attendance_code_cache, sender=MeetingAttendanceCode)
+post_delete.connect(clear_attendance_code_cache, sender=MeetingAttendanceCode)
+post_delete.connect(clear_enrolled_cache, sender=Enrollment)
+post_delete.connect(release_deleted_attendance, sender=MeetingAttendance)
@@ -0,0 +1,147 @@
+"""This module contains tag-versioned caching for values derived from portal models.
+
+Every cached value is registered with the tags it depends on (e.g. `meeting:12` or
+`enrollment:semester:202409`). Each tag has a version stored in the cache, and the versions of a
+value's tags are part of its key. Saving or deleting a model instance bumps the versions of its tags,
+so every dependent value is invalidated immediately without tracking the keys themselves. Since values
+can no longer go stale silently, they can be cached much longer."""
+
+import time
+from collections.abc import Callable, Iterable
+from typing import Any
+
+from django.core.cache import cache
+from django.db.models import Model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from portal.models import (
+    Enrollment,
+    Meeting,
+    MeetingAttendance,
+    MeetingAttendanceCode,
+    Project,
+    ProjectPitch,
+    Semester,
+    SmallGroup,
+    User,
+)
+
+DEFAULT_TIMEOUT = 60 * 60 * 24 * 7
+"""How long tagged values live. Invalidation is driven by tags, so this only bounds memory use."""
+
+MODEL_TAGS: dict[type[Model], Callable[[Any], list[str]]] = {
+    Semester: lambda semester: ["semester", f"semester:{semester.pk}"],
+    User: lambda user: ["user", f"user:{user.pk}"],
+    Project: lambda project: ["project", f"project:{project.pk}"],
+    ProjectPitch: lambda pitch: ["project_pitch", f"project:{pitch.project_id}"],
+    Enrollment: lambda enrollment: [
+        "enrollment",
+        f"enrollment:semester:{enrollment.semester_id}",
+        f"enrollment:user:{enrollment.user_id}",
+    ],
+    Meeting: lambda meeting: [
+        "meeting",
+        f"meeting:{meeting.pk}",
+        f"meeting:semester:{meeting.semester_id}",
+    ],
+    MeetingAttendance: lambda attendance: [
+        f"meeting_attendance:meeting:{attendance.meeting_id}",
+        f"meeting_attendance:user:{attendance.user_id}",
+    ],
+    MeetingAttendanceCode: lambda code: [
+        f"meeting_attendance_code:meeting:{code.meeting_id}"
+    ],
+    SmallGroup: lambda small_group: ["small_group", f"small_group:{small_group.pk}"],
+}
+"""The tags bumped when an instance of each model is saved or deleted."""
+
+
+def tag_version_key(tag: str):
+    return f"cache_tag:{tag}"
+
+
+def get_tag_versions(tags: Iterable[str]) -> dict[str, int]:
+    """Fetches the current version of each tag with a single cache read when they all exist."""
+    keys = {tag: tag_version_key(tag) for tag in tags}
+    stored = cache.get_many(keys.values())
+
+    versions = {}
+    for tag, key in keys.items():
+        if key not in stored:
+            # Start unseen (or evicted) tags at a unique version so values cached
+            # under an evicted version can never be read again
+            cache.add(key, time.time_ns(), None)
+            stored[key] = cache.get(key)
+        versions[tag] = stored[key]
+    return versions
+
+
+def format_tagged_key(key: str, versions: dict[str, int]):
+    return key + "@" + ",".join(f"{tag}={version}" for tag, version in versions.items())
+
+
+def make_tagged_key(key: str, tags: Iterable[str]):
+    return format_tagged_key(key, get_tag_versions(sorted(set(tags))))
+
+
+def tagged_get(key: str, tags: Iterable[str], default: Any = None):
+    return cache.get(make_tagged_key(key, tags), default)
+
+
+def tagged_set(key: str, value: Any, tags: Iterable[str], timeout=DEFAULT_TIMEOUT):
+    cache.set(make_tagged_key(key, tags), value, timeout)
+
+
+def tagged_get_or_set(
+    key: str, default: Any, tags: Iterable[str], timeout=DEFAULT_TIMEOUT
+):
+    """Like `cache.get_or_set` but the value is invalidated whenever any of the tags is bumped."""
+    return cache.get_or_set(make_tagged_key(key, tags), default, timeout)
+
+
+def invalidate_tags(*tags: str):
+    """Bumps the tags' versions so every value registered with them is invalidated."""
+    for tag in tags:
+        try:
+            cache.incr(tag_version_key(tag))
+        except ValueError:
+            # No version means nothing was ever cached under the tag
+            pass
+
+
+def invalidate_instances_tags(model: type[Model], instances: Iterable[Model]):
+    """Bumps the tags of many instances at once, for bulk writes that skip the signals below."""
+    invalidate_tags(
+        *{tag for instance in instances for tag in MODEL_TAGS[model](instance)}
+    )
+
+
+def invalidate_instance_tags(
+    sender, instance: Model, update_fields=None, *args, **kwargs
+):
+    # Logging in only updates `last_login`, which no cached value depends on
+    if (
+        sender is User
+        and update_fields is not None
+        and set(update_fields) <= {"last_login"}
+    ):
+        return
+    invalidate_tags(*MODEL_TAGS[sender](instance))
+
+
+def invalidate_small_group_relation_tags(sender, action: str, *args, **kwargs):
+    """Small group projects and mentors can be changed from either side, so any change bumps
+    the model-wide tag."""
+    if action.startswith("post_"):
+        invalidate_tags("small_group")
+
+
+for model in MODEL_TAGS:
+    post_save.connect(invalidate_instance_tags, sender=model)
+    post_delete.connect(invalidate_instance_tags, sender=model)
+m2m_changed.connect(
+    invalidate_small_group_relation_tags, sender=SmallGroup.projects.through
+)
+m2m_changed.connect(
+    invalidate_small_group_relation_tags, sender=SmallGroup.mentors.through
+)
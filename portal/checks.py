@@ -38,6 +38,39 @@ class CheckResult:
         return display_str
 
 
+class CheckContext:
+    """Memoized state shared by every check run for one user, so that shared dependencies
+    (e.g. `CheckUserSetup`) run once and each semester's enrollment is fetched once,
+    no matter how many checks a view or template evaluates."""
+
+    def __init__(self, user: User) -> None:
+        self.user = user
+        self.results: dict[tuple, FailedCheck | None] = {}
+        """The failure (or `None` if passed) of each check that has run, keyed by `Check.get_key`."""
+
+    def get_enrollment(self, semester: Semester | None) -> Enrollment | None:
+        """The user's enrollment (with its project) for the semester, fetched at most once."""
+        if not self.user.is_authenticated:
+            return None
+        return self.user.get_enrollment(semester)
+
+    def clear(self):
+        """Forgets everything memoized, e.g. after changing the user's enrollment mid-request."""
+        self.results.clear()
+        if self.user.is_authenticated:
+            self.user.clear_enrollment_cache()
+
+
+def get_check_context(user: User) -> CheckContext:
+    """Fetches the check context stored on the user instance. Since `request.user` is loaded
+    once per request, the context is shared by the view and its templates for that request only."""
+    context = getattr(user, "_check_context", None)
+    if context is None:
+        context = CheckContext(user)
+        user._check_context = context
+    return context
+
+
 class Check:
     dependencies: list["Check"] = []
     """The checks that will run before this one."""
@@ -55,7 +88,33 @@ class Check:
         project: Project | None = None,
     ):
         for dep in self.dependencies:
-            dep.run(user, semester, project)
+            dep.evaluate(user, semester, project)
+
+    def get_key(self, semester: Semester | None, project: Project | None) -> tuple:
+        return (
+            type(self).__name__,
+            semester.pk if semester else None,
+            project.pk if project else None,
+        )
+
+    def evaluate(
+        self,
+        user: User,
+        semester: Semester | None = None,
+        project: Project | None = None,
+    ):
+        """Runs the check at most once per request for the given semester and project,
+        re-raising the memoized failure on later calls."""
+        context = get_check_context(user)
+        key = self.get_key(semester, project)
+        if key not in context.results:
+            try:
+                self.run(user, semester, project)
+                context.results[key] = None
+            except FailedCheck as e:
+                context.results[key] = e
+        if context.results[key] is not None:
+            raise context.results[key]
 
     def fail(self, fail_reason: str | None = None, fix: str | None = None):
         raise FailedCheck(fail_reason or self.fail_reason, fix)
@@ -67,14 +126,14 @@ class Check:
         project: Project | None = None,
     ):
         try:
-            self.run(user, semester, project)
+            self.evaluate(user, semester, project)
             return CheckResult(passed=True, fail_reason="", fix="")
         except FailedCheck as e:
             return CheckResult(passed=False, fail_reason=e.reason, fix=e.fix or "")
 
     def passes(self, user: User, semester: Semester | None, project: Project | None):
         try:
-            self.run(user, semester, project)
+            self.evaluate(user, semester, project)
             return True
         except FailedCheck:
             return False
@@ -171,6 +230,9 @@ class CheckBeforeSemesterDeadline(Check):
         self.deadline_key = deadline_key
         self.deadline_name = deadline_name
 
+    def get_key(self, semester: Semester | None, project: Project | None) -> tuple:
+        return (*super().get_key(semester, project), self.deadline_key)
+
     def run(
         self,
         user: User,
@@ -216,11 +278,9 @@ class CheckUserNotAlreadyEnrolled(Check):
         if user.owned_projects.filter(is_approved=False).count() > 0:
             return self.fail("You have an unapproved project pending.")
 
-        try:
-            if Enrollment.objects.get(user=user, semester=semester).project:
-                return self.fail()
-        except Enrollment.DoesNotExist:
-            pass
+        enrollment = get_check_context(user).get_enrollment(semester)
+        if enrollment and enrollment.project:
+            return self.fail()
 
 
 class CheckUserCanCreateProject(Check):
@@ -242,9 +302,8 @@ class CheckUserIsProjectLeadOrOwner(Check):
     ):
         super().run(user, semester, project)
 
-        try:
-            enrollment = Enrollment.objects.get(user=user, semester=semester)
-        except Enrollment.DoesNotExist:
+        enrollment = get_check_context(user).get_enrollment(semester)
+        if enrollment is None:
             return self.fail(f"You are not enrolled for {semester}.")
 
         if not project:
@@ -267,9 +326,8 @@ class CheckUserIsMentorOrAbove(Check):
     ):
         super().run(user, semester, project)
 
-        try:
-            enrollment = Enrollment.objects.get(user=user, semester=semester)
-        except Enrollment.DoesNotExist:
+        enrollment = get_check_context(user).get_enrollment(semester)
+        if enrollment is None:
             return self.fail(f"You are not enrolled for {semester}.")
 
         if (
@@ -0,0 +1,313 @@
+"""This module contains the pipeline that ingests GitHub activity from active projects' repositories
+and precomputes each user's weekly contributions, keeping activity attributed to whichever user has
+linked its author's GitHub account."""
+
+import logging
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Any
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Lower
+from django.db.models.signals import post_save, pre_save
+from django.utils import timezone
+
+from portal.models import (
+    ProjectRepository,
+    RepositoryActivity,
+    Semester,
+    User,
+    WeeklyContribution,
+)
+from portal.services import github
+
+logger = logging.getLogger(__name__)
+
+COMMIT_SYNC_OVERLAP = timedelta(days=7)
+"""How far before the commit cursor each run looks again. GitHub filters history by commit date, so
+commits pushed or merged after a run but dated before it would otherwise never be fetched. Commits
+fetched twice are ignored by the unique constraint on their SHA."""
+
+
+def get_week(moment: datetime) -> date:
+    """The Monday of the (local) week the moment falls in."""
+    day = timezone.localdate(moment)
+    return day - timedelta(days=day.weekday())
+
+
+@dataclass
+class FetchedRepositoryActivity:
+    """Everything fetched from GitHub for one repository in one run, before anything is written."""
+
+    repository_id: int
+    fetched_at: datetime
+    commits: list[dict[str, Any]] = field(default_factory=list)
+    commits_complete: bool = True
+    """Whether every commit since the cursor was fetched, so the cursor can move past them."""
+    pull_requests: list[dict[str, Any]] = field(default_factory=list)
+    pull_requests_cursor: str | None = None
+    issues: list[dict[str, Any]] = field(default_factory=list)
+    issues_cursor: str | None = None
+
+
+def fetch_repository_activity(
+    client: github.GitHubClient, repository: ProjectRepository, default_since: datetime
+) -> FetchedRepositoryActivity:
+    """Fetches only the activity newer than the repository's cursors, or the commits still missing
+    below an unfinished backfill. Makes no database queries so it can run in
+    `github.map_concurrently`'s threads."""
+    fetched = FetchedRepositoryActivity(repository.pk, timezone.now())
+    since = (
+        repository.commits_synced_until - COMMIT_SYNC_OVERLAP
+        if repository.commits_synced_until
+        else default_since
+    )
+    until = repository.commits_backfill_until
+    fetched.commits, fetched.commits_complete = github.get_repository_commits(
+        client, repository.url, since.isoformat(), until and until.isoformat()
+    )
+    fetched.pull_requests, fetched.pull_requests_cursor = (
+        github.get_repository_items_after(
+            client,
+            github.REPOSITORY_PULL_REQUESTS_QUERY,
+            repository.url,
+            repository.pull_requests_cursor or None,
+        )
+    )
+    fetched.issues, fetched.issues_cursor = github.get_repository_items_after(
+        client,
+        github.REPOSITORY_ISSUES_QUERY,
+        repository.url,
+        repository.issues_cursor or None,
+    )
+    return fetched
+
+
+def build_activities(
+    fetched: FetchedRepositoryActivity, user_ids_by_login: dict[str, int]
+) -> list[RepositoryActivity]:
+    def activity(type: str, key: str, login: str | None, occurred_at: str, **fields):
+        occurred_at_datetime = datetime.fromisoformat(occurred_at)
+        return RepositoryActivity(
+            repository_id=fetched.repository_id,
+            type=type,
+            key=key,
+            author_login=login or "",
+            user_id=user_ids_by_login.get((login or "").lower()),
+            occurred_at=occurred_at_datetime,
+            week=get_week(occurred_at_datetime),
+            **fields,
+        )
+
+    activities = [
+        activity(
+            RepositoryActivity.COMMIT,
+            commit["oid"],
+            ((commit["author"] or {}).get("user") or {}).get("login"),
+            commit["committedDate"],
+            title=commit["messageHeadline"][:500],
+            url=commit["url"],
+            additions=commit["additions"],
+            deletions=commit["deletions"],
+        )
+        for commit in fetched.commits
+    ]
+    for type, items in (
+        (RepositoryActivity.PULL_REQUEST, fetched.pull_requests),
+        (RepositoryActivity.ISSUE, fetched.issues),
+    ):
+        activities.extend(
+            activity(
+                type,
+                str(item["number"]),
+                (item["author"] or {}).get("login"),
+                item["createdAt"],
+                title=item["title"][:500],
+                url=item["url"],
+            )
+            for item in items
+        )
+    return activities
+
+
+def get_user_ids_by_login(logins: set[str]) -> dict[str, int]:
+    """Matches GitHub logins to users case-insensitively with one query."""
+    return dict(
+        User.objects.annotate(login=Lower("github_username"))
+        .filter(login__in={login.lower() for login in logins})
+        .values_list("login", "pk")
+    )
+
+
+def update_weekly_contributions(user_ids: set[int], weeks: set[date]):
+    """Recomputes the weekly aggregates for every pair of the given users and weeks from their stored activity."""
+    if not user_ids or not weeks:
+        return
+
+    rows = (
+        RepositoryActivity.objects.filter(user_id__in=user_ids, week__in=weeks)
+        .values("user_id", "week")
+        .annotate(
+            commits=Count("pk", filter=Q(type=RepositoryActivity.COMMIT)),
+            additions=Sum(
+                "additions", filter=Q(type=RepositoryActivity.COMMIT), default=0
+            ),
+            deletions=Sum(
+                "deletions", filter=Q(type=RepositoryActivity.COMMIT), default=0
+            ),
+            pull_requests=Count("pk", filter=Q(type=RepositoryActivity.PULL_REQUEST)),
+            issues=Count("pk", filter=Q(type=RepositoryActivity.ISSUE)),
+        )
+        .order_by()
+    )
+    with transaction.atomic():
+        # Activity can be attributed away from a user, leaving weeks with nothing to aggregate
+        WeeklyContribution.objects.filter(user_id__in=user_ids, week__in=weeks).delete()
+        WeeklyContribution.objects.bulk_create(
+            [WeeklyContribution(**row) for row in rows]
+        )
+
+
+def ingest_fetched_activity(
+    repository: ProjectRepository, fetched: FetchedRepositoryActivity
+) -> list[RepositoryActivity]:
+    """Stores newly fetched activity (ignoring anything already stored) and advances the cursors."""
+    logins = {
+        ((commit["author"] or {}).get("user") or {}).get("login") or ""
+        for commit in fetched.commits
+    } | {
+        (item["author"] or {}).get("login") or ""
+        for item in fetched.pull_requests + fetched.issues
+    }
+    activities = build_activities(fetched, get_user_ids_by_login(logins - {""}))
+
+    with transaction.atomic():
+        RepositoryActivity.objects.bulk_create(
+            activities, ignore_conflicts=True, batch_size=500
+        )
+        if fetched.commits_complete:
+            # This closes any unfinished backfill's gap, and its first run fetched everything newer
+            repository.commits_synced_until = (
+                repository.commits_backfill_synced_until or fetched.fetched_at
+            )
+            repository.commits_backfill_until = None
+            repository.commits_backfill_synced_until = None
+        else:
+            # The oldest commits since the cursor weren't reached yet, so resume below the oldest
+            # one fetched next time and keep the cursor until the gap is closed
+            repository.commits_backfill_until = min(
+                datetime.fromisoformat(commit["committedDate"])
+                for commit in fetched.commits
+            )
+            repository.commits_backfill_synced_until = (
+                repository.commits_backfill_synced_until or fetched.fetched_at
+            )
+            logger.warning(
+                "Stopped paging commits of %s early, resuming below %s next time",
+                repository,
+                repository.commits_backfill_until,
+            )
+        repository.pull_requests_cursor = fetched.pull_requests_cursor or ""
+        repository.issues_cursor = fetched.issues_cursor or ""
+        ProjectRepository.objects.filter(pk=repository.pk).update(
+            commits_synced_until=repository.commits_synced_until,
+            commits_backfill_until=repository.commits_backfill_until,
+            commits_backfill_synced_until=repository.commits_backfill_synced_until,
+            pull_requests_cursor=repository.pull_requests_cursor,
+            issues_cursor=repository.issues_cursor,
+        )
+
+    return activities
+
+
+def ingest_active_project_contributions():
+    """Fetches new activity for every repository of the active semester's projects, then
+    refreshes the weekly aggregates of every user and week it touched."""
+    semester = Semester.get_active()
+    if semester is None:
+        return
+
+    repositories = list(
+        ProjectRepository.objects.filter(
+            project__enrollments__semester=semester
+        ).distinct()
+    )
+    default_since = timezone.make_aware(
+        datetime.combine(semester.start_date, datetime.min.time())
+    )
+
+    def fetch(client: github.GitHubClient, repository: ProjectRepository):
+        try:
+            return fetch_repository_activity(client, repository, default_since)
+        except Exception:
+            logger.exception("Failed to fetch GitHub activity for %s", repository)
+            return None
+
+    user_ids: set[int] = set()
+    weeks: set[date] = set()
+    for repository, fetched in zip(
+        repositories, github.map_concurrently(fetch, repositories)
+    ):
+        if fetched is None:
+            continue
+        for activity in ingest_fetched_activity(repository, fetched):
+            if activity.user_id:
+                user_ids.add(activity.user_id)
+                weeks.add(activity.week)
+
+    update_weekly_contributions(user_ids, weeks)
+    logger.info(
+        "Ingested GitHub activity for %d repositories (%d users affected)",
+        len(repositories),
+        len(user_ids),
+    )
+
+
+def attribute_github_activity(user_id: int, github_username: str | None):
+    """Attributes stored activity to the user who now has its author's GitHub login (case-insensitively)
+    and away from them otherwise, then recomputes the weekly aggregates of everyone affected."""
+    detached = RepositoryActivity.objects.filter(user_id=user_id)
+    attached = RepositoryActivity.objects.none()
+    if github_username:
+        detached = detached.exclude(author_login__iexact=github_username)
+        attached = RepositoryActivity.objects.filter(
+            author_login__iexact=github_username
+        ).exclude(user_id=user_id)
+
+    with transaction.atomic():
+        affected = set(detached.values_list("user_id", "week")) | set(
+            attached.values_list("user_id", "week")
+        )
+        detached.update(user=None)
+        attached.update(user=user_id)
+        update_weekly_contributions(
+            {user_id} | {other_id for other_id, _ in affected if other_id},
+            {week for _, week in affected},
+        )
+
+
+def remember_previous_github_username(
+    sender, instance: User, update_fields=None, *args, **kwargs
+):
+    # Activity is matched to users by GitHub login when it's ingested, so linking or unlinking
+    # GitHub later has to move the user's existing activity
+    if update_fields is not None and "github_username" not in update_fields:
+        return
+    instance._previous_github_username = (
+        None
+        if instance._state.adding
+        else User.objects.filter(pk=instance.pk)
+        .values_list("github_username", flat=True)
+        .first()
+    )
+
+
+def attribute_changed_github_activity(sender, instance: User, *args, **kwargs):
+    previous = instance.__dict__.pop("_previous_github_username", None)
+    if (previous or "").lower() != (instance.github_username or "").lower():
+        attribute_github_activity(instance.pk, instance.github_username)
+
+
+pre_save.connect(remember_previous_github_username, sender=User)
+post_save.connect(attribute_changed_github_activity, sender=User)
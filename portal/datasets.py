@@ -0,0 +1,463 @@
+"""This module generates synthetic RCOS data at production scale (or larger) for load and query-budget
+testing. Rows are written directly with batched `bulk_create`s, so model `save` methods and signals don't
+run; the search index, small group memberships, and model-wide cache tags are refreshed once at the end
+instead."""
+
+import random
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Model
+from django.utils import timezone
+from django.utils.text import slugify
+
+from portal.attendance import invalidate_semester_attendance_matrix
+from portal.cache import invalidate_tags
+from portal.models import (
+    Enrollment,
+    Meeting,
+    MeetingAttendance,
+    Organization,
+    Project,
+    ProjectPitch,
+    ProjectTag,
+    Semester,
+    SmallGroup,
+    User,
+    clear_semester_cache,
+)
+from portal.search import rebuild_search_index
+from portal.small_groups import (
+    rebuild_small_group_memberships,
+    small_group_membership_tag,
+)
+
+FIRST_NAMES = (
+    "Alex", "Ava", "Ben", "Chloe", "Daniel", "Emma", "Ethan", "Grace", "Hannah", "Isaac",
+    "Jack", "Julia", "Kevin", "Leah", "Liam", "Maya", "Noah", "Olivia", "Priya", "Ryan",
+    "Sam", "Sofia", "Tyler", "Zoe",
+)  # fmt: skip
+LAST_NAMES = (
+    "Anderson", "Brown", "Chen", "Davis", "Garcia", "Johnson", "Kim", "Lee", "Lopez", "Martin",
+    "Miller", "Nguyen", "Patel", "Rodriguez", "Shah", "Smith", "Taylor", "Thomas", "Wilson", "Wong",
+)  # fmt: skip
+PROJECT_WORDS = (
+    "Atlas", "Beacon", "Cascade", "Comet", "Ember", "Forge", "Harbor", "Horizon", "Lumen", "Nova",
+    "Orbit", "Prism", "Quill", "Relay", "Signal", "Summit", "Tandem", "Vertex", "Willow", "Zephyr",
+)  # fmt: skip
+TAG_NAMES = (
+    "javascript", "typescript", "python", "html", "css", "c", "c++", "rust", "c#", "php",
+    "swift", "r", "golang", "ruby", "sql", "kotlin", "hardware",
+)  # fmt: skip
+EXTERNAL_ORGANIZATIONS = ("Red Hat", "IBM", "Mozilla")
+
+CREDIT_WEIGHTS = {0: 30, 1: 10, 2: 15, 3: 15, 4: 30}
+"""Relative likelihood of each credit count; most students are either volunteers or full-credit."""
+
+MEETING_TYPE_WEIGHTS = {
+    Meeting.SMALL_GROUP: 10,
+    Meeting.LARGE_GROUP: 6,
+    Meeting.WORKSHOP: 4,
+    Meeting.MENTOR: 1,
+}
+
+
+@dataclass
+class DatasetOptions:
+    semesters: int = 3
+    users: int = 2000
+    projects: int = 160
+    enrollment_rate: float = 0.6
+    """The fraction of users enrolled in any one semester."""
+    meetings_per_semester: int = 24
+    workshop_rate: float = 0.15
+    """The fraction of enrolled students who attend any one workshop."""
+    seed: int = 0
+    batch_size: int = 2000
+
+
+@dataclass
+class GeneratedDataset:
+    semesters: list[Semester]
+    """Newest (the active semester) first."""
+    users: list[User]
+    projects: list[Project]
+    counts: dict[str, int] = field(default_factory=dict)
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def bulk_create_in_batches(
+    model: type[Model], objects: Iterable[Model], batch_size: int
+):
+    """Creates lazily generated objects without holding them all in memory. Returns how many were created."""
+    count = 0
+    for batch in batched(objects, batch_size):
+        model.objects.bulk_create(batch)
+        count += len(batch)
+    return count
+
+
+def get_semester_name(start_date):
+    if start_date.month <= 5:
+        return f"Spring {start_date.year}"
+    if start_date.month <= 7:
+        return f"Summer {start_date.year}"
+    return f"Fall {start_date.year}"
+
+
+def generate_semesters(options: DatasetOptions) -> list[Semester]:
+    """The newest semester is in progress (six weeks in) so it is the active semester; older ones follow
+    every half year."""
+    today = timezone.localdate()
+    semesters = []
+    for index in range(options.semesters):
+        start_date = today - timedelta(days=42 + index * 182)
+        semesters.append(
+            Semester(
+                id=f"{start_date.year}{start_date.month:02}",
+                name=get_semester_name(start_date),
+                start_date=start_date,
+                end_date=start_date + timedelta(days=112),
+            )
+        )
+    Semester.objects.bulk_create(semesters, ignore_conflicts=True)
+    return list(
+        Semester.objects.filter(
+            pk__in=[semester.pk for semester in semesters]
+        ).order_by("-start_date")
+    )
+
+
+def generate_users(
+    rng: random.Random, options: DatasetOptions, organizations: list[Organization]
+) -> list[User]:
+    """Mostly RPI students, with a handful of external users from partner organizations."""
+    offset = User.objects.count()
+    this_year = timezone.localdate().year
+
+    def build(number: int):
+        first_name = rng.choice(FIRST_NAMES)
+        last_name = rng.choice(LAST_NAMES)
+        is_rpi = rng.random() < 0.95
+        organization = organizations[0] if is_rpi else rng.choice(organizations[1:])
+        handle = f"{last_name[:4]}{first_name[0]}{number}".lower()
+        return User(
+            email=f"{handle}@{organization.email_domain}",
+            first_name=first_name,
+            last_name=last_name,
+            role=User.RPI if is_rpi else User.EXTERNAL,
+            organization=organization,
+            rcs_id=handle if is_rpi else None,
+            graduation_year=this_year + rng.randrange(0, 4) if is_rpi else None,
+            is_approved=rng.random() < 0.97,
+            discord_user_id=str(10**17 + number) if rng.random() < 0.8 else None,
+            github_username=handle if rng.random() < 0.7 else None,
+        )
+
+    return User.objects.bulk_create(
+        (build(offset + index) for index in range(options.users)),
+        batch_size=options.batch_size,
+    )
+
+
+def generate_projects(
+    rng: random.Random,
+    options: DatasetOptions,
+    users: list[User],
+    organizations: list[Organization],
+    tags: list[ProjectTag],
+) -> list[Project]:
+    offset = Project.objects.count()
+
+    def build(number: int):
+        name = f"{rng.choice(PROJECT_WORDS)} {number}"
+        return Project(
+            name=name,
+            slug=slugify(name),
+            owner=rng.choice(users),
+            organization=organizations[0]
+            if rng.random() < 0.9
+            else rng.choice(organizations[1:]),
+            is_approved=rng.random() < 0.95,
+            description="A synthetic project generated for load testing.",
+        )
+
+    projects = Project.objects.bulk_create(
+        (build(offset + index) for index in range(options.projects)),
+        batch_size=options.batch_size,
+    )
+    Project.tags.through.objects.bulk_create(
+        (
+            Project.tags.through(project_id=project.pk, projecttag_id=tag.pk)
+            for project in projects
+            for tag in rng.sample(tags, rng.randint(1, 3))
+        ),
+        batch_size=options.batch_size,
+    )
+    return projects
+
+
+def generate_semester_enrollments(
+    rng: random.Random,
+    options: DatasetOptions,
+    semester: Semester,
+    users: list[User],
+    projects: list[Project],
+) -> tuple[list[Enrollment], list[Project]]:
+    """Enrolls a sample of users. Team sizes are long-tailed: a few popular projects get big teams while
+    most get a handful of students. Returns the enrollments and the projects active this semester."""
+    active_projects = rng.sample(projects, max(1, int(len(projects) * 0.7)))
+    project_weights = [1 / (rank + 1) ** 0.8 for rank in range(len(active_projects))]
+    credits, credit_weights = zip(*CREDIT_WEIGHTS.items(), strict=True)
+
+    enrolled_users = rng.sample(
+        users, max(1, int(len(users) * options.enrollment_rate))
+    )
+    enrollments = []
+    leads_by_project: dict[int, int] = {}
+    for user in enrolled_users:
+        roll = rng.random()
+        if roll < 0.05:
+            # Mentors and coordinators usually aren't on a team
+            enrollments.append(
+                Enrollment(
+                    semester=semester,
+                    user=user,
+                    credits=rng.choice((0, 4)),
+                    is_mentor=True,
+                    is_coordinator=roll < 0.005,
+                )
+            )
+            continue
+
+        project = rng.choices(active_projects, project_weights)[0]
+        is_project_lead = leads_by_project.get(project.pk, 0) < rng.randint(1, 2)
+        if is_project_lead:
+            leads_by_project[project.pk] = leads_by_project.get(project.pk, 0) + 1
+        enrollments.append(
+            Enrollment(
+                semester=semester,
+                user=user,
+                project=project,
+                credits=rng.choices(credits, credit_weights)[0],
+                is_project_lead=is_project_lead,
+            )
+        )
+
+    return (
+        Enrollment.objects.bulk_create(enrollments, batch_size=options.batch_size),
+        active_projects,
+    )
+
+
+def generate_small_groups(
+    options: DatasetOptions,
+    semester: Semester,
+    enrollments: list[Enrollment],
+    active_projects: list[Project],
+) -> list[SmallGroup]:
+    """Roughly eight projects per small group, with the semester's mentors split between the groups."""
+    group_count = max(1, len(active_projects) // 8)
+    small_groups = SmallGroup.objects.bulk_create(
+        SmallGroup(semester=semester, name=f"Small Group {index + 1}")
+        for index in range(group_count)
+    )
+
+    mentors = [enrollment.user_id for enrollment in enrollments if enrollment.is_mentor]
+    SmallGroup.projects.through.objects.bulk_create(
+        (
+            SmallGroup.projects.through(
+                smallgroup_id=small_groups[index % group_count].pk,
+                project_id=project.pk,
+            )
+            for index, project in enumerate(active_projects)
+        ),
+        batch_size=options.batch_size,
+    )
+    SmallGroup.mentors.through.objects.bulk_create(
+        (
+            SmallGroup.mentors.through(
+                smallgroup_id=small_groups[index % group_count].pk, user_id=user_id
+            )
+            for index, user_id in enumerate(mentors)
+        ),
+        batch_size=options.batch_size,
+    )
+    return small_groups
+
+
+def generate_meetings(
+    rng: random.Random, options: DatasetOptions, semester: Semester
+) -> list[Meeting]:
+    """Spreads the semester's meetings evenly across its weeks, in the late afternoon."""
+    types, type_weights = zip(*MEETING_TYPE_WEIGHTS.items(), strict=True)
+    days = (semester.end_date - semester.start_date).days
+    meetings = []
+    for index in range(options.meetings_per_semester):
+        day = semester.start_date + timedelta(
+            days=index * days // max(1, options.meetings_per_semester)
+        )
+        starts_at = timezone.make_aware(datetime.combine(day, time(16)))
+        type = rng.choices(types, type_weights)[0]
+        meetings.append(
+            Meeting(
+                semester=semester,
+                name=f"{dict(Meeting.TYPE_CHOICES)[type]} {index + 1}"
+                if type != Meeting.WORKSHOP
+                else f"Workshop: {rng.choice(TAG_NAMES).title()}",
+                type=type,
+                is_published=True,
+                is_attendance_taken=rng.random() < 0.95,
+                starts_at=starts_at,
+                ends_at=starts_at
+                + timedelta(hours=2 if type == Meeting.LARGE_GROUP else 1),
+            )
+        )
+    return Meeting.objects.bulk_create(meetings)
+
+
+def generate_attendances(
+    rng: random.Random,
+    options: DatasetOptions,
+    meetings: list[Meeting],
+    enrollments: list[Enrollment],
+) -> Iterator[MeetingAttendance]:
+    """Yields attendances for meetings that have already ended. Each student has their own attendance
+    rate (most attend regularly, a few rarely do), and workshops draw only a fraction of students."""
+    now = timezone.now()
+    students = [
+        enrollment.user_id for enrollment in enrollments if not enrollment.is_mentor
+    ]
+    mentors = [enrollment.user_id for enrollment in enrollments if enrollment.is_mentor]
+    attendance_rates = {user_id: rng.betavariate(5, 2) for user_id in students}
+
+    for meeting in meetings:
+        if meeting.ends_at > now:
+            continue
+        if meeting.type == Meeting.MENTOR:
+            attendees = (user_id for user_id in mentors if rng.random() < 0.8)
+        elif meeting.type == Meeting.WORKSHOP:
+            attendees = (
+                user_id for user_id in students if rng.random() < options.workshop_rate
+            )
+        else:
+            attendees = (
+                user_id
+                for user_id in students
+                if rng.random() < attendance_rates[user_id]
+            )
+
+        for user_id in attendees:
+            yield MeetingAttendance(
+                meeting=meeting,
+                user_id=user_id,
+                is_verified=rng.random() < 0.9,
+                is_added_by_admin=rng.random() < 0.02,
+            )
+
+
+def generate_pitches(
+    rng: random.Random,
+    options: DatasetOptions,
+    semester: Semester,
+    active_projects: list[Project],
+):
+    return ProjectPitch.objects.bulk_create(
+        (
+            ProjectPitch(
+                semester=semester,
+                project=project,
+                url=f"https://example.com/pitches/{semester.pk}/{project.pk}",
+            )
+            for project in active_projects
+            if rng.random() < 0.5
+        ),
+        batch_size=options.batch_size,
+    )
+
+
+def generate_dataset(options: DatasetOptions | None = None) -> GeneratedDataset:
+    """Generates a complete dataset in one transaction. The same options and seed always produce the
+    same data on an empty database."""
+    options = options or DatasetOptions()
+    rng = random.Random(options.seed)
+
+    with transaction.atomic():
+        organizations = [
+            Organization.objects.get_or_create(
+                name="RPI",
+                defaults={"email_domain": "rpi.edu", "homepage_url": "https://rpi.edu"},
+            )[0]
+        ]
+        for name in EXTERNAL_ORGANIZATIONS:
+            domain = name.lower().replace(" ", "") + ".com"
+            organizations.append(
+                Organization.objects.get_or_create(
+                    name=name,
+                    defaults={
+                        "email_domain": domain,
+                        "homepage_url": f"https://{domain}",
+                    },
+                )[0]
+            )
+        ProjectTag.objects.bulk_create(
+            (ProjectTag(name=name) for name in TAG_NAMES), ignore_conflicts=True
+        )
+        tags = list(ProjectTag.objects.filter(name__in=TAG_NAMES))
+
+        semesters = generate_semesters(options)
+        users = generate_users(rng, options, organizations)
+        projects = generate_projects(rng, options, users, organizations, tags)
+
+        counts = {"enrollments": 0, "small_groups": 0, "meetings": 0, "attendances": 0}
+        for semester in semesters:
+            enrollments, active_projects = generate_semester_enrollments(
+                rng, options, semester, users, projects
+            )
+            small_groups = generate_small_groups(
+                options, semester, enrollments, active_projects
+            )
+            generate_pitches(rng, options, semester, active_projects)
+            meetings = generate_meetings(rng, options, semester)
+
+            counts["enrollments"] += len(enrollments)
+            counts["small_groups"] += len(small_groups)
+            counts["meetings"] += len(meetings)
+            counts["attendances"] += bulk_create_in_batches(
+                MeetingAttendance,
+                generate_attendances(rng, options, meetings, enrollments),
+                options.batch_size,
+            )
+
+        rebuild_search_index()
+        changed_small_group_ids = rebuild_small_group_memberships()
+
+    # bulk_create skips the signals that normally keep caches fresh
+    clear_semester_cache(Semester, None)
+    for semester in semesters:
+        invalidate_semester_attendance_matrix(semester.pk)
+    invalidate_tags(
+        "semester",
+        "user",
+        "project",
+        "project_pitch",
+        "enrollment",
+        "meeting",
+        "small_group",
+        *map(small_group_membership_tag, changed_small_group_ids),
+    )
+
+    counts |= {
+        "semesters": len(semesters),
+        "users": len(users),
+        "projects": len(projects),
+    }
+    return GeneratedDataset(semesters, users, projects, counts)
@@ -0,0 +1,401 @@
+"""This module contains the Discord reconciliation engine, which brings the RCOS Discord server in line with the
+database by diffing the desired roles, nicknames, and scheduled events against the actual server state
+and applying only the differences in background Celery tasks."""
+
+import logging
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, TypedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from requests import HTTPError
+
+from portal.models import Enrollment, Meeting, Organization, Project, Semester, User
+from portal.services import discord
+
+logger = logging.getLogger(__name__)
+
+DISCORD_SYNC_CONCURRENCY = 4
+"""How many Celery tasks apply a job's operations at once. Every member's operations stay in one
+task so they run in order, and the shared client keeps each task within Discord's rate limits."""
+DISCORD_SYNC_JOB_TIMEOUT = 60 * 60 * 24
+DISCORD_SYNC_MAX_REPORTED_ERRORS = 100
+DISCORD_NICKNAME_MAX_LENGTH = 32
+
+ADD_ROLE = "add_role"
+REMOVE_ROLE = "remove_role"
+SET_NICKNAME = "set_nickname"
+CREATE_EVENT = "create_event"
+UPDATE_EVENT = "update_event"
+DELETE_EVENT = "delete_event"
+
+
+class DiscordOperation(TypedDict, total=False):
+    type: str
+    member_id: str
+    role_id: str
+    nickname: str
+    meeting_id: int
+    event_id: str
+    params: dict[str, Any]
+
+
+class DiscordSyncJob(TypedDict):
+    id: str
+    semester_id: str
+    project_ids: list[int] | None
+    """Limits the sync to these projects' members, or None to sync the whole server."""
+    status: str
+    """One of "pending", "planning", "applying", "completed", or "failed"."""
+    total: int
+    done: int
+    failed: int
+    errors: list[str]
+    error: str
+
+
+def discord_sync_job_cache_key(job_id: str):
+    return f"discord_sync_job:{job_id}"
+
+
+LATEST_DISCORD_SYNC_JOB_CACHE_KEY = "discord_sync_job:latest"
+
+
+def ensure_discord_roles(projects: list[Project]):
+    """Creates the Discord roles that active projects and organizations are missing. This is the only
+    step that runs before the plan, since role assignments need the role IDs."""
+    organizations = Organization.objects.filter(
+        discord_role_id="", users__isnull=False
+    ).distinct()
+    for role_owner in [*projects, *organizations]:
+        if role_owner.discord_role_id:
+            continue
+        try:
+            role = discord.create_role(
+                {"name": role_owner.name, "hoist": True, "mentionable": True}
+            )
+        except HTTPError as e:
+            logger.exception(
+                "Failed to create Discord role for %s", role_owner, exc_info=e
+            )
+            continue
+        role_owner.discord_role_id = role["id"]
+        # Update directly to skip the save signals
+        type(role_owner).objects.filter(pk=role_owner.pk).update(
+            discord_role_id=role["id"]
+        )
+
+
+def get_desired_member_state(
+    semester: Semester, project_ids: list[int] | None
+) -> dict[str, tuple[set[str], str, set[str]]]:
+    """Computes each linked user's desired roles and nickname.
+
+    Returns
+    -------
+        a map of Discord member ID to (desired roles, desired nickname, removable roles). Only the
+        semester's project roles and the Project Lead role are removable, and only from members
+        enrolled in the semester, so alumni keep the roles of the semesters they were in
+    """
+    users = User.objects.exclude(discord_user_id="").exclude(
+        discord_user_id__isnull=True
+    )
+    enrollments = Enrollment.objects.filter(semester=semester).select_related("project")
+    if project_ids is not None:
+        users = users.filter(
+            enrollments__semester=semester, enrollments__project__in=project_ids
+        ).distinct()
+        enrollments = enrollments.filter(project__in=project_ids)
+
+    semester_role_ids = {settings.DISCORD_PROJECT_LEAD_ROLE_ID}
+    semester_role_ids.update(
+        Project.objects.filter(enrollments__semester=semester)
+        .exclude(discord_role_id="")
+        .values_list("discord_role_id", flat=True)
+    )
+
+    enrollments_by_user_id = {
+        enrollment.user_id: enrollment for enrollment in enrollments
+    }
+    organization_role_ids = dict(
+        Organization.objects.exclude(discord_role_id="").values_list(
+            "pk", "discord_role_id"
+        )
+    )
+
+    desired_state: dict[str, tuple[set[str], str, set[str]]] = {}
+    for user in users:
+        roles: set[str] = set()
+        if user.is_approved:
+            roles.add(settings.DISCORD_VERIFIED_ROLE_ID)
+        if user.organization_id in organization_role_ids:
+            roles.add(organization_role_ids[user.organization_id])
+
+        enrollment = enrollments_by_user_id.get(user.pk)
+        if enrollment and enrollment.project and enrollment.project.discord_role_id:
+            roles.add(enrollment.project.discord_role_id)
+            if enrollment.is_project_lead:
+                roles.add(settings.DISCORD_PROJECT_LEAD_ROLE_ID)
+
+        desired_state[user.discord_user_id] = (
+            roles,
+            user.display_name[:DISCORD_NICKNAME_MAX_LENGTH],
+            semester_role_ids if enrollment else set(),
+        )
+
+    return desired_state
+
+
+def plan_member_operations(
+    desired_state: dict[str, tuple[set[str], str, set[str]]],
+    members: list[discord.ServerMember],
+) -> list[DiscordOperation]:
+    """Diffs the desired member state against the actual server members. Users who aren't
+    on the server are skipped since they must join through the portal first."""
+    operations: list[DiscordOperation] = []
+    for member in members:
+        member_id = member["user"]["id"]
+        if member_id not in desired_state:
+            continue
+        desired_roles, desired_nickname, removable_role_ids = desired_state[member_id]
+        actual_roles = set(member["roles"])
+
+        for role_id in sorted(desired_roles - actual_roles):
+            operations.append(
+                {"type": ADD_ROLE, "member_id": member_id, "role_id": role_id}
+            )
+        for role_id in sorted((actual_roles & removable_role_ids) - desired_roles):
+            operations.append(
+                {"type": REMOVE_ROLE, "member_id": member_id, "role_id": role_id}
+            )
+        if desired_nickname and member.get("nick") != desired_nickname:
+            operations.append(
+                {
+                    "type": SET_NICKNAME,
+                    "member_id": member_id,
+                    "nickname": desired_nickname,
+                }
+            )
+
+    return operations
+
+
+def is_event_outdated(event: discord.ServerScheduledEvent, params: dict[str, Any]):
+    location = (event.get("entity_metadata") or {}).get("location")
+    return (
+        event["name"] != params["name"]
+        or event.get("description", "") != params["description"]
+        or location != params["location"]
+        or datetime.fromisoformat(event["scheduled_start_time"])
+        != datetime.fromisoformat(params["scheduled_start_time"])
+        or datetime.fromisoformat(
+            event.get("scheduled_end_time") or params["scheduled_end_time"]
+        )
+        != datetime.fromisoformat(params["scheduled_end_time"])
+    )
+
+
+def plan_event_operations(
+    semester: Semester, events: list[discord.ServerScheduledEvent]
+) -> list[DiscordOperation]:
+    """Diffs the semester's upcoming and ongoing meetings against the server's scheduled events."""
+    events_by_id = {event["id"]: event for event in events}
+
+    operations: list[DiscordOperation] = []
+    for meeting in Meeting.objects.filter(
+        semester=semester, ends_at__gt=timezone.now()
+    ).select_related("room"):
+        event = events_by_id.get(meeting.discord_event_id)
+        if not meeting.is_published:
+            if event:
+                operations.append(
+                    {
+                        "type": DELETE_EVENT,
+                        "meeting_id": meeting.pk,
+                        "event_id": event["id"],
+                    }
+                )
+            continue
+
+        params = meeting.get_discord_event_params()
+        if event is None:
+            operations.append(
+                {"type": CREATE_EVENT, "meeting_id": meeting.pk, "params": params}
+            )
+        elif is_event_outdated(event, params):
+            operations.append(
+                {
+                    "type": UPDATE_EVENT,
+                    "meeting_id": meeting.pk,
+                    "event_id": event["id"],
+                    "params": params,
+                }
+            )
+
+    return operations
+
+
+def plan_discord_sync(
+    semester: Semester, project_ids: list[int] | None = None
+) -> list[DiscordOperation]:
+    """Computes the operations needed to bring the Discord server in line with the database.
+
+    The actual state is fetched in bulk (every member and every scheduled event) rather than per user.
+    Scheduled events are only reconciled for full syncs, not project-scoped ones.
+    """
+    projects = Project.objects.filter(
+        enrollments__semester=semester,
+        **({"pk__in": project_ids} if project_ids is not None else {}),
+    ).distinct()
+    ensure_discord_roles(list(projects))
+
+    operations = plan_member_operations(
+        get_desired_member_state(semester, project_ids), discord.get_server_members()
+    )
+    if project_ids is None:
+        operations.extend(plan_event_operations(semester, discord.get_server_events()))
+
+    return operations
+
+
+def apply_operation(operation: DiscordOperation):
+    match operation["type"]:
+        case "add_role":
+            discord.add_role_to_member(operation["member_id"], operation["role_id"])
+        case "remove_role":
+            discord.remove_role_from_member(
+                operation["member_id"], operation["role_id"]
+            )
+        case "set_nickname":
+            discord.set_member_nickname(operation["member_id"], operation["nickname"])
+        case "create_event":
+            event = discord.create_server_event(**operation["params"])
+            Meeting.objects.filter(pk=operation["meeting_id"]).update(
+                discord_event_id=event["id"]
+            )
+        case "update_event":
+            discord.update_server_event(operation["event_id"], **operation["params"])
+        case "delete_event":
+            discord.delete_server_event(operation["event_id"])
+            Meeting.objects.filter(pk=operation["meeting_id"]).update(
+                discord_event_id=""
+            )
+
+
+def partition_operations(operations: list[DiscordOperation], lanes: int):
+    """Splits operations into at most `lanes` lists, keeping each member's or meeting's operations together and in order."""
+    grouped: dict[str, list[DiscordOperation]] = defaultdict(list)
+    for operation in operations:
+        key = operation.get("member_id") or f"meeting:{operation.get('meeting_id')}"
+        grouped[key].append(operation)
+
+    partitions: list[list[DiscordOperation]] = [[] for _ in range(lanes)]
+    for index, group in enumerate(grouped.values()):
+        partitions[index % lanes].extend(group)
+    return [partition for partition in partitions if partition]
+
+
+def create_discord_sync_job(
+    semester: Semester, project_ids: list[int] | None = None
+) -> DiscordSyncJob:
+    """Stores a pending sync job in the cache. The caller is responsible for enqueuing
+    `portal.tasks.run_discord_sync` with the returned job's ID."""
+    job: DiscordSyncJob = {
+        "id": uuid.uuid4().hex,
+        "semester_id": semester.pk,
+        "project_ids": project_ids,
+        "status": "pending",
+        "total": 0,
+        "done": 0,
+        "failed": 0,
+        "errors": [],
+        "error": "",
+    }
+    save_discord_sync_job(job)
+    cache.set(LATEST_DISCORD_SYNC_JOB_CACHE_KEY, job["id"], DISCORD_SYNC_JOB_TIMEOUT)
+    return job
+
+
+def save_discord_sync_job(job: DiscordSyncJob):
+    cache.set(discord_sync_job_cache_key(job["id"]), job, DISCORD_SYNC_JOB_TIMEOUT)
+
+
+def get_discord_sync_job(job_id: str) -> DiscordSyncJob | None:
+    """Fetches a job along with the progress counters its tasks increment."""
+    job: DiscordSyncJob | None = cache.get(discord_sync_job_cache_key(job_id))
+    if job is None:
+        return None
+
+    key = discord_sync_job_cache_key(job_id)
+    counters = cache.get_many([f"{key}:done", f"{key}:failed"])
+    job["done"] = counters.get(f"{key}:done", 0)
+    job["failed"] = counters.get(f"{key}:failed", 0)
+    job["errors"] = [
+        error
+        for lane_errors in cache.get_many(
+            [f"{key}:errors:{lane}" for lane in range(DISCORD_SYNC_CONCURRENCY)]
+        ).values()
+        for error in lane_errors
+    ]
+    if job["status"] == "applying" and job["done"] + job["failed"] >= job["total"]:
+        job["status"] = "completed"
+    return job
+
+
+def start_discord_sync_job(job_id: str) -> list[list[DiscordOperation]]:
+    """Plans a job and returns its operations split into lanes for `apply_discord_sync_operations`."""
+    job = get_discord_sync_job(job_id)
+    if job is None:
+        logger.warning("Discord sync job %s expired before it ran", job_id)
+        return []
+
+    job["status"] = "planning"
+    save_discord_sync_job(job)
+
+    try:
+        semester = Semester.objects.get(pk=job["semester_id"])
+        operations = plan_discord_sync(semester, job["project_ids"])
+    except Exception as e:
+        logger.exception("Failed to plan Discord sync job %s", job_id)
+        job["status"] = "failed"
+        job["error"] = repr(e)
+        save_discord_sync_job(job)
+        return []
+
+    key = discord_sync_job_cache_key(job_id)
+    cache.set_many({f"{key}:done": 0, f"{key}:failed": 0}, DISCORD_SYNC_JOB_TIMEOUT)
+    job["total"] = len(operations)
+    job["status"] = "applying" if operations else "completed"
+    save_discord_sync_job(job)
+
+    logger.info(
+        "Planned %d Discord operations for sync job %s", len(operations), job_id
+    )
+    return partition_operations(operations, DISCORD_SYNC_CONCURRENCY)
+
+
+def apply_discord_sync_operations(
+    job_id: str, lane: int, operations: list[DiscordOperation]
+):
+    """Applies one lane of a job's operations in order, counting successes and failures as it goes."""
+    key = discord_sync_job_cache_key(job_id)
+    errors: list[str] = []
+    for operation in operations:
+        try:
+            apply_operation(operation)
+            cache.incr(f"{key}:done")
+        except Exception as e:
+            logger.exception("Failed Discord operation %s", operation, exc_info=e)
+            cache.incr(f"{key}:failed")
+            if len(errors) < DISCORD_SYNC_MAX_REPORTED_ERRORS:
+                errors.append(f"{operation['type']} {operation}: {e}")
+                cache.set(f"{key}:errors:{lane}", errors, DISCORD_SYNC_JOB_TIMEOUT)
+
+    # Member operations leave the guild snapshot alone so a sync doesn't rebuild it once per change,
+    # so the last lane to finish invalidates it once for the whole job
+    job = get_discord_sync_job(job_id)
+    if job is not None and job["status"] == "completed":
+        discord.invalidate_guild_snapshot()
@@ -0,0 +1,309 @@
+"""This module contains the streaming CSV exports of attendance, enrollment, and gradebook data.
+
+Rows are formatted one at a time through a pseudo-buffer and streamed in chunks with a
+`StreamingHttpResponse`, so an export holds only its current chunk in memory however large the semester.
+Rows are read with `QuerySet.iterator` (server-side cursors on PostgreSQL) selecting only the exported
+columns, and `GZipMiddleware` compresses the stream on the fly for clients that accept gzip."""
+
+import csv
+from collections.abc import Iterable, Iterator
+from typing import Any, TypedDict
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Func, OuterRef, QuerySet, Subquery
+from django.db.models.functions import Coalesce, Lower
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from portal.attendance import (
+    EXPECTED_MEETING_TYPES,
+    AttendanceTotals,
+    SemesterAttendanceMatrix,
+)
+from portal.models import (
+    Enrollment,
+    Meeting,
+    MeetingAttendance,
+    ProjectPresentation,
+    ProjectProposal,
+    StatusUpdate,
+    StatusUpdateSubmission,
+    User,
+)
+
+QUERY_CHUNK_SIZE = 2000
+"""Rows fetched from the database per round trip."""
+
+CSV_CHUNK_ROWS = 500
+"""Rows sent per chunk of the response, so the stream isn't made of one tiny string per row."""
+
+AttendanceExportRow = TypedDict(
+    "AttendanceExportRow",
+    {
+        "user id": str,
+        "given name": str,
+        "family name": str,
+        "grade1": float,
+        "totalgrade": float,
+    },
+)
+"""A row of a Submitty grade upload. Semester-wide exports have a grade per meeting (`grade1`, `grade2`, ...)."""
+
+ENROLLMENT_EXPORT_COLUMNS = {
+    "rcs id": "user__rcs_id",
+    "given name": "user__first_name",
+    "family name": "user__last_name",
+    "email": "user__email",
+    "project": "project__name",
+    "credits": "credits",
+    "project lead": "is_project_lead",
+    "mentor": "is_mentor",
+    "coordinator": "is_coordinator",
+    "faculty advisor": "is_faculty_advisor",
+}
+"""The header and field of each column of an enrollment export."""
+
+MEETING_TYPE_NAMES = dict(Meeting.TYPE_CHOICES)
+
+GRADEBOOK_COLUMNS = {
+    "rcs id": "user__rcs_id",
+    "given name": "user__first_name",
+    "family name": "user__last_name",
+    "project": "project__name",
+    "credits": "credits",
+    **{
+        f"{MEETING_TYPE_NAMES[meeting_type].lower()}s {column}": f"{meeting_type}_{column}"
+        for meeting_type in EXPECTED_MEETING_TYPES
+        for column in ("attended", "total")
+    },
+    "status updates submitted": "status_updates_submitted",
+    "status updates total": "status_updates_total",
+    "status update grade": "status_update_grade",
+    "proposal grade": "proposal_grade",
+    "presentation grade": "presentation_grade",
+    "final grade": "final_grade",
+}
+"""The header and field (or annotation of `get_semester_gradebook`) of each column of a gradebook export."""
+
+
+class Echo:
+    """A pseudo-buffer that returns what is written to it instead of storing it, so `csv.writer`
+    can format rows without collecting them."""
+
+    def write(self, value: str):
+        return value
+
+
+def iter_csv(header: Iterable[Any], rows: Iterable[Iterable[Any]]) -> Iterator[str]:
+    writer = csv.writer(Echo())
+    chunk = [writer.writerow(header)]
+    for row in rows:
+        chunk.append(writer.writerow(row))
+        if len(chunk) >= CSV_CHUNK_ROWS:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
+
+
+def streaming_csv_response(
+    filename: str, header: Iterable[Any], rows: Iterable[Iterable[Any]]
+):
+    return StreamingHttpResponse(
+        iter_csv(header, rows),
+        content_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}.csv"'},
+    )
+
+
+def streaming_json_response(data: dict[str, Any], key: str, rows: Iterable[Any]):
+    """Streams `data` as a JSON object with the rows as a list under `key`, encoding the rows in
+    chunks as they are read."""
+    encoder = DjangoJSONEncoder()
+    prefix = encoder.encode({**data, key: []})[: -len("[]}")]
+
+    def iter_json() -> Iterator[str]:
+        chunk = [prefix, "["]
+        for index, row in enumerate(rows):
+            chunk.append(("," if index else "") + encoder.encode(row))
+            if len(chunk) >= CSV_CHUNK_ROWS:
+                yield "".join(chunk)
+                chunk = []
+        chunk.append("]}")
+        yield "".join(chunk)
+
+    return StreamingHttpResponse(iter_json(), content_type="application/json")
+
+
+def iter_semester_students(semester_id: str) -> Iterator[tuple[int, str, str, str]]:
+    """Yields the (user ID, RCS ID, given name, family name) of every student enrolled in the
+    semester, ordered by user ID like the semester attendance matrix."""
+    return (
+        User.rpi.filter(enrollments__semester_id=semester_id)
+        .distinct()
+        .order_by("pk")
+        .values_list("pk", "rcs_id", "first_name", "last_name")
+        .iterator(chunk_size=QUERY_CHUNK_SIZE)
+    )
+
+
+def iter_meeting_attendance_rows(meeting_id: int) -> Iterator[tuple]:
+    """Yields a Submitty row for every verified attendee of the meeting."""
+    for rcs_id, first_name, last_name in (
+        MeetingAttendance.objects.filter(meeting_id=meeting_id, is_verified=True)
+        .order_by(Lower("user__first_name"), Lower("user__last_name"))
+        .values_list("user__rcs_id", "user__first_name", "user__last_name")
+        .iterator(chunk_size=QUERY_CHUNK_SIZE)
+    ):
+        yield rcs_id, first_name, last_name, 1, 1
+
+
+def get_graded_meetings(semester_id: str) -> list[tuple[int, bool]]:
+    """Returns the (ID, is attendance taken) of every meeting of the semester students are expected
+    at that has started, in the order their grade columns appear."""
+    return list(
+        Meeting.objects.filter(
+            semester_id=semester_id,
+            type__in=EXPECTED_MEETING_TYPES,
+            starts_at__lte=timezone.now(),
+        )
+        .order_by("starts_at")
+        .values_list("pk", "is_attendance_taken")
+    )
+
+
+def iter_semester_submitty_rows(
+    semester_id: str, meetings: list[tuple[int, bool]]
+) -> Iterator[tuple]:
+    """Yields a Submitty row for every student of the semester with a grade per meeting: 1 if they
+    were verified as attending (or attendance wasn't taken), otherwise 0.
+
+    Students and verified attendances are both streamed in user ID order and merged, so memory use
+    doesn't grow with the number of students or attendances."""
+    columns = {meeting_id: column for column, (meeting_id, _) in enumerate(meetings)}
+    default_grades = [0 if is_taken else 1 for _, is_taken in meetings]
+
+    attendances = (
+        MeetingAttendance.objects.filter(
+            meeting_id__in=[
+                meeting_id for meeting_id, is_taken in meetings if is_taken
+            ],
+            is_verified=True,
+        )
+        .order_by("user_id")
+        .values_list("user_id", "meeting_id")
+        .iterator(chunk_size=QUERY_CHUNK_SIZE)
+    )
+    attendance = next(attendances, None)
+
+    for user_id, rcs_id, first_name, last_name in iter_semester_students(semester_id):
+        grades = default_grades.copy()
+        while attendance is not None and attendance[0] <= user_id:
+            if attendance[0] == user_id:
+                grades[columns[attendance[1]]] = 1
+            attendance = next(attendances, None)
+        yield rcs_id, first_name, last_name, *grades, sum(grades)
+
+
+def iter_semester_attendance_rows(
+    matrix: SemesterAttendanceMatrix,
+) -> Iterator[tuple[tuple[str, str, str], bytearray, AttendanceTotals]]:
+    """Yields each row of the semester attendance matrix with the student's (RCS ID, given name,
+    family name) instead of their ID, streaming the names alongside the matrix's rows."""
+    students = iter_semester_students(matrix.semester_id)
+    student = next(students, None)
+
+    for user_id, statuses, totals in matrix.iter_rows():
+        while student is not None and student[0] < user_id:
+            student = next(students, None)
+        if student is None or student[0] != user_id:
+            # Not a student anymore since the matrix was built
+            continue
+        yield student[1:], statuses, totals
+
+
+def iter_semester_enrollment_rows(semester_id: str) -> Iterator[tuple]:
+    return (
+        Enrollment.objects.filter(semester_id=semester_id)
+        .order_by("user_id")
+        .values_list(*ENROLLMENT_EXPORT_COLUMNS.values())
+        .iterator(chunk_size=QUERY_CHUNK_SIZE)
+    )
+
+
+def aggregate_subquery(queryset: QuerySet, function: str, field="pk"):
+    """Wraps an aggregate over the whole queryset (e.g. `COUNT`) as a scalar subquery, correlated
+    with the outer query if the queryset uses `OuterRef`. Unlike `annotate(Count(...))` across
+    several relations, the subqueries don't multiply each other's rows."""
+    return Subquery(
+        queryset.order_by()
+        .annotate(value=Func(F(field), function=function))
+        .values("value")
+    )
+
+
+def get_semester_gradebook(semester_id: str) -> QuerySet:
+    """Returns every student's gradebook row for the semester, computed by a single query: verified
+    attendance by meeting type, status update submissions and grades, and their project's proposal
+    and presentation grades. Like the attendance matrix, only meetings with attendance taken count."""
+    attendances = MeetingAttendance.objects.filter(
+        user_id=OuterRef("user_id"),
+        meeting__semester_id=semester_id,
+        meeting__is_attendance_taken=True,
+        is_verified=True,
+    )
+    meetings = Meeting.objects.filter(semester_id=semester_id, is_attendance_taken=True)
+    submissions = StatusUpdateSubmission.objects.filter(
+        user_id=OuterRef("user_id"), status_update__semester_id=semester_id
+    )
+    project_grade = {
+        "semester_id": semester_id,
+        "project_id": OuterRef("project_id"),
+    }
+
+    meeting_counts = {}
+    for meeting_type in EXPECTED_MEETING_TYPES:
+        meeting_counts[f"{meeting_type}_attended"] = Coalesce(
+            aggregate_subquery(attendances.filter(meeting__type=meeting_type), "COUNT"),
+            0,
+        )
+        meeting_counts[f"{meeting_type}_total"] = aggregate_subquery(
+            meetings.filter(type=meeting_type), "COUNT"
+        )
+
+    return (
+        Enrollment.objects.filter(
+            semester_id=semester_id,
+            user__role=User.RPI,
+            user__is_active=True,
+            user__is_approved=True,
+        )
+        .annotate(
+            **meeting_counts,
+            status_updates_submitted=Coalesce(
+                aggregate_subquery(submissions, "COUNT"), 0
+            ),
+            status_updates_total=aggregate_subquery(
+                StatusUpdate.objects.filter(
+                    semester_id=semester_id, opens_at__lte=timezone.now()
+                ),
+                "COUNT",
+            ),
+            status_update_grade=aggregate_subquery(submissions, "SUM", "grade"),
+            proposal_grade=Subquery(
+                ProjectProposal.objects.filter(**project_grade).values("grade")
+            ),
+            presentation_grade=Subquery(
+                ProjectPresentation.objects.filter(**project_grade).values("grade")
+            ),
+        )
+        .order_by("user_id")
+    )
+
+
+def iter_semester_gradebook_rows(semester_id: str) -> Iterator[tuple]:
+    return (
+        get_semester_gradebook(semester_id)
+        .values_list(*GRADEBOOK_COLUMNS.values())
+        .iterator(chunk_size=QUERY_CHUNK_SIZE)
+    )
@@ -0,0 +1,608 @@
+"""This module contains the CSV import pipelines used by the admin import pages.
+
+Each importer takes the parsed rows of an uploaded CSV and returns an `ImportRowResult` for every row,
+so failures are reported back to the admin instead of being silently skipped. Uploads are processed
+in the background as import jobs whose progress is tracked in the cache.
+"""
+
+import logging
+import uuid
+from collections.abc import Callable, Iterable
+from csv import DictReader
+from dataclasses import asdict, dataclass
+from io import StringIO
+from typing import Any, TypedDict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from portal.attendance import invalidate_semester_attendance_matrix
+from portal.cache import invalidate_instances_tags
+from portal.models import (
+    Enrollment,
+    Organization,
+    Project,
+    ProjectPitch,
+    Semester,
+    SmallGroup,
+    User,
+    set_new_user_email_defaults,
+)
+from portal.search import index_users_and_dependents
+from portal.small_groups import sync_user_memberships
+
+logger = logging.getLogger(__name__)
+
+SubmittyCSVRow = TypedDict(
+    "SubmittyCSVRow",
+    {
+        "First Name": str,
+        "Last Name": str,
+        "User ID": str,
+        "Email": str,
+        "Secondary Email": str,
+        "Registration Section": str,
+        "Rotation Section": int,
+        "Group": str,
+    },
+)
+
+# e.g. "Frank,Matranga,merchb,00001_nib2,BidOS,4,9"
+SubmittyWithTeamsCSVRow = TypedDict(
+    "SubmittyWithTeamsCSVRow",
+    {
+        "Given Name": str,
+        "Family Name": str,
+        "User ID": str,  # RCS ID
+        "Team ID": str,  # {id}_{project lead rcs id}
+        "Team Name": str,  # project name
+        "Team Registration Section": str,
+        "Team Rotating Section": str,
+    },
+)
+
+GoogleFormProjectPitchRow = TypedDict(
+    "GoogleFormProjectPitchRow",
+    {
+        "Timestamp": str,
+        "Email Address": str,
+        "First Name": str,
+        "Last Name": str,
+        "RPI Email (@rpi.edu)": str,
+        "What is the name of the project?": str,
+        "What is your project about?": int,
+        "Has this project been worked on before in RCOS?": str,
+        "Pitch Slide": str,
+    },
+)
+
+
+@dataclass
+class ImportRowResult:
+    """The outcome of importing a single CSV row."""
+
+    CREATED = "created"
+    UPDATED = "updated"
+    SKIPPED = "skipped"
+    ERROR = "error"
+
+    row_number: int
+    """The line number of the row in the CSV file (the header is line 1)."""
+    identifier: str
+    """What the row refers to, e.g. an email, to display alongside the status."""
+    status: str
+    message: str = ""
+
+
+@dataclass
+class ParsedEnrollmentRow:
+    row_number: int
+    email: str
+    rcs_id: str
+    first_name: str
+    last_name: str
+    credits: int
+
+
+def summarize_import_results(results: list[ImportRowResult]) -> dict[str, int]:
+    """Counts the results by status, e.g. `{"created": 10, "updated": 2, ...}`."""
+    summary = {
+        ImportRowResult.CREATED: 0,
+        ImportRowResult.UPDATED: 0,
+        ImportRowResult.SKIPPED: 0,
+        ImportRowResult.ERROR: 0,
+    }
+    for result in results:
+        summary[result.status] += 1
+    return summary
+
+
+def parse_submitty_enrollment_rows(
+    rows: Iterable[SubmittyCSVRow], first_row_number: int = 2
+) -> tuple[list[ParsedEnrollmentRow], list[ImportRowResult]]:
+    """Validates every row up front, returning the usable rows and results for the rejected ones."""
+    parsed_rows: list[ParsedEnrollmentRow] = []
+    results: list[ImportRowResult] = []
+    seen_rcs_ids: dict[str, int] = {}
+
+    for row_number, row in enumerate(rows, start=first_row_number):
+        try:
+            email = row["Email"].strip().lower()
+        except (KeyError, AttributeError):
+            results.append(
+                ImportRowResult(
+                    row_number, "", ImportRowResult.ERROR, "Missing the Email column."
+                )
+            )
+            continue
+
+        if not email:
+            results.append(
+                ImportRowResult(row_number, "", ImportRowResult.SKIPPED, "No email.")
+            )
+            continue
+
+        if "@" not in email:
+            results.append(
+                ImportRowResult(
+                    row_number, email, ImportRowResult.ERROR, "Invalid email."
+                )
+            )
+            continue
+
+        rcs_id = email.removesuffix("@rpi.edu")
+        if rcs_id in seen_rcs_ids:
+            results.append(
+                ImportRowResult(
+                    row_number,
+                    email,
+                    ImportRowResult.SKIPPED,
+                    f"Duplicate of row {seen_rcs_ids[rcs_id]}.",
+                )
+            )
+            continue
+        seen_rcs_ids[rcs_id] = row_number
+
+        try:
+            credits = int(row.get("Registration Section") or 0)
+        except ValueError:
+            credits = 0
+
+        parsed_rows.append(
+            ParsedEnrollmentRow(
+                row_number=row_number,
+                email=email,
+                rcs_id=rcs_id,
+                first_name=(row.get("First Name") or "").strip(),
+                last_name=(row.get("Last Name") or "").strip(),
+                credits=credits,
+            )
+        )
+
+    return parsed_rows, results
+
+
+def import_submitty_enrollments(
+    semester: Semester, rows: Iterable[SubmittyCSVRow], first_row_number: int = 2
+) -> list[ImportRowResult]:
+    """Upserts users and their enrollments for the given semester from a Submitty class list.
+
+    Existing users are matched by RCS ID or email with a single query, and all writes happen
+    in bulk inside one transaction so a failure leaves the given rows untouched. Import jobs call
+    this once per chunk, so a failed job keeps the chunks imported before it (see `run_import_job`).
+    """
+    parsed_rows, results = parse_submitty_enrollment_rows(rows, first_row_number)
+    if not parsed_rows:
+        return sorted(results, key=lambda result: result.row_number)
+
+    # Prefetch existing users and their enrollments for this semester
+    # Emails are matched case-insensitively since users may have been stored with mixed case
+    existing_users = User.objects.annotate(lower_email=Lower("email")).filter(
+        Q(rcs_id__in=[row.rcs_id for row in parsed_rows])
+        | Q(lower_email__in=[row.email for row in parsed_rows])
+    )
+    users_by_rcs_id = {user.rcs_id: user for user in existing_users if user.rcs_id}
+    users_by_email = {user.email.lower(): user for user in existing_users}
+    organizations_by_domain: dict[str, Organization] = {}
+    for organization in Organization.objects.all():
+        for domain in (organization.email_domain, organization.email_domain_secondary):
+            if domain:
+                organizations_by_domain[domain] = organization
+
+    with transaction.atomic():
+        new_users: list[User] = []
+        updated_users: list[User] = []
+        imported_rows: list[tuple[ParsedEnrollmentRow, User]] = []
+        rows_by_user_pk: dict[int, int] = {}
+        for row in parsed_rows:
+            user = users_by_rcs_id.get(row.rcs_id) or users_by_email.get(row.email)
+            if user is None:
+                user = User(
+                    email=row.email, first_name=row.first_name, last_name=row.last_name
+                )
+                # bulk_create skips `pre_save_user`, so its defaults are applied here
+                set_new_user_email_defaults(
+                    user, organizations_by_domain.get(row.email.split("@")[1])
+                )
+                new_users.append(user)
+            elif user.pk in rows_by_user_pk:
+                # e.g. one row matched the user by RCS ID and another by email
+                results.append(
+                    ImportRowResult(
+                        row.row_number,
+                        row.email,
+                        ImportRowResult.SKIPPED,
+                        f"Duplicate of row {rows_by_user_pk[user.pk]}.",
+                    )
+                )
+                continue
+            else:
+                rows_by_user_pk[user.pk] = row.row_number
+                if (not user.first_name and row.first_name) or (
+                    not user.last_name and row.last_name
+                ):
+                    user.first_name = user.first_name or row.first_name
+                    user.last_name = user.last_name or row.last_name
+                    updated_users.append(user)
+            imported_rows.append((row, user))
+
+        User.objects.bulk_create(new_users)
+        User.objects.bulk_update(updated_users, ["first_name", "last_name"])
+
+        user_pks = [user.pk for _, user in imported_rows]
+        enrollments_by_user_id = {
+            enrollment.user_id: enrollment
+            for enrollment in Enrollment.objects.filter(
+                semester=semester, user__in=user_pks
+            )
+        }
+
+        new_enrollments: list[Enrollment] = []
+        updated_enrollments: list[Enrollment] = []
+        for row, user in imported_rows:
+            enrollment = enrollments_by_user_id.get(user.pk)
+            if enrollment is None:
+                new_enrollments.append(
+                    Enrollment(semester=semester, user=user, credits=row.credits)
+                )
+                results.append(
+                    ImportRowResult(
+                        row.row_number,
+                        row.email,
+                        ImportRowResult.CREATED,
+                        "Created enrollment.",
+                    )
+                )
+            elif enrollment.credits != row.credits:
+                enrollment.credits = row.credits
+                updated_enrollments.append(enrollment)
+                results.append(
+                    ImportRowResult(
+                        row.row_number,
+                        row.email,
+                        ImportRowResult.UPDATED,
+                        f"Updated credits to {row.credits}.",
+                    )
+                )
+            else:
+                results.append(
+                    ImportRowResult(
+                        row.row_number,
+                        row.email,
+                        ImportRowResult.SKIPPED,
+                        "Already enrolled.",
+                    )
+                )
+
+        Enrollment.objects.bulk_create(new_enrollments)
+        Enrollment.objects.bulk_update(updated_enrollments, ["credits"])
+
+        # Bulk writes skip the signals that keep derived data current, so it is refreshed here
+        index_users_and_dependents(user.pk for user in new_users + updated_users)
+        sync_user_memberships(semester.pk, user_pks)
+
+    transaction.on_commit(
+        lambda: refresh_imported_enrollment_caches(
+            semester, new_users + updated_users, new_enrollments + updated_enrollments
+        )
+    )
+
+    logger.info("Imported %d Submitty enrollments for %s", len(parsed_rows), semester)
+
+    return sorted(results, key=lambda result: result.row_number)
+
+
+def refresh_imported_enrollment_caches(
+    semester: Semester, users: list[User], enrollments: list[Enrollment]
+):
+    invalidate_instances_tags(User, users)
+    invalidate_instances_tags(Enrollment, enrollments)
+    invalidate_semester_attendance_matrix(semester.pk)
+
+
+def import_submitty_team_row(
+    semester: Semester, row: SubmittyWithTeamsCSVRow, row_number: int
+) -> ImportRowResult:
+    rcs_id = row["User ID"]
+    # Find or create user
+    try:
+        user = User.objects.get(rcs_id=rcs_id)
+    except User.DoesNotExist:
+        user = User(email=rcs_id + "@rpi.edu")
+
+    if not user.first_name:
+        user.first_name = row["Given Name"]
+    if not user.last_name:
+        user.last_name = row["Family Name"]
+
+    user.save()
+    message = ""
+    try:
+        credits = int(row["Team Registration Section"])
+        if not (0 <= credits <= 4):
+            credits = 0
+    except ValueError:
+        message = f"Failed to parse credits '{row['Team Registration Section']}', defaulting to 0. "
+        credits = 0
+
+    defaults: dict[str, Any] = {"credits": credits}
+
+    # Upsert project
+    if row["Team Name"].strip():
+        owner_rcs_id = row["Team ID"].split("_")[1]
+        owner = User.objects.filter(rcs_id=owner_rcs_id).first()
+        project, _ = Project.objects.update_or_create(
+            name__iexact=row["Team Name"],
+            defaults={
+                "owner": owner,
+                "name": row["Team Name"],
+                "is_approved": True,
+            },
+        )
+        defaults["project"] = project
+        defaults["is_project_lead"] = rcs_id == owner_rcs_id
+
+        # Upsert small group
+        small_group, _ = SmallGroup.objects.get_or_create(
+            semester=semester,
+            name=f"Small Group {row['Team Rotating Section']}",
+        )
+        small_group.projects.add(project)
+        message += f"Added to {project}."
+
+    # Upsert enrollment
+    _, is_new = Enrollment.objects.update_or_create(
+        semester=semester, user=user, defaults=defaults
+    )
+
+    return ImportRowResult(
+        row_number,
+        rcs_id,
+        ImportRowResult.CREATED if is_new else ImportRowResult.UPDATED,
+        message,
+    )
+
+
+def import_google_form_project_row(
+    semester: Semester, row: GoogleFormProjectPitchRow, row_number: int
+) -> ImportRowResult:
+    email = row["RPI Email (@rpi.edu)"]
+    rcs_id = email.removesuffix("@rpi.edu")
+    # Find or create user
+    try:
+        user = User.objects.get(Q(rcs_id=rcs_id) | Q(email=email))
+    except User.DoesNotExist:
+        user = User(email=email)
+
+    user.save()
+
+    project, is_new = Project.objects.update_or_create(
+        name=row["What is the name of the project?"],
+        defaults={
+            "description": row["What is your project about?"],
+            "is_approved": True,
+            "owner": user,
+        },
+    )
+
+    Enrollment.objects.update_or_create(
+        user=user,
+        semester=semester,
+        defaults={"project": project, "is_project_lead": True},
+    )
+
+    ProjectPitch.objects.update_or_create(
+        project=project,
+        semester=semester,
+        defaults={"url": row["Pitch Slide"]},
+    )
+
+    return ImportRowResult(
+        row_number,
+        row["What is the name of the project?"],
+        ImportRowResult.CREATED if is_new else ImportRowResult.UPDATED,
+    )
+
+
+def import_rows_individually(
+    import_row: Callable[[Semester, Any, int], ImportRowResult],
+    semester: Semester,
+    rows: Iterable[Any],
+    first_row_number: int,
+) -> list[ImportRowResult]:
+    """Imports rows one at a time, recording a failed row as an error and moving on.
+    Each row runs in its own savepoint so a failure doesn't abort the others."""
+    results: list[ImportRowResult] = []
+    for row_number, row in enumerate(rows, start=first_row_number):
+        try:
+            with transaction.atomic():
+                results.append(import_row(semester, row, row_number))
+        except Exception as e:
+            logger.exception("Failed to import row %d: %s", row_number, row)
+            results.append(
+                ImportRowResult(row_number, "", ImportRowResult.ERROR, repr(e))
+            )
+    return results
+
+
+def import_submitty_teams(
+    semester: Semester,
+    rows: Iterable[SubmittyWithTeamsCSVRow],
+    first_row_number: int = 2,
+) -> list[ImportRowResult]:
+    """Upserts users, projects, small groups, and enrollments from a Submitty teams export."""
+    return import_rows_individually(
+        import_submitty_team_row, semester, rows, first_row_number
+    )
+
+
+def import_google_form_projects(
+    semester: Semester,
+    rows: Iterable[GoogleFormProjectPitchRow],
+    first_row_number: int = 2,
+) -> list[ImportRowResult]:
+    """Upserts projects, their owners' enrollments, and their pitches from the Google Form responses."""
+    return import_rows_individually(
+        import_google_form_project_row, semester, rows, first_row_number
+    )
+
+
+class ImportJobKind(TypedDict):
+    title: str
+    source: str
+    expected_columns: frozenset[str]
+    importer: Callable[[Semester, Iterable[Any], int], list[ImportRowResult]]
+
+
+IMPORT_JOB_KINDS: dict[str, ImportJobKind] = {
+    "submitty_enrollments": {
+        "title": "Import Student Enrollments from Submitty",
+        "source": "Submitty",
+        "expected_columns": SubmittyCSVRow.__required_keys__,
+        "importer": import_submitty_enrollments,
+    },
+    "submitty_teams": {
+        "title": "Import Teams from Submitty",
+        "source": "Submitty",
+        "expected_columns": SubmittyWithTeamsCSVRow.__required_keys__,
+        "importer": import_submitty_teams,
+    },
+    "google_form_projects": {
+        "title": "Import Projects from Google Forms",
+        "source": "Google Forms",
+        "expected_columns": GoogleFormProjectPitchRow.__required_keys__,
+        "importer": import_google_form_projects,
+    },
+}
+
+IMPORT_JOB_CHUNK_SIZE = 250
+"""How many rows are imported per transaction. Progress is written to the cache after each chunk,
+and a failed job keeps the chunks committed before the failure."""
+IMPORT_JOB_TIMEOUT = 60 * 60 * 24
+"""How long an import job's upload and status live in the cache."""
+IMPORT_JOB_MAX_REPORTED_RESULTS = 500
+"""Caps how many skipped/failed rows are kept in the job status so it stays cheap to poll."""
+
+
+class ImportJob(TypedDict):
+    id: str
+    kind: str
+    semester_id: str
+    status: str
+    """One of "pending", "running", "completed", or "failed"."""
+    total: int
+    done: int
+    """How many rows were imported. Each chunk commits on its own, so these stay imported even if
+    the job then fails."""
+    summary: dict[str, int]
+    results: list[dict[str, Any]]
+    """The skipped and failed rows, since created/updated rows need no attention."""
+    error: str
+
+
+def import_job_cache_key(job_id: str):
+    return f"import_job:{job_id}"
+
+
+def import_job_csv_cache_key(job_id: str):
+    return f"import_job_csv:{job_id}"
+
+
+def create_import_job(kind: str, semester: Semester, csv_text: str) -> ImportJob:
+    """Stores the uploaded CSV and a pending job status in the cache. The caller is responsible
+    for enqueuing `portal.tasks.run_import_job` with the returned job's ID."""
+    job_id = uuid.uuid4().hex
+    total = sum(1 for _ in DictReader(StringIO(csv_text)))
+    job: ImportJob = {
+        "id": job_id,
+        "kind": kind,
+        "semester_id": semester.pk,
+        "status": "pending",
+        "total": total,
+        "done": 0,
+        "summary": summarize_import_results([]),
+        "results": [],
+        "error": "",
+    }
+    cache.set(import_job_csv_cache_key(job_id), csv_text, IMPORT_JOB_TIMEOUT)
+    cache.set(import_job_cache_key(job_id), job, IMPORT_JOB_TIMEOUT)
+    return job
+
+
+def get_import_job(job_id: str) -> ImportJob | None:
+    return cache.get(import_job_cache_key(job_id))
+
+
+def save_import_job(job: ImportJob):
+    cache.set(import_job_cache_key(job["id"]), job, IMPORT_JOB_TIMEOUT)
+
+
+def run_import_job(job_id: str):
+    """Imports a job's CSV chunk by chunk, writing progress to the job status after each chunk.
+
+    Chunks commit separately, so a job that fails partway is partially applied: its status reports
+    how many rows were imported before the failure, which a retry of the whole CSV will skip or update."""
+    job = get_import_job(job_id)
+    csv_text: str | None = cache.get(import_job_csv_cache_key(job_id))
+    if job is None or csv_text is None:
+        logger.warning("Import job %s expired before it ran", job_id)
+        return
+
+    job["status"] = "running"
+    save_import_job(job)
+
+    try:
+        semester = Semester.objects.get(pk=job["semester_id"])
+        importer = IMPORT_JOB_KINDS[job["kind"]]["importer"]
+        rows = list(DictReader(StringIO(csv_text)))
+
+        for start in range(0, len(rows), IMPORT_JOB_CHUNK_SIZE):
+            chunk = rows[start : start + IMPORT_JOB_CHUNK_SIZE]
+            results = importer(semester, chunk, start + 2)
+
+            job["done"] += len(chunk)
+            for status, count in summarize_import_results(results).items():
+                job["summary"][status] += count
+            job["results"].extend(
+                asdict(result)
+                for result in results
+                if result.status in (ImportRowResult.SKIPPED, ImportRowResult.ERROR)
+            )
+            del job["results"][IMPORT_JOB_MAX_REPORTED_RESULTS:]
+            save_import_job(job)
+
+        job["status"] = "completed"
+    except Exception as e:
+        logger.exception("Import job %s failed", job_id)
+        job["status"] = "failed"
+        job["error"] = repr(e)
+        if job["done"]:
+            job["error"] = (
+                f"Stopped after importing {job['done']} of {job['total']} rows, which were kept. "
+                + job["error"]
+            )
+    finally:
+        save_import_job(job)
+        cache.delete(import_job_csv_cache_key(job_id))
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from portal.datasets import DatasetOptions, generate_dataset
+
+
+class Command(BaseCommand):
+    help = "Generates a synthetic dataset of semesters, users, projects, enrollments, small groups, meetings, and attendances for load testing."
+
+    def add_arguments(self, parser):
+        defaults = DatasetOptions()
+        parser.add_argument("--semesters", type=int, default=defaults.semesters)
+        parser.add_argument("--users", type=int, default=defaults.users)
+        parser.add_argument("--projects", type=int, default=defaults.projects)
+        parser.add_argument(
+            "--enrollment-rate",
+            type=float,
+            default=defaults.enrollment_rate,
+            help="Fraction of users enrolled in each semester",
+        )
+        parser.add_argument(
+            "--meetings-per-semester", type=int, default=defaults.meetings_per_semester
+        )
+        parser.add_argument(
+            "--workshop-rate",
+            type=float,
+            default=defaults.workshop_rate,
+            help="Fraction of students who attend each workshop",
+        )
+        parser.add_argument("--seed", type=int, default=defaults.seed)
+        parser.add_argument("--batch-size", type=int, default=defaults.batch_size)
+
+    def handle(self, *args, **options):
+        started_at = time.perf_counter()
+        dataset = generate_dataset(
+            DatasetOptions(
+                semesters=options["semesters"],
+                users=options["users"],
+                projects=options["projects"],
+                enrollment_rate=options["enrollment_rate"],
+                meetings_per_semester=options["meetings_per_semester"],
+                workshop_rate=options["workshop_rate"],
+                seed=options["seed"],
+                batch_size=options["batch_size"],
+            )
+        )
+
+        for name, count in dataset.counts.items():
+            self.stdout.write(f"{name}: {count}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated the dataset in {time.perf_counter() - started_at:.1f}s."
+            )
+        )
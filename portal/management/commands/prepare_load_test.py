@@ -0,0 +1,167 @@
+import json
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from portal.models import (
+    Enrollment,
+    Meeting,
+    MeetingAttendanceCode,
+    Project,
+    Semester,
+    SmallGroup,
+    User,
+)
+from portal.views.meetings import generate_code
+
+LOAD_TEST_ADMIN_EMAIL = "loadtest-admin@rpi.edu"
+
+
+def create_session(user: User, expires_in: int) -> str:
+    """Logs the user in on a new session, like `django.contrib.auth.login` would, and returns its key."""
+    session = import_module(settings.SESSION_ENGINE).SessionStore()
+    session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+    session[BACKEND_SESSION_KEY] = "django.contrib.auth.backends.ModelBackend"
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.set_expiry(expires_in)
+    session.create()
+    return session.session_key
+
+
+class Command(BaseCommand):
+    help = "Opens an ongoing large group meeting and writes the manifest (personas with ready-made sessions, pages, and the meeting's attendance code) that the Locust suite in stresstests/ runs against. Run it in the target's environment, after generate_dataset, before every load test."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--manifest", default="stresstests/manifest.json")
+        parser.add_argument(
+            "--duration",
+            type=int,
+            default=30,
+            help="How many minutes the burst meeting (and its attendance code) stays open",
+        )
+        parser.add_argument(
+            "--students",
+            type=int,
+            default=1000,
+            help="The most student personas to include",
+        )
+        parser.add_argument(
+            "--verification-rate",
+            type=Decimal,
+            default=Decimal("0.25"),
+            help="The chance a submitted attendance needs a mentor to verify it",
+        )
+
+    def handle(self, *args, **options):
+        semester = Semester.get_active()
+        if semester is None:
+            raise CommandError(
+                "There is no active semester. Run generate_dataset first."
+            )
+
+        now = timezone.now()
+        meeting = Meeting.objects.create(
+            semester=semester,
+            name="Load Test",
+            type=Meeting.LARGE_GROUP,
+            is_published=True,
+            starts_at=now - timedelta(minutes=1),
+            ends_at=now + timedelta(minutes=options["duration"]),
+            attendance_chance_verification_required=options["verification_rate"],
+        )
+        code = MeetingAttendanceCode.objects.create(
+            code=generate_code(), meeting=meeting
+        )
+
+        admin = User.objects.filter(email=LOAD_TEST_ADMIN_EMAIL).first()
+        if admin is None:
+            admin = User.objects.create_superuser(
+                LOAD_TEST_ADMIN_EMAIL,
+                None,
+                first_name="Load",
+                last_name="Test",
+                is_approved=True,
+                role=User.RPI,
+            )
+
+        enrollments = Enrollment.objects.filter(semester=semester).select_related(
+            "user"
+        )
+        # Only fully set up users can submit attendance outside of DEBUG
+        students = enrollments.filter(
+            is_mentor=False,
+            user__is_approved=True,
+            user__role=User.RPI,
+            user__github_username__isnull=False,
+            user__discord_user_id__isnull=False,
+        ).order_by("?")[: options["students"]]
+        mentors = enrollments.filter(is_mentor=True)
+
+        # Personas are handed ready-made sessions so the run doesn't start with a login storm
+        # (and doesn't need DEBUG-only impersonation)
+        expires_in = options["duration"] * 60 + 60 * 60
+
+        manifest = {
+            "semester": semester.pk,
+            "semesters": list(
+                Semester.objects.order_by("-start_date").values_list("pk", flat=True)
+            ),
+            "project_slugs": list(
+                Project.objects.approved()
+                .filter(enrollments__semester=semester)
+                .distinct()
+                .values_list("slug", flat=True)
+            ),
+            "user_ids": list(
+                enrollments.order_by("?").values_list("user_id", flat=True)[:500]
+            ),
+            "small_group_ids": list(
+                SmallGroup.objects.filter(semester=semester).values_list(
+                    "pk", flat=True
+                )
+            ),
+            "meeting_ids": list(
+                Meeting.objects.filter(semester=semester, ends_at__lt=now).values_list(
+                    "pk", flat=True
+                )
+            ),
+            "burst": {
+                "meeting_id": meeting.pk,
+                "code": code.code,
+                "ends_at": meeting.ends_at.isoformat(),
+            },
+            "students": [
+                {
+                    "email": enrollment.user.email,
+                    "user_id": enrollment.user_id,
+                    "rcs_id": enrollment.user.rcs_id,
+                    "session": create_session(enrollment.user, expires_in),
+                }
+                for enrollment in students
+            ],
+            "mentors": [
+                {
+                    "email": enrollment.user.email,
+                    "session": create_session(enrollment.user, expires_in),
+                }
+                for enrollment in mentors
+            ],
+            "admins": [
+                {"email": admin.email, "session": create_session(admin, expires_in)}
+            ],
+        }
+
+        with open(options["manifest"], "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Opened {meeting} with attendance code {code} until {meeting.ends_at:%H:%M} and wrote "
+                f"{len(manifest['students'])} students and {len(manifest['mentors'])} mentors to {options['manifest']}."
+            )
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from portal.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the search documents (and vectors) of every user, project, and small group."
+
+    def handle(self, *args, **options):
+        rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS("Rebuilt the search index."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from portal.cache import invalidate_tags
+from portal.small_groups import (
+    rebuild_small_group_memberships,
+    small_group_membership_tag,
+)
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the precomputed small group membership of every enrolled user."
+
+    def handle(self, *args, **options):
+        changed = rebuild_small_group_memberships()
+        invalidate_tags(*map(small_group_membership_tag, changed))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt small group memberships ({len(changed)} small groups changed)."
+            )
+        )
@@ -0,0 +1,45 @@
+"""This module contains middleware that attaches request-scoped portal state to each request."""
+
+from django.http import HttpRequest
+from django.utils.functional import cached_property
+
+from portal.checks import get_check_context
+from portal.models import Enrollment, Semester
+from portal.semesters import get_semester_registry
+
+
+class ActiveContext:
+    """The active semester and the current user's enrollment in it, each resolved lazily
+    at most once per request."""
+
+    def __init__(self, request: HttpRequest) -> None:
+        self.request = request
+
+    @cached_property
+    def semester(self) -> Semester | None:
+        return get_semester_registry().active
+
+    @cached_property
+    def enrollment(self) -> Enrollment | None:
+        user = self.request.user
+        if not user.is_authenticated or self.semester is None:
+            return None
+        return user.get_enrollment(self.semester)
+
+    def clear_enrollment(self):
+        """Forgets the user's memoized enrollments and check results, for views that change
+        the current user's enrollment before rendering anything that depends on it."""
+        self.__dict__.pop("enrollment", None)
+        get_check_context(self.request.user).clear()
+
+
+class ActiveContextMiddleware:
+    """Sets `request.active` so views and templates share one lookup of the active semester
+    and enrollment. Must come after `AuthenticationMiddleware`."""
+
+    def __init__(self, get_response) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest):
+        request.active = ActiveContext(request)
+        return self.get_response(request)
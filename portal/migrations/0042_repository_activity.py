@@ -0,0 +1,88 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0041_organization_logo_url_alter_project_is_approved_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectrepository',
+            name='commits_synced_until',
+            field=models.DateTimeField(blank=True, help_text="Commits up to this time have been ingested into the repository's activity", null=True),
+        ),
+        migrations.AddField(
+            model_name='projectrepository',
+            name='issues_cursor',
+            field=models.CharField(blank=True, help_text='GraphQL cursor of the last ingested issue', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='projectrepository',
+            name='pull_requests_cursor',
+            field=models.CharField(blank=True, help_text='GraphQL cursor of the last ingested pull request', max_length=200),
+        ),
+        migrations.AlterField(
+            model_name='meeting',
+            name='room',
+            field=models.ForeignKey(blank=True, help_text='Physical location of the meeting, or blank if on Discord', null=True, on_delete=django.db.models.deletion.RESTRICT, to='portal.room'),
+        ),
+        migrations.CreateModel(
+            name='WeeklyContribution',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('week', models.DateField(help_text='The Monday of the week')),
+                ('commits', models.PositiveIntegerField(default=0)),
+                ('additions', models.PositiveIntegerField(default=0)),
+                ('deletions', models.PositiveIntegerField(default=0)),
+                ('pull_requests', models.PositiveIntegerField(default=0)),
+                ('issues', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weekly_contributions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-week'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RepositoryActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('type', models.CharField(choices=[('commit', 'Commit'), ('pull_request', 'Pull Request'), ('issue', 'Issue')], max_length=20)),
+                ('key', models.CharField(help_text='Commit SHA, or pull request/issue number', max_length=100)),
+                ('author_login', models.CharField(blank=True, max_length=200)),
+                ('occurred_at', models.DateTimeField()),
+                ('week', models.DateField(help_text='The Monday of the week the activity occurred in')),
+                ('title', models.CharField(blank=True, max_length=500)),
+                ('url', models.URLField(max_length=500)),
+                ('additions', models.PositiveIntegerField(default=0)),
+                ('deletions', models.PositiveIntegerField(default=0)),
+                ('repository', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity', to='portal.projectrepository')),
+                ('user', models.ForeignKey(blank=True, help_text='The user whose GitHub username matched the author, if any', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='repository_activity', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'repository activity',
+                'ordering': ['-occurred_at'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='weeklycontribution',
+            constraint=models.UniqueConstraint(fields=('user', 'week'), name='unique_user_weekly_contribution'),
+        ),
+        migrations.AddIndex(
+            model_name='repositoryactivity',
+            index=models.Index(fields=['user', 'week'], name='portal_repo_user_id_938ea5_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='repositoryactivity',
+            constraint=models.UniqueConstraint(fields=('repository', 'type', 'key'), name='unique_repository_activity'),
+        ),
+    ]
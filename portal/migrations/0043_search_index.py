@@ -0,0 +1,123 @@
+# Generated by Django 4.2.30 on 2026-10-18 05:03
+
+from collections import defaultdict
+
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+
+SEARCH_VECTOR_TABLES = ("portal_user", "portal_project", "portal_smallgroup")
+
+
+def create_search_vector_indexes(apps, schema_editor):
+    # GIN indexes only exist on PostgreSQL, where search uses the vectors
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for table in SEARCH_VECTOR_TABLES:
+        schema_editor.execute(
+            f"CREATE INDEX {table}_search_vector_gin ON {table} USING gin (search_vector)"
+        )
+
+
+def drop_search_vector_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for table in SEARCH_VECTOR_TABLES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {table}_search_vector_gin")
+
+
+# A frozen copy of how `portal.search` built documents when this migration was written, so later
+# changes to that module can't break (or silently change) this migration
+SEARCH_DOCUMENT_FIELDS = {
+    "User": (
+        ("first_name", "last_name", "rcs_id", "graduation_year"),
+        ("enrollments__project__name",),
+    ),
+    "Project": (
+        ("name", "owner__first_name", "owner__last_name", "owner__rcs_id", "description"),
+        ("tags__name",),
+    ),
+    "SmallGroup": (
+        ("name",),
+        ("projects__name", "mentors__rcs_id", "mentors__first_name", "mentors__last_name"),
+    ),
+}
+INDEX_BATCH_SIZE = 500
+
+
+def build_search_index(apps, schema_editor):
+    for model_name, (fields, related_fields) in SEARCH_DOCUMENT_FIELDS.items():
+        model = apps.get_model("portal", model_name)
+        pks = list(model.objects.order_by("pk").values_list("pk", flat=True))
+        for start in range(0, len(pks), INDEX_BATCH_SIZE):
+            queryset = model.objects.filter(pk__in=pks[start : start + INDEX_BATCH_SIZE])
+            values = defaultdict(list)
+            for pk, *field_values in queryset.values_list("pk", *fields):
+                values[pk].extend(field_values)
+            for related_field in related_fields:
+                for pk, value in (
+                    queryset.filter(**{f"{related_field}__isnull": False})
+                    .values_list("pk", related_field)
+                    .distinct()
+                ):
+                    values[pk].append(value)
+
+            model.objects.bulk_update(
+                [
+                    model(
+                        pk=pk,
+                        search_document=" ".join(
+                            str(value) for value in object_values if value
+                        ),
+                    )
+                    for pk, object_values in values.items()
+                ],
+                ["search_document"],
+                batch_size=INDEX_BATCH_SIZE,
+            )
+            if schema_editor.connection.vendor == "postgresql":
+                queryset.update(
+                    search_vector=SearchVector("search_document", config="simple")
+                )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0042_repository_activity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='search_document',
+            field=models.TextField(blank=True, editable=False, help_text='Denormalized text matched by searches (maintained by portal.search)'),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='smallgroup',
+            name='search_document',
+            field=models.TextField(blank=True, editable=False, help_text='Denormalized text matched by searches (maintained by portal.search)'),
+        ),
+        migrations.AddField(
+            model_name='smallgroup',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='search_document',
+            field=models.TextField(blank=True, editable=False, help_text='Denormalized text matched by searches (maintained by portal.search)'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_vector_indexes, drop_search_vector_indexes),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
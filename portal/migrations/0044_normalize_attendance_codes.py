@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def normalize_attendance_codes(apps, schema_editor):
+    MeetingAttendanceCode = apps.get_model("portal", "MeetingAttendanceCode")
+    for code in MeetingAttendanceCode.objects.values_list("code", flat=True):
+        normalized = code.strip().upper()
+        if normalized == code:
+            continue
+        if MeetingAttendanceCode.objects.filter(pk=normalized).exists():
+            # Case-insensitive lookups could only ever find one of the two anyway
+            MeetingAttendanceCode.objects.filter(pk=code).delete()
+        else:
+            MeetingAttendanceCode.objects.filter(pk=code).update(code=normalized)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("portal", "0043_search_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_attendance_codes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.30 on 2026-10-18 05:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def build_small_group_memberships(apps, schema_editor):
+    # Derived inline rather than through `portal.small_groups`, which works with the current models
+    Enrollment = apps.get_model("portal", "Enrollment")
+    SmallGroupMembership = apps.get_model("portal", "SmallGroupMembership")
+    memberships = (
+        Enrollment.objects.filter(project__small_groups__semester_id=F("semester_id"))
+        .order_by()
+        .values_list("semester_id", "user_id", "project__small_groups")
+        .distinct()
+    )
+    SmallGroupMembership.objects.bulk_create(
+        [
+            SmallGroupMembership(
+                semester_id=semester_id, user_id=user_id, small_group_id=small_group_id
+            )
+            for semester_id, user_id, small_group_id in memberships
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0044_normalize_attendance_codes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SmallGroupMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('semester', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='portal.semester')),
+                ('small_group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='portal.smallgroup')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='small_group_memberships', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['semester', 'user'], name='portal_smal_semeste_19e726_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='smallgroupmembership',
+            constraint=models.UniqueConstraint(fields=('small_group', 'user'), name='unique_small_group_membership'),
+        ),
+        migrations.RunPython(build_small_group_memberships, migrations.RunPython.noop),
+    ]
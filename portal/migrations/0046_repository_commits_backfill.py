@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 06:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("portal", "0045_small_group_membership"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="projectrepository",
+            name="commits_backfill_synced_until",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Time the commit cursor moves up to once the unfinished backfill finishes",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="projectrepository",
+            name="commits_backfill_until",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Oldest commit time ingested by an unfinished backfill, which resumes below it",
+                null=True,
+            ),
+        ),
+    ]
@@ -1,42 +1,48 @@
 import logging
 import re
 from collections import defaultdict
+from datetime import timedelta
 from decimal import Decimal
-from time import sleep
 from typing import Optional
 
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser, BaseUserManager
+from django.contrib.postgres.search import SearchVectorField
 from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
-from django.db.models import Manager, Q
+from django.db.models import Count, Manager, OuterRef, Q, Subquery
 from django.db.models.functions import Lower
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.template.defaultfilters import slugify
 from django.urls import reverse
 from django.utils import formats, timezone
-from gql import Client
 from requests import HTTPError
 from sentry_sdk import capture_exception
 
+from portal.attendance_buffer import get_buffered_attendances
 from portal.services import discord, github
 
 logger = logging.getLogger(__name__)
 
 
-def sync_discord(sender, instance, created, *args, **kwargs):
-    instance.sync_discord()
+SEMESTERS_VERSION_CACHE_KEY = "semesters:version"
+"""Bumped whenever a semester changes so every process reloads its semester registry (see `portal.semesters`)."""
 
 
-def sync_discord_on_delete(sender, instance, *args, **kwargs):
-    instance.sync_discord(is_deleted=True)
+def active_semester_cache_key():
+    """The active semester is cached per day, since that is the granularity it can change at."""
+    return f"active_semester:{timezone.now().date().isoformat()}"
 
 
-def clear_semester_cache(sender, instance, created, *args, **kwargs):
-    cache.delete("semesters")
-    cache.delete("active_semester")
+def clear_semester_cache(sender, instance, *args, **kwargs):
+    cache.delete(active_semester_cache_key())
+    try:
+        cache.incr(SEMESTERS_VERSION_CACHE_KEY)
+    except ValueError:
+        # No version yet, so nobody has a registry to invalidate
+        pass
 
 class TimestampedModel(models.Model):
     """A base model that all other models should inherit from. It adds timestamps for creation and updating."""
@@ -119,9 +125,18 @@ class Semester(TimestampedModel):
 
     @classmethod
     def get_active(cls):
-        """Returns the currently ongoing semester or `None` if none exists."""
+        """Returns the currently ongoing semester or `None` if none exists. Cached until the day
+        ends or a semester changes; within a request prefer `request.active.semester`."""
         now = timezone.now().date()
-        return cls.objects.filter(start_date__lte=now, end_date__gte=now).first()
+        # Between semesters "" is cached instead of None so no backend can mistake it for a miss
+        semester = cache.get_or_set(
+            active_semester_cache_key(),
+            lambda: (
+                cls.objects.filter(start_date__lte=now, end_date__gte=now).first() or ""
+            ),
+            60 * 60 * 24,
+        )
+        return semester or None
 
     @classmethod
     def get_next(cls):
@@ -159,6 +174,7 @@ class Semester(TimestampedModel):
 
 
 post_save.connect(clear_semester_cache, sender=Semester)
+post_delete.connect(clear_semester_cache, sender=Semester)
 
 
 class Organization(TimestampedModel):
@@ -181,24 +197,6 @@ class Organization(TimestampedModel):
     discord_role_id = models.CharField(max_length=100, blank=True)
     logo_url = models.URLField(max_length=500, blank=True)
 
-    def sync_discord(self, is_deleted=False):
-        """Ensures that a Discord role exists for the organization, and that all its members have it assigned."""
-        # Ensure existence of role
-        # TODO: if role ID is set, check that is still exists and recreate if not
-        if not self.discord_role_id:
-            role = discord.create_role(
-                {"name": self.name, "hoist": True, "mentionable": True}
-            )
-            self.discord_role_id = role["id"]
-            self.save()
-
-        # Add role to members
-        for user in self.users:
-            user: User
-            if user.discord_user_id:
-                discord.add_role_to_member(user.discord_user_id, self.discord_role_id)
-                sleep(1)
-
     def __str__(self) -> str:
         return self.name
 
@@ -305,6 +303,12 @@ class User(AbstractUser, TimestampedModel):
         help_text="The user's GitHub username (not user ID)",
         unique=True,
     )
+    search_document = models.TextField(
+        blank=True,
+        editable=False,
+        help_text="Denormalized text matched by searches (maintained by portal.search)",
+    )
+    search_vector = SearchVectorField(null=True, editable=False)
 
     @property
     def is_rpi(self):
@@ -347,10 +351,26 @@ class User(AbstractUser, TimestampedModel):
             and self.discord_user_id
         )
 
+    def get_enrollment(self, semester: Optional["Semester"]) -> Optional["Enrollment"]:
+        """The user's enrollment (with its project) for the semester. Memoized on the instance,
+        so repeated lookups while handling a request for `request.user` cost one query."""
+        semester_id = semester.pk if semester else None
+        enrollments = self.__dict__.setdefault("_enrollments_by_semester", {})
+        if semester_id not in enrollments:
+            enrollments[semester_id] = (
+                self.enrollments.filter(semester_id=semester_id)
+                .select_related("project")
+                .first()
+                if semester_id
+                else None
+            )
+        return enrollments[semester_id]
+
+    def clear_enrollment_cache(self):
+        self.__dict__.pop("_enrollments_by_semester", None)
+
     def get_active_enrollment(self) -> Optional["Enrollment"]:
-        active_semester = cache.get("active_semester")
-        queryset = self.enrollments.filter(semester=active_semester)
-        return queryset.first()
+        return self.get_enrollment(Semester.get_active())
 
     def is_mentor(self, semester=None):
         if semester is None:
@@ -393,12 +413,16 @@ class User(AbstractUser, TimestampedModel):
 
     @property
     def discord_user(self):
-        return discord.get_user(self.discord_user_id) if self.discord_user_id else None
+        return (
+            discord.get_cached_user(self.discord_user_id)
+            if self.discord_user_id
+            else None
+        )
 
     @property
     def discord_member(self):
         return (
-            discord.get_server_member(self.discord_user_id)
+            discord.get_cached_server_member(self.discord_user_id)
             if self.discord_user_id
             else None
         )
@@ -431,18 +455,6 @@ class User(AbstractUser, TimestampedModel):
         meeting_types = [Meeting.LARGE_GROUP, Meeting.SMALL_GROUP, Meeting.WORKSHOP]
         return Meeting.objects.filter(type__in=meeting_types, semester=semester)
 
-    def sync_discord(self, is_deleted=False):
-        # Discord nickname and roles
-        if self.discord_user_id:
-            try:
-                discord.set_member_nickname(self.discord_user_id, self.display_name)
-                if self.is_approved:
-                    discord.add_role_to_member(
-                        self.discord_user_id, settings.DISCORD_VERIFIED_ROLE_ID
-                    )
-            except Exception as e:
-                capture_exception(e)
-
     def get_absolute_url(self):
         return reverse("users_detail", args=[str(self.pk)])
 
@@ -466,38 +478,48 @@ class User(AbstractUser, TimestampedModel):
         ]
 
 
+def set_new_user_email_defaults(user: User, organization: Organization | None):
+    """Sets the role, RCS ID, and organization a new user gets from their email. The organization is
+    the one with a matching email domain, looked up by the caller so bulk imports can batch it."""
+    if user.email.endswith("@rpi.edu"):
+        user.role = User.RPI
+        user.is_approved = True
+        user.rcs_id = user.email.removesuffix("@rpi.edu").lower()
+
+    if organization is not None:
+        user.organization = organization
+        user.is_approved = True
+
+
 def pre_save_user(instance, sender, *args, **kwargs):
     if instance._state.adding:
-        if instance.email.endswith("@rpi.edu"):
-            instance.role = User.RPI
-            instance.is_approved = True
-            instance.rcs_id = instance.email.removesuffix("@rpi.edu").lower()
-
         # Search for org with matching email domain
         email_domain = instance.email.split("@")[1]
         try:
-            instance.organization = Organization.objects.get(
+            organization = Organization.objects.get(
                 Q(email_domain=email_domain) | Q(email_domain_secondary=email_domain)
             )
-            instance.is_approved = True
-
-            if instance.discord_user_id and instance.organization.discord_role_id:
-                try:
-                    discord.add_role_to_member(
-                        instance.discord_user_id, instance.organization.discord_role_id
-                    )
-                except HTTPError as e:
-                    capture_exception(e)
-                    logger.exception(
-                        f"Failed to add org Discord role for {instance.organization} to {instance}",
-                        exc_info=e,
-                    )
         except Organization.DoesNotExist:
-            pass
+            organization = None
+        set_new_user_email_defaults(instance, organization)
 
+        if (
+            organization is not None
+            and instance.discord_user_id
+            and organization.discord_role_id
+        ):
+            try:
+                discord.add_role_to_member(
+                    instance.discord_user_id, organization.discord_role_id
+                )
+            except HTTPError as e:
+                capture_exception(e)
+                logger.exception(
+                    f"Failed to add org Discord role for {organization} to {instance}",
+                    exc_info=e,
+                )
 
 pre_save.connect(pre_save_user, sender=User)
-# post_save.connect(sync_discord, sender=User)
 
 
 class ProjectTag(TimestampedModel):
@@ -561,6 +583,13 @@ class Project(TimestampedModel):
         help_text="Optional URL to a logo for the project",
     )
 
+    search_document = models.TextField(
+        blank=True,
+        editable=False,
+        help_text="Denormalized text matched by searches (maintained by portal.search)",
+    )
+    search_vector = SearchVectorField(null=True, editable=False)
+
     tags = models.ManyToManyField(ProjectTag, blank=True, related_name="projects")
 
     discord_role_id = models.CharField(max_length=200, blank=True)
@@ -581,155 +610,6 @@ class Project(TimestampedModel):
                 self.discord_text_channel_id, {"content": message_content}
             )
 
-    def sync_discord(self, is_deleted=False):
-        active_semester = Semester.get_active()
-
-        if not active_semester:
-            # TODO: delete all project channels except external ones?
-            logger.warning(
-                f"No active semester, deleting all Discord channels and roles for project {self}"
-            )
-            return
-
-        # Determine if this project is running this semester
-        enrollments = self.enrollments.filter(semester=active_semester).select_related(
-            "user"
-        )
-
-        if len(enrollments) > 0:
-            logger.info(
-                f"{self} is an active project, upserting Discord channels and roles"
-            )
-            # An active project, ensure roles and channels exist
-            if not self.discord_role_id:
-                try:
-                    project_role = discord.create_role(
-                        {"name": self.name, "hoist": True, "mentionable": True}
-                    )
-
-                    self.discord_role_id = project_role["id"]
-                    self.save()
-                    sleep(1)
-                except HTTPError as e:
-                    capture_exception(e)
-                    logger.exception(
-                        f"Failed to create project Discord role for {self}", exc_info=e
-                    )
-
-            if self.discord_role_id:
-                # Apply role to team members
-                for enrollment in enrollments:
-                    discord_user_id = enrollment.user.discord_user_id
-                    if not discord_user_id:
-                        logger.warning(
-                            f"Skipping {enrollment.user} since no Discord linked"
-                        )
-                        continue
-
-                    if enrollment.is_project_lead:
-                        try:
-                            discord.add_role_to_member(
-                                discord_user_id, settings.DISCORD_PROJECT_LEAD_ROLE_ID
-                            )
-                            sleep(1)
-                        except HTTPError as e:
-                            capture_exception(e)
-                            logger.exception(
-                                f"Failed to add Project Lead role to {enrollment.user}",
-                                exc_info=e,
-                            )
-                    try:
-                        discord.add_role_to_member(
-                            discord_user_id, self.discord_role_id
-                        )
-                        sleep(1)
-                    except HTTPError as e:
-                        capture_exception(e)
-                        logger.exception(
-                            f"Failed to add project Discord role for {self} to {enrollment.user}",
-                            exc_info=e,
-                        )
-        else:
-            # TODO: Not an active project, DESTROY EVERY TRACE OF IT
-            logger.info(
-                f"{self} is a UNACTIVE project, removing Discord channels and roles"
-            )
-            pass
-
-        # Channels
-        # text_channel_params = None
-        # # Are small groups formed yet?
-        # if SmallGroup.objects.filter(semester=semester).count() > 0:
-        #     raise NotImplementedError
-        # else:
-        #     pitch = self.is_seeking_members(semester)
-        #     if pitch:
-        #         # No! This is early semester, only a text channel should exist and it should be under the
-        #         # Project Pairing category
-
-        #         lead_discord_mentions = " / ".join(
-        #             [
-        #                 (
-        #                     f"<@{e.user.discord_user_id}>"
-        #                     if e.user.discord_user_id
-        #                     else e.user.display_name
-        #                 )
-        #                 for e in self.enrollments.filter(
-        #                     semester=semester, is_project_lead=True
-        #                 ).select_related("user")
-        #             ]
-        #         )
-
-        #         repos = "Repositories:\n" + "\n".join(
-        #             [r.url for r in self.repositories.all()]
-        #         )
-        #         text_channel_params = {
-        #             "name": self.name,
-        #             "type": discord.TEXT_CHANNEL_TYPE,
-        #             "parent_id": settings.DISCORD_PROJECT_PAIRING_CATEGORY_ID,
-        #             "topic": inspect.cleandoc(
-        #                 f"""**{self.name}**
-
-        #                 {self.description}
-
-        #                 Project Lead(s): {lead_discord_mentions}
-
-        #                 Pitch: {pitch.url}
-
-        #                 {repos}
-
-        #                 {settings.PUBLIC_BASE_URL + reverse("projects_detail", args=(self.pk,))}
-        #                 """
-        #             ),
-        #         }
-
-        # if text_channel_params:
-        #     if self.discord_text_channel_id:
-        #         try:
-        #             text_channel = discord.modify_server_channel(
-        #                 self.discord_text_channel_id,
-        #                 cast(discord.ModifyChannelParams, text_channel_params),
-        #             )
-        #         except HTTPError as e:
-        #             capture_exception(e)
-        #             logger.exception(
-        #                 f"Failed to update project Discord text channel for {self}",
-        #                 exc_info=e,
-        #             )
-        #     else:
-        #         try:
-        #             text_channel = discord.create_server_channel(
-        #                 cast(discord.CreateServerChannelParams, text_channel_params)
-        #             )
-        #             self.discord_text_channel_id = text_channel["id"]
-        #             self.save()
-        #         except HTTPError as e:
-        #             capture_exception(e)
-        #             logger.exception(
-        #                 f"Failed to create project Discord text channel for {self}",
-        #                 exc_info=e,
-        #             )
-
     def get_active_semesters(self):
         return (
             Semester.objects.filter(enrollments__project=self.id)
@@ -740,22 +620,66 @@ class Project(TimestampedModel):
     def get_absolute_url(self):
         return reverse("projects_detail", kwargs={"slug": self.slug})
 
-    def get_repositories(self, client: Client):
+    REPOSITORIES_FRESH_FOR = timedelta(hours=1)
+    """How long fetched repository details are served before a background refresh is triggered."""
+    REPOSITORIES_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+    """How long stale repository details can still be served while a refresh is pending."""
+
+    def get_repositories(self, client: github.GitHubClient):
+        """Fetches the details of all of this project's repositories from GitHub in one query."""
         return [
-            github.get_repository_details(client, repo.url)["repository"]
-            for repo in self.repositories.all()
+            repository
+            for repository in github.get_repositories_details(
+                client, [repo.url for repo in self.repositories.all()]
+            )
+            if repository
         ]
 
+    @property
+    def repositories_cache_key(self):
+        return f"project_repositories:{self.pk}"
+
+    def refresh_repositories_cache(self, client: github.GitHubClient):
+        repositories = self.get_repositories(client)
+        self.set_repositories_cache(repositories)
+        return repositories
+
+    def set_repositories_cache(self, repositories: list):
+        cache.set(
+            self.repositories_cache_key,
+            {"repositories": repositories, "fetched_at": timezone.now()},
+            Project.REPOSITORIES_CACHE_TIMEOUT,
+        )
+        cache.delete(f"{self.repositories_cache_key}:refreshing")
+
+    def get_cached_repositories(self) -> tuple[list | None, bool]:
+        """Returns the cached repository details (None if they've never been fetched) and
+        whether they are stale and should be refreshed in the background."""
+        entry = cache.get(self.repositories_cache_key)
+        if entry is None:
+            return None, True
+        is_stale = entry["fetched_at"] < timezone.now() - Project.REPOSITORIES_FRESH_FOR
+        return entry["repositories"], is_stale
+
+    def claim_repositories_refresh(self):
+        """Returns True for only one caller until the refresh finishes (or times out), so concurrent
+        page views of a stale project enqueue a single refresh."""
+        return cache.add(f"{self.repositories_cache_key}:refreshing", True, 60 * 5)
+
     def get_semester_team(self, semester: Semester):
         """Fetches enrollments for a given semester."""
-        return Enrollment.objects.filter(
-            semester=semester, project=self
-        ).order_by("-is_project_lead")
+        return (
+            Enrollment.objects.filter(semester=semester, project=self)
+            .select_related("user", "semester")
+            .order_by("-is_project_lead")
+        )
 
     def get_all_teams(self):
         """Fetches teams for each semester."""
         enrollments_by_semester = defaultdict(list)
-        for enrollment in self.enrollments.order_by("-is_project_lead").all():
+        for enrollment in self.enrollments.select_related("user", "semester").order_by(
+            "-is_project_lead"
+        ):
             enrollments_by_semester[enrollment.semester].append(enrollment)
         return dict(enrollments_by_semester)
 
@@ -778,18 +702,123 @@ class Project(TimestampedModel):
         indexes = [models.Index(fields=["name", "description"])]
 
 
-# post_save.connect(sync_discord, sender=Project)
-
-
 class ProjectRepository(TimestampedModel):
     project = models.ForeignKey(
         Project, on_delete=models.CASCADE, related_name="repositories"
     )
     url = models.URLField(help_text="URL of GitHub repository")
+    commits_synced_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Commits up to this time have been ingested into the repository's activity",
+    )
+    commits_backfill_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Oldest commit time ingested by an unfinished backfill, which resumes below it",
+    )
+    commits_backfill_synced_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Time the commit cursor moves up to once the unfinished backfill finishes",
+    )
+    pull_requests_cursor = models.CharField(
+        max_length=200,
+        blank=True,
+        help_text="GraphQL cursor of the last ingested pull request",
+    )
+    issues_cursor = models.CharField(
+        max_length=200,
+        blank=True,
+        help_text="GraphQL cursor of the last ingested issue",
+    )
 
     def __str__(self) -> str:
         return self.url.lstrip("https://github.com/")
 
+
+def clear_project_repositories_cache(sender, instance: ProjectRepository, *args, **kwargs):
+    cache.delete(f"project_repositories:{instance.project_id}")
+
+
+post_save.connect(clear_project_repositories_cache, sender=ProjectRepository)
+post_delete.connect(clear_project_repositories_cache, sender=ProjectRepository)
+
+
+class RepositoryActivity(TimestampedModel):
+    """A single commit, pull request, or issue ingested from a project's GitHub repository."""
+
+    COMMIT = "commit"
+    PULL_REQUEST = "pull_request"
+    ISSUE = "issue"
+    TYPE_CHOICES = (
+        (COMMIT, "Commit"),
+        (PULL_REQUEST, "Pull Request"),
+        (ISSUE, "Issue"),
+    )
+
+    repository = models.ForeignKey(
+        ProjectRepository, on_delete=models.CASCADE, related_name="activity"
+    )
+    type = models.CharField(choices=TYPE_CHOICES, max_length=20)
+    key = models.CharField(
+        max_length=100, help_text="Commit SHA, or pull request/issue number"
+    )
+    author_login = models.CharField(max_length=200, blank=True)
+    user = models.ForeignKey(
+        User,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="repository_activity",
+        help_text="The user whose GitHub username matched the author, if any",
+    )
+    occurred_at = models.DateTimeField()
+    week = models.DateField(help_text="The Monday of the week the activity occurred in")
+    title = models.CharField(max_length=500, blank=True)
+    url = models.URLField(max_length=500)
+    additions = models.PositiveIntegerField(default=0)
+    deletions = models.PositiveIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"{self.repository} {self.get_type_display()} {self.key}"
+
+    class Meta:
+        verbose_name_plural = "repository activity"
+        ordering = ["-occurred_at"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["repository", "type", "key"],
+                name="unique_repository_activity",
+            )
+        ]
+        indexes = [models.Index(fields=["user", "week"])]
+
+
+class WeeklyContribution(TimestampedModel):
+    """A user's GitHub activity across all project repositories for one week, precomputed from `RepositoryActivity`."""
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="weekly_contributions"
+    )
+    week = models.DateField(help_text="The Monday of the week")
+    commits = models.PositiveIntegerField(default=0)
+    additions = models.PositiveIntegerField(default=0)
+    deletions = models.PositiveIntegerField(default=0)
+    pull_requests = models.PositiveIntegerField(default=0)
+    issues = models.PositiveIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"{self.user} week of {self.week}"
+
+    class Meta:
+        ordering = ["-week"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "week"], name="unique_user_weekly_contribution"
+            )
+        ]
+
 class ProjectPitch(TimestampedModel):
     semester = models.ForeignKey(
         Semester, on_delete=models.CASCADE, related_name="project_pitches"
@@ -1004,14 +1033,11 @@ class Enrollment(TimestampedModel):
         help_text="Private notes for admins about this user for this semester",
     )
 
-    def sync_discord(self, is_deleted=False):
-        pass
-
     def get_absolute_url(self):
         return (
             reverse("users_detail", args=[str(self.user_id)])
             + "?semester="
-            + self.semester.id
+            + self.semester_id
         )
 
     def __str__(self) -> str:
@@ -1033,9 +1059,6 @@ class Enrollment(TimestampedModel):
         get_latest_by = ["semester"]
 
 
-# post_save.connect(sync_discord, sender=Enrollment)
-
-
 class PublicManager(models.Manager):
     def get_queryset(self):
         return (
@@ -1199,15 +1222,28 @@ class Meeting(TimestampedModel):
         query = {"meeting": self}
 
         if small_group:
-            small_group_user_ids = (
-                small_group.get_users().values_list("pk", flat=True)
-                if small_group
-                else None
+            small_group_user_ids = small_group.memberships.values_list(
+                "user_id", flat=True
             )
             expected_users = expected_users.filter(pk__in=small_group_user_ids)
             query["user__in"] = small_group_user_ids
 
-        attendances = MeetingAttendance.objects.filter(**query).select_related("user")
+        attendances = list(
+            MeetingAttendance.objects.filter(**query).select_related("user")
+        )
+
+        # Reconcile submissions still waiting in the write-behind buffer
+        buffered = get_buffered_attendances(self.pk)
+        for user_id in [attendance.user_id for attendance in attendances]:
+            buffered.pop(user_id, None)
+        if buffered:
+            buffered_users = User.objects.filter(pk__in=list(buffered))
+            if small_group:
+                buffered_users = buffered_users.filter(pk__in=small_group_user_ids)
+            attendances += [
+                MeetingAttendance(meeting=self, user=user, is_verified=buffered[user.pk])
+                for user in buffered_users
+            ]
 
         needs_verification_users = []
         attended_users = []
@@ -1233,14 +1269,56 @@ class Meeting(TimestampedModel):
             else 0,
         }
 
-    def get_small_group_attendance_ratios(self):
+    def get_small_group_attendance_counts(self):
+        """Computes expected, attended, and pending verification counts for every small group
+        of the meeting's semester at once, keyed by small group name.
+
+        Instead of running `get_attendance_data` per small group, expected users' small group
+        memberships are grouped by small group and their attendance status is counted in SQL.
+        """
+        user_attendance = MeetingAttendance.objects.filter(
+            meeting_id=self.pk, user_id=OuterRef("user_id")
+        ).values("is_verified")[:1]
+
+        grouped_counts = (
+            SmallGroupMembership.objects.filter(
+                semester_id=self.semester_id,
+                user_id__in=self.expected_attendance_users.values("pk"),
+            )
+            .annotate(is_verified=Subquery(user_attendance))
+            .values("small_group_id")
+            .annotate(
+                expected=Count("user_id", distinct=True),
+                attended=Count("user_id", distinct=True, filter=Q(is_verified=True)),
+                needs_verification=Count(
+                    "user_id", distinct=True, filter=Q(is_verified=False)
+                ),
+            )
+        )
+        counts_by_small_group_id = {row["small_group_id"]: row for row in grouped_counts}
+
         small_groups = {}
-        for small_group in SmallGroup.objects.filter(semester_id=self.semester_id):
-            attendance_data = self.get_attendance_data(small_group)
-            small_groups[small_group.name] = attendance_data["attendance_ratio"]
+        for small_group_id, name in SmallGroup.objects.filter(
+            semester_id=self.semester_id
+        ).values_list("pk", "name"):
+            counts = counts_by_small_group_id.get(small_group_id, {})
+            expected = counts.get("expected", 0)
+            attended = counts.get("attended", 0)
+            small_groups[name] = {
+                "expected": expected,
+                "attended": attended,
+                "needs_verification": counts.get("needs_verification", 0),
+                "attendance_ratio": attended / expected if expected > 0 else 0,
+            }
 
         return small_groups
 
+    def get_small_group_attendance_ratios(self):
+        return {
+            name: counts["attendance_ratio"]
+            for name, counts in self.get_small_group_attendance_counts().items()
+        }
+
     @property
     def attended_users(self):
         return self.attendances.filter(meetingattendance__is_verified=True)
@@ -1257,45 +1335,21 @@ class Meeting(TimestampedModel):
     def get_absolute_url(self):
         return reverse("meetings_detail", args=[str(self.id)])
 
-    def sync_discord(self, is_deleted=False):
+    def get_discord_event_params(self):
+        """The fields of this meeting's Discord scheduled event."""
         description = f"""**{self.get_type_display()} Meeting**
 
         View details: {settings.PUBLIC_BASE_URL}/meetings/{self.pk}
         {f'Slides: {self.presentation_url}' if self.presentation_url else ''}
         """
 
-        try:
-            if is_deleted:
-                discord.delete_server_event(self.discord_event_id)
-                self.discord_event_id = ""
-                self.save()
-            else:
-                if self.is_ongoing or self.is_upcoming:
-                    if not self.discord_event_id and self.is_published:
-                        event = discord.create_server_event(
-                            name=self.display_name,
-                            scheduled_start_time=self.starts_at.isoformat(),
-                            scheduled_end_time=self.ends_at.isoformat(),
-                            description=description,
-                            location=str(self.room),
-                        )
-                        self.discord_event_id = event["id"]
-                        self.save()
-                    elif self.discord_event_id and self.is_published:
-                        discord.update_server_event(
-                            self.discord_event_id,
-                            name=self.display_name,
-                            scheduled_start_time=self.starts_at.isoformat(),
-                            scheduled_end_time=self.ends_at.isoformat(),
-                            description=description,
-                            location=str(self.room),
-                        )
-                    elif self.discord_event_id and not self.is_published:
-                        discord.delete_server_event(self.discord_event_id)
-                        self.discord_event_id = ""
-                        self.save()
-        except Exception as e:
-            capture_exception(e)
+        return {
+            "name": self.display_name,
+            "scheduled_start_time": self.starts_at.isoformat(),
+            "scheduled_end_time": self.ends_at.isoformat(),
+            "description": description,
+            "location": str(self.room),
+        }
 
     def __str__(self) -> str:
         return f"{self.display_name} - {formats.date_format(timezone.localtime(self.starts_at), 'D M j Y @ P')}"
@@ -1327,10 +1381,6 @@ class Meeting(TimestampedModel):
         get_latest_by = ["starts_at"]
 
 
-# post_save.connect(sync_discord, sender=Meeting)
-# post_delete.connect(sync_discord_on_delete, sender=Meeting)
-
-
 class MeetingAttendance(TimestampedModel):
     meeting = models.ForeignKey(Meeting, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -1420,6 +1470,13 @@ class SmallGroup(TimestampedModel):
     projects = models.ManyToManyField(Project, related_name="small_groups")
     mentors = models.ManyToManyField(User, related_name="mentored_small_groups")
 
+    search_document = models.TextField(
+        blank=True,
+        editable=False,
+        help_text="Denormalized text matched by searches (maintained by portal.search)",
+    )
+    search_vector = SearchVectorField(null=True, editable=False)
+
     @property
     def display_name(self):
         if self.name:
@@ -1438,15 +1495,10 @@ class SmallGroup(TimestampedModel):
         )
 
     def get_users(self):
-        return User.objects.filter(enrollments__in=self.get_enrollments())
+        return User.objects.filter(small_group_memberships__small_group=self)
 
     def has_user(self, user):
-        return (
-            self.projects.filter(
-                enrollments__user=user, enrollments__semester=self.semester
-            ).count()
-            > 0
-        )
+        return self.memberships.filter(user=user).exists()
 
     def __str__(self) -> str:
         return self.display_name
@@ -1455,6 +1507,30 @@ class SmallGroup(TimestampedModel):
         ordering = ["semester", Lower("name"), "room"]
 
 
+class SmallGroupMembership(TimestampedModel):
+    """A user's membership in a small group, precomputed from their enrollment's project and the
+    small groups it belongs to that semester (maintained by portal.small_groups)."""
+
+    semester = models.ForeignKey(Semester, on_delete=models.CASCADE, related_name="+")
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="small_group_memberships"
+    )
+    small_group = models.ForeignKey(
+        SmallGroup, on_delete=models.CASCADE, related_name="memberships"
+    )
+
+    def __str__(self) -> str:
+        return f"{self.user} in {self.small_group}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["small_group", "user"], name="unique_small_group_membership"
+            )
+        ]
+        indexes = [models.Index(fields=["semester", "user"])]
+
+
 class MeetingAttendanceCode(TimestampedModel):
     code = models.CharField(max_length=20, primary_key=True)
     meeting = models.ForeignKey(
@@ -1472,6 +1548,15 @@ class MeetingAttendanceCode(TimestampedModel):
     def is_valid(self):
         return self.meeting.is_ongoing
 
+    @staticmethod
+    def normalize(code: str):
+        """Codes are stored uppercase so submissions can be looked up by primary key whatever their case."""
+        return code.strip().upper()
+
+    def save(self, *args, **kwargs):
+        self.code = MeetingAttendanceCode.normalize(self.code)
+        return super().save(*args, **kwargs)
+
     def __str__(self) -> str:
         return self.code or "Unknown Attendance Code"
 
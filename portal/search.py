@@ -0,0 +1,240 @@
+"""This module contains the search index behind the searchable list pages.
+
+Users, projects, and small groups each store a denormalized `search_document` (their own fields plus
+the related names people search for, like a user's project names) that signals keep up to date. On
+PostgreSQL a `search_vector` is derived from it and backed by a GIN index, so searches are ranked
+prefix matches that don't join any other tables. Other databases (e.g. SQLite in development) fall
+back to case-insensitive substring matching on the document."""
+
+import re
+from collections import defaultdict
+from collections.abc import Callable, Iterable
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, Model, QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from portal.models import Enrollment, Project, ProjectTag, SmallGroup, User
+
+SEARCH_CONFIG = "simple"
+"""Names and RCS IDs shouldn't be stemmed, so no language-specific configuration is used."""
+
+INDEX_BATCH_SIZE = 500
+
+
+def is_search_vector_supported():
+    return connection.vendor == "postgresql"
+
+
+def build_documents(
+    queryset: QuerySet, fields: tuple[str, ...], related_fields: tuple[str, ...]
+) -> dict[int, str]:
+    """Builds the search document of every object in the queryset, with one query for the
+    object's own fields and one per related field."""
+    values: dict[int, list] = defaultdict(list)
+    for pk, *field_values in queryset.values_list("pk", *fields):
+        values[pk].extend(field_values)
+    for related_field in related_fields:
+        for pk, value in (
+            queryset.filter(**{f"{related_field}__isnull": False})
+            .values_list("pk", related_field)
+            .distinct()
+        ):
+            values[pk].append(value)
+
+    return {
+        pk: " ".join(str(value) for value in object_values if value)
+        for pk, object_values in values.items()
+    }
+
+
+def build_user_documents(users: QuerySet):
+    return build_documents(
+        users,
+        ("first_name", "last_name", "rcs_id", "graduation_year"),
+        ("enrollments__project__name",),
+    )
+
+
+def build_project_documents(projects: QuerySet):
+    return build_documents(
+        projects,
+        (
+            "name",
+            "owner__first_name",
+            "owner__last_name",
+            "owner__rcs_id",
+            "description",
+        ),
+        ("tags__name",),
+    )
+
+
+def build_small_group_documents(small_groups: QuerySet):
+    return build_documents(
+        small_groups,
+        ("name",),
+        (
+            "projects__name",
+            "mentors__rcs_id",
+            "mentors__first_name",
+            "mentors__last_name",
+        ),
+    )
+
+
+def update_search_documents(
+    queryset: QuerySet, build: Callable[[QuerySet], dict[int, str]]
+):
+    """Rebuilds and stores the documents (and on PostgreSQL, the vectors) of the queryset's objects.
+    Uses queryset updates, so no signals are triggered."""
+    documents = build(queryset)
+    if not documents:
+        return
+
+    model = queryset.model
+    model.objects.bulk_update(
+        [model(pk=pk, search_document=document) for pk, document in documents.items()],
+        ["search_document"],
+        batch_size=INDEX_BATCH_SIZE,
+    )
+    if is_search_vector_supported():
+        model.objects.filter(pk__in=documents.keys()).update(
+            search_vector=SearchVector("search_document", config=SEARCH_CONFIG)
+        )
+
+
+def index_users(pks: Iterable[int]):
+    update_search_documents(User.objects.filter(pk__in=pks), build_user_documents)
+
+
+def index_projects(pks: Iterable[int]):
+    update_search_documents(Project.objects.filter(pk__in=pks), build_project_documents)
+
+
+def index_small_groups(pks: Iterable[int]):
+    update_search_documents(
+        SmallGroup.objects.filter(pk__in=pks), build_small_group_documents
+    )
+
+
+def rebuild_search_index():
+    """Rebuilds every document in batches."""
+    for model, build in (
+        (User, build_user_documents),
+        (Project, build_project_documents),
+        (SmallGroup, build_small_group_documents),
+    ):
+        pks = list(model.objects.order_by("pk").values_list("pk", flat=True))
+        for start in range(0, len(pks), INDEX_BATCH_SIZE):
+            update_search_documents(
+                model.objects.filter(pk__in=pks[start : start + INDEX_BATCH_SIZE]),
+                build,
+            )
+
+
+def search(queryset: QuerySet, text: str) -> QuerySet:
+    """Filters the queryset to objects matching every word of the text as a prefix, ranking
+    the best matches first when vectors are supported."""
+    terms = re.findall(r"\w+", text)
+    if not terms:
+        return queryset
+
+    if not is_search_vector_supported():
+        for term in terms:
+            queryset = queryset.filter(search_document__icontains=term)
+        return queryset
+
+    query = SearchQuery(
+        " & ".join(f"{term}:*" for term in terms),
+        search_type="raw",
+        config=SEARCH_CONFIG,
+    )
+    ordering = queryset.query.order_by or queryset.model._meta.ordering
+    return (
+        queryset.filter(search_vector=query)
+        .annotate(search_rank=SearchRank(F("search_vector"), query))
+        .order_by("-search_rank", *ordering)
+    )
+
+
+def index_users_and_dependents(pks: Iterable[int]):
+    """Reindexes the users along with the projects and small groups whose documents include their names."""
+    pks = list(pks)
+    index_users(pks)
+    index_projects(Project.objects.filter(owner__in=pks).values_list("pk", flat=True))
+    index_small_groups(
+        SmallGroup.objects.filter(mentors__in=pks)
+        .values_list("pk", flat=True)
+        .distinct()
+    )
+
+
+def index_saved_user(sender, instance: User, update_fields=None, *args, **kwargs):
+    # Logging in only updates `last_login`, which isn't searchable
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return
+    index_users_and_dependents([instance.pk])
+
+
+def index_enrollment_user(sender, instance: Enrollment, *args, **kwargs):
+    index_users([instance.user_id])
+
+
+def index_saved_small_group(sender, instance: SmallGroup, *args, **kwargs):
+    index_small_groups([instance.pk])
+
+
+def index_saved_project(sender, instance: Project, *args, **kwargs):
+    index_projects([instance.pk])
+    index_users(instance.enrollments.values_list("user_id", flat=True))
+    index_small_groups(instance.small_groups.values_list("pk", flat=True))
+
+
+def index_tagged_projects(sender, instance: ProjectTag, *args, **kwargs):
+    index_projects(instance.projects.values_list("pk", flat=True))
+
+
+def index_changed_relation(index: Callable[[Iterable[int]], None], related_name: str):
+    """Creates an `m2m_changed` handler that reindexes the objects owning a many-to-many relation
+    (e.g. the small groups for `SmallGroup.mentors`), whichever side it was changed from."""
+
+    def handler(sender, instance: Model, action: str, reverse: bool, pk_set, **kwargs):
+        if not reverse:
+            if action.startswith("post_"):
+                index([instance.pk])
+        elif action == "pre_clear":
+            # The last chance to see which owners a clear from the other side affects
+            instance._search_cleared_pks = list(
+                getattr(instance, related_name).values_list("pk", flat=True)
+            )
+        elif action == "post_clear":
+            index(instance.__dict__.pop("_search_cleared_pks", []))
+        elif action in ("post_add", "post_remove"):
+            index(pk_set)
+
+    return handler
+
+
+post_save.connect(index_saved_user, sender=User)
+post_save.connect(index_enrollment_user, sender=Enrollment)
+post_delete.connect(index_enrollment_user, sender=Enrollment)
+post_save.connect(index_saved_project, sender=Project)
+post_save.connect(index_tagged_projects, sender=ProjectTag)
+post_save.connect(index_saved_small_group, sender=SmallGroup)
+m2m_changed.connect(
+    index_changed_relation(index_projects, "projects"),
+    sender=Project.tags.through,
+    weak=False,
+)
+m2m_changed.connect(
+    index_changed_relation(index_small_groups, "small_groups"),
+    sender=SmallGroup.projects.through,
+    weak=False,
+)
+m2m_changed.connect(
+    index_changed_relation(index_small_groups, "mentored_small_groups"),
+    sender=SmallGroup.mentors.through,
+    weak=False,
+)
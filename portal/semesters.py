@@ -0,0 +1,79 @@
+"""This module contains the semester registry, an immutable snapshot of every semester and the
+active one that is shared by every request without touching the database.
+
+The registry is kept both in a small process-local LRU and in the shared cache, keyed by a version
+number that `clear_semester_cache` bumps whenever a semester changes. Each request only reads the
+version; when it moves, every worker loads the new snapshot (from the shared cache if another worker
+already built it) on its next request."""
+
+import time
+from dataclasses import dataclass
+from datetime import date
+from functools import lru_cache
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from portal.models import SEMESTERS_VERSION_CACHE_KEY, Semester
+
+REGISTRY_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+@dataclass(frozen=True)
+class SemesterRegistry:
+    version: int
+    day: date
+    """The day the active semester was determined for."""
+    semesters: tuple[Semester, ...]
+    """Every semester, newest first."""
+    active: Semester | None
+
+    def get(self, semester_id: str) -> Semester | None:
+        return next(
+            (semester for semester in self.semesters if semester.pk == semester_id),
+            None,
+        )
+
+
+def get_semesters_version() -> int:
+    version = cache.get(SEMESTERS_VERSION_CACHE_KEY)
+    if version is None:
+        # First use (or the version was evicted), so start a new version everyone will agree on.
+        # It must be unique rather than 1, or a process's LRU and the shared cache could serve a
+        # registry built under an earlier run of the counter
+        cache.add(SEMESTERS_VERSION_CACHE_KEY, time.time_ns(), None)
+        version = cache.get(SEMESTERS_VERSION_CACHE_KEY)
+    return version
+
+
+def build_semester_registry(version: int, day: date) -> SemesterRegistry:
+    semesters = tuple(Semester.objects.order_by("-start_date"))
+    return SemesterRegistry(
+        version=version,
+        day=day,
+        semesters=semesters,
+        active=next(
+            (
+                semester
+                for semester in semesters
+                if semester.start_date <= day <= semester.end_date
+            ),
+            None,
+        ),
+    )
+
+
+@lru_cache(maxsize=4)
+def load_semester_registry(version: int, day: date) -> SemesterRegistry:
+    """Loads a version of the registry from the shared cache, building and storing it if missing.
+    Memoized per process, so each version is fetched at most once per worker and day."""
+    return cache.get_or_set(
+        f"semester_registry:{version}:{day.isoformat()}",
+        lambda: build_semester_registry(version, day),
+        REGISTRY_CACHE_TIMEOUT,
+    )
+
+
+def get_semester_registry() -> SemesterRegistry:
+    """Fetches the current registry, costing a single cache read for the version when warm."""
+    return load_semester_registry(get_semesters_version(), timezone.now().date())
@@ -1,7 +1,18 @@
+import logging
+import math
+import re
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
 from typing import Any, NotRequired, TypedDict, cast
 
 import requests
 from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
 
 DISCORD_VERSION_NUMBER = "10"
 DISCORD_API_ENDPOINT = f"https://discord.com/api/v{DISCORD_VERSION_NUMBER}"
@@ -22,6 +33,164 @@ which authenticates requests and gives us permission to do things as the bot.
 """
 
 
+MAJOR_PARAMETER_PATTERN = re.compile(
+    r"(?<!channels/)(?<!guilds/)(?<!webhooks/)\b\d{15,}\b"
+)
+"""Matches snowflake IDs in a path except those following a major parameter (channel, guild, webhook),
+which Discord rate limits separately."""
+
+RATE_LIMIT_CACHE_PREFIX = "discord_rate_limit"
+ROUTE_BUCKET_TIMEOUT = 60 * 60 * 24
+"""How long a route's bucket hash is remembered. Discord rarely changes which bucket a route is in."""
+
+
+class DiscordClient:
+    """A Discord REST client that shares one pooled session and respects Discord's rate limits.
+
+    Discord assigns every route a bucket and reports its state in the `X-RateLimit-*` response headers.
+    The client remembers each bucket's remaining requests and reset time, only waits when a bucket is
+    exhausted, and on a 429 waits exactly as long as `Retry-After` asks before retrying.
+    See https://discord.com/developers/docs/topics/rate-limits.
+
+    Bucket state lives in the cache (Redis in production) rather than in memory, since the limits
+    are per bot token: web processes and Celery workers all draw from the same buckets. Requests are
+    reserved with an atomic decrement, and state expires when its bucket resets.
+    """
+
+    def __init__(
+        self, headers: dict[str, str], timeout: float = 3, max_retries: int = 3
+    ):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        self.headers = headers
+
+    @staticmethod
+    def get_route(method: str, path: str):
+        return method + " " + MAJOR_PARAMETER_PATTERN.sub(":id", path)
+
+    @staticmethod
+    def route_bucket_cache_key(route: str):
+        # Cache keys can't contain spaces
+        return f"{RATE_LIMIT_CACHE_PREFIX}:route:{route.replace(' ', ':')}"
+
+    @staticmethod
+    def global_reset_cache_key():
+        return f"{RATE_LIMIT_CACHE_PREFIX}:global"
+
+    def get_bucket_key(self, route: str, path: str):
+        """Returns the cache key prefix of the route's bucket (its hash plus the route's major parameters),
+        or None if Discord hasn't reported the route's bucket yet."""
+        bucket_hash = cache.get(self.route_bucket_cache_key(route))
+        if bucket_hash is None:
+            return None
+        major_parameters = re.findall(r"(?:channels|guilds|webhooks)/(\d+)", path)
+        return f"{RATE_LIMIT_CACHE_PREFIX}:bucket:{bucket_hash}:" + ":".join(
+            major_parameters
+        )
+
+    def wait_for_bucket(self, route: str, path: str):
+        """Blocks until the route's bucket (and the global limit) allows another request,
+        then reserves that request so concurrent callers don't overdraw the bucket."""
+        now = time.time()
+        delay = max(cache.get(self.global_reset_cache_key(), 0) - now, 0)
+
+        bucket_key = self.get_bucket_key(route, path)
+        if bucket_key is not None:
+            try:
+                remaining = cache.decr(bucket_key + ":remaining")
+            except ValueError:
+                # The bucket has refilled (its state expired), but we don't know the limit
+                # until the next response
+                remaining = 0
+            else:
+                if remaining < 0:
+                    delay = max(delay, cache.get(bucket_key + ":reset_at", now) - now)
+
+        if delay > 0:
+            logger.info("Waiting %.2fs for Discord rate limit on %s", delay, route)
+            time.sleep(delay)
+
+    def update_bucket(self, route: str, path: str, response: requests.Response):
+        bucket_hash = response.headers.get("X-RateLimit-Bucket")
+        if bucket_hash is None:
+            return
+
+        cache.set(self.route_bucket_cache_key(route), bucket_hash, ROUTE_BUCKET_TIMEOUT)
+        try:
+            remaining = int(response.headers["X-RateLimit-Remaining"])
+            reset_after = float(response.headers["X-RateLimit-Reset-After"])
+        except (KeyError, ValueError):
+            return
+
+        bucket_key = self.get_bucket_key(route, path)
+        cache.set_many(
+            {
+                bucket_key + ":remaining": remaining,
+                bucket_key + ":reset_at": time.time() + reset_after,
+            },
+            # Expiring with the reset is what refills the bucket
+            max(math.ceil(reset_after), 1),
+        )
+
+    def request(
+        self, method: str, path: str, authenticate: bool = True, **kwargs
+    ) -> requests.Response:
+        """Sends a request to the Discord API, waiting out rate limits as needed.
+
+        Args:
+        ----
+            method: HTTP method
+            path: path relative to `DISCORD_API_ENDPOINT`, e.g. `/users/@me`
+            authenticate: whether to authenticate as the bot (disable for OAuth2 requests)
+            **kwargs: passed to `requests.Session.request`
+        Returns:
+            the last response, which is a 429 only if every retry was rate limited
+        """
+        route = self.get_route(method, path)
+        headers = {
+            **(self.headers if authenticate else {}),
+            **kwargs.pop("headers", {}),
+        }
+        kwargs.setdefault("timeout", self.timeout)
+
+        for attempt in range(self.max_retries + 1):
+            self.wait_for_bucket(route, path)
+            response = self.session.request(
+                method, DISCORD_API_ENDPOINT + path, headers=headers, **kwargs
+            )
+            self.update_bucket(route, path, response)
+
+            if response.status_code != 429 or attempt == self.max_retries:
+                return response
+
+            try:
+                body = response.json()
+            except ValueError:
+                body = {}
+            retry_after = float(
+                response.headers.get("Retry-After") or body.get("retry_after", 1)
+            )
+            if response.headers.get("X-RateLimit-Global") or body.get("global"):
+                cache.set(
+                    self.global_reset_cache_key(),
+                    time.time() + retry_after,
+                    max(math.ceil(retry_after), 1),
+                )
+
+            logger.warning(
+                "Rate limited by Discord on %s, retrying in %.2fs", route, retry_after
+            )
+            time.sleep(retry_after)
+
+        return response
+
+
+client = DiscordClient(HEADERS)
+"""The shared client used by the functions below. Sharing it pools connections; rate limit state is
+shared through the cache."""
+
+
 class DiscordTokens(TypedDict):
     """https://discord.com/developers/docs/topics/oauth2#authorization-code-grant-access-token-response."""
 
@@ -46,8 +215,10 @@ def get_tokens(code: str) -> DiscordTokens:
     ------
         HTTPError: if HTTP request fails.
     """
-    response = requests.post(
-        f"{DISCORD_API_ENDPOINT}/oauth2/token",
+    response = client.request(
+        "POST",
+        "/oauth2/token",
+        authenticate=False,
         data={
             "client_id": settings.DISCORD_CLIENT_ID,
             "client_secret": settings.DISCORD_CLIENT_SECRET,
@@ -57,7 +228,6 @@ def get_tokens(code: str) -> DiscordTokens:
             "scope": "identity guilds.join",
         },
         headers={"Content-Type": "application/x-www-form-urlencoded"},
-        timeout=3,
     )
     response.raise_for_status()
     # https://requests.readthedocs.io/en/latest/user/quickstart/#response-status-codes
@@ -76,12 +246,14 @@ class DiscordUser(TypedDict):
     banner: NotRequired[str]
     accent_color: NotRequired[str]
 
+
 def discord_username(user: DiscordUser):
     if int(user["discriminator"]) > 0:
         return user["username"] + "#" + user["discriminator"]
     else:
         return user["username"]
 
+
 def get_user_info(access_token: str) -> DiscordUser:
     """Given an access token get a Discord user's info including
     - id
@@ -98,13 +270,14 @@ def get_user_info(access_token: str) -> DiscordUser:
     See:
     https://discord.com/developers/docs/topics/oauth2#authorization-code-grant-access-token-exchange-example.
     """
-    response = requests.get(
-        f"{DISCORD_API_ENDPOINT}/users/@me",
+    response = client.request(
+        "GET",
+        "/users/@me",
+        authenticate=False,
         headers={
             "Authorization": f"Bearer {access_token}",
             "Content-Type": "application/json",
         },
-        timeout=3,
     )
     response.raise_for_status()
     # https://requests.readthedocs.io/en/latest/user/quickstart/#response-status-codes
@@ -144,11 +317,10 @@ def upsert_server_member(
     if nickname is not None:
         data["nick"] = nickname
 
-    response = requests.put(
-        f"{DISCORD_API_ENDPOINT}/guilds/{settings.DISCORD_SERVER_ID}/members/{user_id}",
+    response = client.request(
+        "PUT",
+        f"/guilds/{settings.DISCORD_SERVER_ID}/members/{user_id}",
         json=data,
-        headers=HEADERS,
-        timeout=3,
     )
 
     response.raise_for_status()
@@ -157,13 +329,13 @@ def upsert_server_member(
 
     # Add roles
     for role in roles if roles else []:
-        response = requests.put(
-            f"{DISCORD_API_ENDPOINT}/guilds/{settings.DISCORD_SERVER_ID}/members/{user_id}/roles/{role}",
+        response = client.request(
+            "PUT",
+            f"/guilds/{settings.DISCORD_SERVER_ID}/members/{user_id}/roles/{role}",
             json={"roles": roles},
-            headers=HEADERS,
-            timeout=3,
         )
 
+    invalidate_cached_server_member(user_id)
     return joined_server
 
 
@@ -179,9 +351,7 @@ def get_user(user_id: str) -> DiscordUser | None:
         HTTPError on failed request (e.g. not found)
     See https://discord.com/developers/docs/resources/user#get-user.
     """
-    response = requests.get(
-        f"{DISCORD_API_ENDPOINT}/users/{user_id}", headers=HEADERS, timeout=3
-    )
+    response = client.request("GET", f"/users/{user_id}")
 
     if response.status_code == 404:
         return None
@@ -205,10 +375,9 @@ def get_server_member(user_id: str) -> dict[str, Any] | None:
         HTTPError on failed request (e.g. not found)
     See https://discord.com/developers/docs/resources/guild#get-guild-member.
     """
-    response = requests.get(
-        f"{DISCORD_API_ENDPOINT}/guilds/{settings.DISCORD_SERVER_ID}/members/{user_id}",
-        headers=HEADERS,
-        timeout=3,
+    response = client.request(
+        "GET",
+        f"/guilds/{settings.DISCORD_SERVER_ID}/members/{user_id}",
     )
 
     if response.status_code == 404:
@@ -224,13 +393,12 @@ def get_server_member(user_id: str) -> dict[str, Any] | None:
 
 def create_user_dm_channel(user_id: str):
     """https://discord.com/developers/docs/resources/user#create-dm."""
-    response = requests.post(
-        f"{DISCORD_API_ENDPOINT}/users/@me/channels",
+    response = client.request(
+        "POST",
+        "/users/@me/channels",
         json={
             "recipient_id": user_id,
         },
-        headers=HEADERS,
-        timeout=3,
     )
     response.raise_for_status()
     # https://requests.readthedocs.io/en/latest/user/quickstart/#response-status-codes
@@ -240,11 +408,10 @@ def create_user_dm_channel(user_id: str):
 
 def dm_user(dm_channel_id: str, message_content: str):
     """https://discord.com/developers/docs/resources/channel#create-message."""
-    response = requests.post(
-        f"{DISCORD_API_ENDPOINT}/channels/{dm_channel_id}/messages",
+    response = client.request(
+        "POST",
+        f"/channels/{dm_channel_id}/messages",
         json={"content": message_content},
-        headers=HEADERS,
-        timeout=3,
     )
     response.raise_for_status()
     return response.json()
@@ -264,14 +431,14 @@ class CreateServerChannelParams(TypedDict):
 
 
 def create_server_channel(params: CreateServerChannelParams):
-    response = requests.post(
-        f"{DISCORD_API_ENDPOINT}/guilds/{settings.DISCORD_SERVER_ID}/channels",
-        headers=HEADERS,
-        timeout=3,
+    response = client.request(
+        "POST",
+        f"/guilds/{settings.DISCORD_SERVER_ID}/channels",
         json=params,
     )
 
     response.raise_for_status()
+    invalidate_guild_snapshot()
 
     return cast(dict[str, Any], response.json())
 
@@ -281,14 +448,14 @@ class ModifyChannelParams(CreateServerChannelParams):
 
 
 def modify_server_channel(channel_id: str, params: ModifyChannelParams):
-    response = requests.patch(
-        f"{DISCORD_API_ENDPOINT}/channels/{channel_id}",
-        headers=HEADERS,
-        timeout=3,
+    response = client.request(
+        "PATCH",
+        f"/channels/{channel_id}",
         json=params,
     )
 
     response.raise_for_status()
+    invalidate_guild_snapshot()
 
     return cast(dict[str, Any], response.json())
 
@@ -298,10 +465,9 @@ class SendMessageParams(TypedDict):
 
 
 def send_message(channel_id: str, params: SendMessageParams):
-    response = requests.post(
-        f"{DISCORD_API_ENDPOINT}/channels/{channel_id}/messages",
-        headers=HEADERS,
-        timeout=3,
+    response = client.request(
+        "POST",
+        f"/channels/{channel_id}/messages",
         json=params,
     )
 
@@ -319,14 +485,14 @@ class CreateRoleParams(TypedDict):
 
 
 def create_role(params: CreateRoleParams):
-    response = requests.post(
-        f"{DISCORD_API_ENDPOINT}/guilds/{settings.DISCORD_SERVER_ID}/roles",
-        headers=HEADERS,
-        timeout=3,
+    response = client.request(
+        "POST",
+        f"/guilds/{settings.DISCORD_SERVER_ID}/roles",
         json=params,
     )
 
     response.raise_for_status()
+    invalidate_guild_snapshot()
 
     return cast(dict[str, Any], response.json())
 
@@ -342,18 +508,86 @@ def add_role_to_member(user_id: str, role_id: str):
         HTTPError on failed request (will not fail if role is already set)
     See https://discord.com/developers/docs/resources/guild#modify-guild-member.
     """
-    response = requests.put(
-        f"{DISCORD_API_ENDPOINT}/guilds/{settings.DISCORD_SERVER_ID}"
-        f"/members/{user_id}/roles/{role_id}",
-        headers=HEADERS,
-        timeout=3,
+    response = client.request(
+        "PUT",
+        f"/guilds/{settings.DISCORD_SERVER_ID}/members/{user_id}/roles/{role_id}",
     )
     response.raise_for_status()
+    invalidate_cached_server_member(user_id)
     # https://requests.readthedocs.io/en/latest/user/quickstart/#response-status-codes
     # throws HTTPError for 4XX or 5XX
     return response
 
 
+def remove_role_from_member(user_id: str, role_id: str):
+    """Removes a role from a server member.
+
+    Args:
+    ----
+        user_id: Discord user's unique account ID (same as member ID)
+        role_id: ID of Discord role to remove from member
+    Raises:
+        HTTPError on failed request (will not fail if role is not set)
+    See https://discord.com/developers/docs/resources/guild#remove-guild-member-role.
+    """
+    response = client.request(
+        "DELETE",
+        f"/guilds/{settings.DISCORD_SERVER_ID}/members/{user_id}/roles/{role_id}",
+    )
+    response.raise_for_status()
+    invalidate_cached_server_member(user_id)
+    return response
+
+
+class ServerMember(TypedDict):
+    """https://discord.com/developers/docs/resources/guild#guild-member-object."""
+
+    user: DiscordUser
+    nick: NotRequired[str | None]
+    roles: list[str]
+
+
+def get_server_members() -> list[ServerMember]:
+    """Fetches every member of the server, 1000 at a time.
+
+    Requires the bot to have the privileged `GUILD_MEMBERS` intent.
+
+    Raises
+    ------
+        HTTPError on failed request
+    See https://discord.com/developers/docs/resources/guild#list-guild-members.
+    """
+    members: list[ServerMember] = []
+    after = "0"
+    while True:
+        response = client.request(
+            "GET",
+            f"/guilds/{settings.DISCORD_SERVER_ID}/members",
+            params={"limit": 1000, "after": after},
+        )
+        response.raise_for_status()
+        page = cast(list[ServerMember], response.json())
+        members.extend(page)
+        if len(page) < 1000:
+            return members
+        after = page[-1]["user"]["id"]
+
+
+class ServerRole(TypedDict):
+    """https://discord.com/developers/docs/topics/permissions#role-object."""
+
+    id: str
+    name: str
+    position: int
+
+
+def get_server_roles() -> list[ServerRole]:
+    """https://discord.com/developers/docs/resources/guild#get-guild-roles."""
+    response = client.request("GET", f"/guilds/{settings.DISCORD_SERVER_ID}/roles")
+    response.raise_for_status()
+    return cast(list[ServerRole], response.json())
+
+
 def kick_user_from_server(user_id: str):
     """Given a Discord user's id, kicks them from the RCOS server.
 
@@ -364,12 +598,12 @@ def kick_user_from_server(user_id: str):
         HTTPError on failed request (e.g. missing permission to kick member)
     See https://discord.com/developers/docs/resources/guild#remove-guild-member.
     """
-    response = requests.delete(
-        f"{DISCORD_API_ENDPOINT}/guilds/{settings.DISCORD_SERVER_ID}/members/{user_id}",
-        headers=HEADERS,
-        timeout=3,
+    response = client.request(
+        "DELETE",
+        f"/guilds/{settings.DISCORD_SERVER_ID}/members/{user_id}",
     )
     response.raise_for_status()
+    invalidate_cached_server_member(user_id)
     # https://requests.readthedocs.io/en/latest/user/quickstart/#response-status-codes
     # throws HTTPError for 4XX or 5XX
     return response
@@ -386,13 +620,13 @@ def set_member_nickname(user_id: str, nickname: str):
         HTTPError on failed request
     See https://discord.com/developers/docs/resources/guild#modify-current-member.
     """
-    response = requests.patch(
-        f"{DISCORD_API_ENDPOINT}/guilds/{settings.DISCORD_SERVER_ID}/members/{user_id}",
+    response = client.request(
+        "PATCH",
+        f"/guilds/{settings.DISCORD_SERVER_ID}/members/{user_id}",
         json={"nick": nickname},
-        headers=HEADERS,
-        timeout=3,
     )
     response.raise_for_status()
+    invalidate_cached_server_member(user_id)
     # https://requests.readthedocs.io/en/latest/user/quickstart/#response-status-codes
     # throws HTTPError for 4XX or 5XX
     return response
@@ -407,14 +641,14 @@ class ServerScheduledEvent(TypedDict):
     scheduled_end_time: NotRequired[str]
     privacy_level: str
     status: str
+    entity_metadata: NotRequired[dict[str, Any] | None]
 
 
 def get_server_event(event_id: str) -> ServerScheduledEvent:
     """https://discord.com/developers/docs/resources/guild-scheduled-event#get-guild-scheduled-event."""
-    response = requests.get(
-        f"{DISCORD_API_ENDPOINT}/guilds/{settings.DISCORD_SERVER_ID}/scheduled-events/{event_id}",
-        headers=HEADERS,
-        timeout=3,
+    response = client.request(
+        "GET",
+        f"/guilds/{settings.DISCORD_SERVER_ID}/scheduled-events/{event_id}",
     )
     response.raise_for_status()
     # https://requests.readthedocs.io/en/latest/user/quickstart/#response-status-codes
@@ -430,8 +664,9 @@ def create_server_event(
     location: str | None,
 ) -> ServerScheduledEvent:
     """https://discord.com/developers/docs/resources/guild-scheduled-event#create-guild-scheduled-event."""
-    response = requests.post(
-        f"{DISCORD_API_ENDPOINT}/guilds/{settings.DISCORD_SERVER_ID}/scheduled-events",
+    response = client.request(
+        "POST",
+        f"/guilds/{settings.DISCORD_SERVER_ID}/scheduled-events",
         json={
             "entity_metadata": {"location": location},
             "name": name,
@@ -441,8 +676,6 @@ def create_server_event(
             "scheduled_end_time": scheduled_end_time,
             "privacy_level": 2,
         },
-        headers=HEADERS,
-        timeout=3,
     )
     response.raise_for_status()
     return response.json()
@@ -457,8 +690,9 @@ def update_server_event(
     location: str | None,
 ) -> ServerScheduledEvent:
     """https://discord.com/developers/docs/resources/guild-scheduled-event#create-guild-scheduled-event."""
-    response = requests.patch(
-        f"{DISCORD_API_ENDPOINT}/guilds/{settings.DISCORD_SERVER_ID}/scheduled-events/{event_id}",
+    response = client.request(
+        "PATCH",
+        f"/guilds/{settings.DISCORD_SERVER_ID}/scheduled-events/{event_id}",
         json={
             "entity_metadata": {"location": location},
             "name": name,
@@ -468,8 +702,6 @@ def update_server_event(
             "scheduled_end_time": scheduled_end_time,
             "privacy_level": 2,
         },
-        headers=HEADERS,
-        timeout=3,
     )
     response.raise_for_status()
     return response.json()
@@ -479,13 +711,22 @@ def delete_server_event(
     event_id: str,
 ):
     """https://discord.com/developers/docs/resources/guild-scheduled-event#delete-guild-scheduled-event."""
-    response = requests.delete(
-        f"{DISCORD_API_ENDPOINT}/guilds/{settings.DISCORD_SERVER_ID}/scheduled-events/{event_id}",
-        headers=HEADERS,
-        timeout=3,
+    response = client.request(
+        "DELETE",
+        f"/guilds/{settings.DISCORD_SERVER_ID}/scheduled-events/{event_id}",
     )
     response.raise_for_status()
-    return response.json()
+    # Discord responds with 204 No Content
+    return response
+
+
+def get_server_events() -> list[ServerScheduledEvent]:
+    """https://discord.com/developers/docs/resources/guild-scheduled-event#list-scheduled-events-for-guild."""
+    response = client.request(
+        "GET", f"/guilds/{settings.DISCORD_SERVER_ID}/scheduled-events"
+    )
+    response.raise_for_status()
+    return cast(list[ServerScheduledEvent], response.json())
 
 
 class ServerChannel(TypedDict):
@@ -500,20 +741,116 @@ class ServerChannel(TypedDict):
 
 
 def get_server_channels():
-    response = requests.get(
-        f"{DISCORD_API_ENDPOINT}/guilds/{settings.DISCORD_SERVER_ID}/channels",
-        headers=HEADERS,
-        timeout=3,
+    response = client.request(
+        "GET",
+        f"/guilds/{settings.DISCORD_SERVER_ID}/channels",
     )
     response.raise_for_status()
     return cast(list[ServerChannel], response.json())
 
 
 def delete_channel(channel_id: str):
-    response = requests.delete(
-        f"{DISCORD_API_ENDPOINT}/channels/{channel_id}",
-        headers=HEADERS,
-        timeout=3,
+    response = client.request(
+        "DELETE",
+        f"/channels/{channel_id}",
     )
     response.raise_for_status()
+    invalidate_guild_snapshot()
     return cast(ServerChannel, response.json())
+
+
+GUILD_SNAPSHOT_CACHE_KEY = "discord_guild_snapshot"
+GUILD_SNAPSHOT_TIMEOUT = 60 * 15
+"""How long a snapshot is reused. Channel and role changes made through this module invalidate it
+immediately and member changes are left to the sync jobs that make them in bulk (see
+`portal.discord_sync`), so this bounds staleness from one-off member changes and changes made
+directly in Discord."""
+DISCORD_USER_CACHE_TIMEOUT = 60 * 60
+
+
+@dataclass
+class GuildSnapshot:
+    """The server's channels, roles, and members fetched together in bulk, indexed for lookups.
+
+    Fetching every member pages through the whole server, which requires the bot to have the
+    privileged `GUILD_MEMBERS` intent enabled in the Discord developer portal. This makes the snapshot
+    costly to build, so it backs the Discord admin page and sync planning; user pages look up single
+    members instead (see `get_cached_server_member`).
+    """
+
+    channels: list[ServerChannel]
+    roles: list[ServerRole]
+    members: list[ServerMember]
+    fetched_at: datetime
+
+    def __post_init__(self):
+        self.channels_by_parent_id: dict[str | None, list[ServerChannel]] = defaultdict(
+            list
+        )
+        for channel in self.channels:
+            self.channels_by_parent_id[channel.get("parent_id")].append(channel)
+        self.roles_by_id = {role["id"]: role for role in self.roles}
+        self.members_by_id = {member["user"]["id"]: member for member in self.members}
+
+    @classmethod
+    def fetch(cls):
+        return cls(
+            channels=get_server_channels(),
+            roles=get_server_roles(),
+            members=get_server_members(),
+            fetched_at=timezone.now(),
+        )
+
+    @property
+    def categories(self):
+        return [
+            channel
+            for channel in self.channels
+            if channel["type"] == CATEGORY_CHANNEL_TYPE
+        ]
+
+
+def get_guild_snapshot() -> GuildSnapshot:
+    """Fetches the server snapshot from the cache, fetching it from Discord if missing or expired."""
+    return cache.get_or_set(
+        GUILD_SNAPSHOT_CACHE_KEY, GuildSnapshot.fetch, GUILD_SNAPSHOT_TIMEOUT
+    )
+
+
+def invalidate_guild_snapshot():
+    cache.delete(GUILD_SNAPSHOT_CACHE_KEY)
+
+
+def server_member_cache_key(user_id: str):
+    return f"discord_member:{user_id}"
+
+
+def get_cached_server_member(user_id: str) -> ServerMember | None:
+    """Looks up a single server member, cached until a change made through this module touches them."""
+    key = server_member_cache_key(user_id)
+    member = cache.get(key)
+    if member is None:
+        # Cache misses as False so users who aren't on the server aren't looked up every time
+        member = get_server_member(user_id) or False
+        cache.set(key, member, DISCORD_USER_CACHE_TIMEOUT)
+    return member or None
+
+
+def invalidate_cached_server_member(user_id: str):
+    cache.delete(server_member_cache_key(user_id))
+
+
+def get_cached_user(user_id: str) -> DiscordUser | None:
+    """Looks up a Discord user from their cached server member, falling back to a cached
+    individual lookup for users who aren't on the server."""
+    member = get_cached_server_member(user_id)
+    if member is not None:
+        return member["user"]
+
+    key = f"discord_user:{user_id}"
+    user = cache.get(key)
+    if user is None:
+        # Cache misses as False so users who don't exist aren't looked up every time
+        user = get_user(user_id) or False
+        cache.set(key, user, DISCORD_USER_CACHE_TIMEOUT)
+    return user or None
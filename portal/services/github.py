@@ -1,9 +1,24 @@
-from typing import TypedDict
+import logging
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, TypedDict, TypeVar
 
 import requests
 from django.conf import settings
+from django.core.cache import cache
 from gql import Client, gql
+from gql.client import SyncClientSession
+from gql.transport.exceptions import TransportQueryError
 from gql.transport.requests import RequestsHTTPTransport
+from graphql import DocumentNode, OperationDefinitionNode
+
+logger = logging.getLogger(__name__)
+
+GITHUB_GRAPHQL_URL = "https://api.github.com/graphql"
 
 GITHUB_AUTH_URL = (
     "https://github.com/login/oauth/authorize"
@@ -47,94 +62,424 @@ def get_tokens(code: str) -> GitHubTokens:
     return tokens
 
 
-def get_user_username(client: Client) -> str:
-    query = gql(
-        """
-        {
-            viewer {
-                login
+RATE_LIMIT_FIELDS = """
+rateLimit {
+    cost
+    remaining
+    resetAt
+}
+"""
+"""Selected in every query so each call reports its cost and the remaining quota."""
+
+RATE_LIMIT_CACHE_KEY = "github_rate_limit"
+
+USER_USERNAME_QUERY = gql(
+    """
+    query ViewerLogin {
+        viewer {
+            login
+        }
+    """
+    + RATE_LIMIT_FIELDS
+    + "}"
+)
+
+REPOSITORY_DETAILS_FRAGMENT = """
+fragment RepositoryDetails on Repository {
+    owner {
+        login
+    }
+    name
+    url
+    description
+    forkCount
+    stargazerCount
+    primaryLanguage {
+        name
+        color
+    }
+    defaultBranchRef {
+    target {
+        ... on Commit {
+        history(first: 5) {
+            nodes {
+            url
+            author {
+                name
+                user {
+                    login
+                }
+                avatarUrl
+            }
+            authoredDate
+            additions
+            deletions
+            messageHeadline
+            messageBody
             }
         }
-        """
+        }
+    }
+    }
+    readme: object(expression: "main:README.md") {
+    ... on Blob {
+        text
+    }
+    }
+    license: object(expression: "main:LICENSE") {
+    ... on Blob {
+        text
+    }
+    }
+}
+"""
+
+REPOSITORY_DETAILS_QUERY = gql(
+    """
+    query RepoDetails($owner: String!, $name: String!) {
+        repository(owner: $owner, name: $name) {
+            ...RepositoryDetails
+        }
+    """
+    + RATE_LIMIT_FIELDS
+    + "}"
+    + REPOSITORY_DETAILS_FRAGMENT
+)
+
+
+@lru_cache(maxsize=32)
+def get_repositories_details_query(count: int) -> DocumentNode:
+    """Builds and parses (once per repository count) a query that aliases one `repository` field
+    per repository, e.g. `repo0: repository(owner: $owner0, name: $name0)`."""
+    variable_definitions = ", ".join(
+        f"$owner{index}: String!, $name{index}: String!" for index in range(count)
+    )
+    fields = " ".join(
+        f"repo{index}: repository(owner: $owner{index}, name: $name{index}) "
+        "{ ...RepositoryDetails }"
+        for index in range(count)
+    )
+    return gql(
+        f"query RepositoriesDetails({variable_definitions}) "
+        f"{{ {fields} {RATE_LIMIT_FIELDS} }}" + REPOSITORY_DETAILS_FRAGMENT
     )
 
-    result = client.execute(query)
-    return result["viewer"]["login"]
+
+def get_operation_name(document: DocumentNode):
+    for definition in document.definitions:
+        if isinstance(definition, OperationDefinitionNode) and definition.name:
+            return definition.name.value
+    return "anonymous"
 
 
-def client_factory(token: str = settings.GITHUB_API_TOKEN):
-    """Creates a new GQL client pointing to the Hasura API.
-    Instead of using one client across the app, one client should be made per request
-    to avoid threading errors.
+def record_call(
+    document: DocumentNode, latency: float, rate_limit: dict[str, Any] | None
+):
+    """Logs a call's latency and cost, and stores the latest quota so it is visible across workers."""
+    if rate_limit:
+        logger.info(
+            "GitHub %s took %.0fms (cost %s, %s remaining until %s)",
+            get_operation_name(document),
+            latency * 1000,
+            rate_limit["cost"],
+            rate_limit["remaining"],
+            rate_limit["resetAt"],
+        )
+        cache.set(RATE_LIMIT_CACHE_KEY, rate_limit, 60 * 60)
+    else:
+        logger.info(
+            "GitHub %s took %.0fms", get_operation_name(document), latency * 1000
+        )
+
+
+class GitHubClient:
+    """A GitHub GraphQL client that keeps its HTTP session open between queries instead of
+    reconnecting for every call, and records each call's latency and rate limit cost.
+
+    Clients are not thread-safe, use `client_factory` to get the current thread's client.
+    """
+
+    def __init__(self, token: str):
+        transport = RequestsHTTPTransport(
+            url=GITHUB_GRAPHQL_URL,
+            verify=True,
+            retries=3,
+            headers={"Authorization": f"bearer {token}"},
+        )
+        self.client = Client(transport=transport)
+        self.session: SyncClientSession = self.client.connect_sync()
+        self.last_rate_limit: dict[str, Any] | None = None
+
+    def execute(
+        self, document: DocumentNode, variable_values: dict[str, Any] | None = None
+    ) -> dict[str, Any]:
+        start = time.perf_counter()
+        rate_limit = None
+        try:
+            result = self.session.execute(document, variable_values=variable_values)
+            rate_limit = result.pop("rateLimit", None)
+            return result
+        except TransportQueryError as e:
+            if e.data:
+                rate_limit = e.data.pop("rateLimit", None)
+            raise
+        finally:
+            self.last_rate_limit = rate_limit
+            record_call(document, time.perf_counter() - start, rate_limit)
+
+    def close(self):
+        self.client.close_sync()
+
+
+MAX_CLIENTS_PER_THREAD = 8
+"""Bounds how many tokens' sessions each thread keeps open (e.g. users' OAuth tokens at login)."""
+
+thread_clients = threading.local()
+
+
+def client_factory(token: str = settings.GITHUB_API_TOKEN) -> GitHubClient:
+    """Returns the current thread's client for the given token, creating it on first use.
+    Reusing clients keeps their HTTP connections pooled across requests.
 
     Returns
     -------
-        new GQL client.
+        GitHubClient with an open session.
     """
-    transport = RequestsHTTPTransport(
-        url="https://api.github.com/graphql",
-        verify=True,
-        retries=3,
-        headers={"Authorization": f"bearer {token}"},
+    clients: OrderedDict[str, GitHubClient] | None = getattr(
+        thread_clients, "clients", None
     )
-    return Client(transport=transport)
+    if clients is None:
+        clients = thread_clients.clients = OrderedDict()
 
+    if token in clients:
+        clients.move_to_end(token)
+        return clients[token]
 
-def get_repository_details(client: Client, repo_url: str):
-    owner, name = repo_url.split("/")[-2:]
-    query = gql(
-        """
-        query RepoDetails($owner: String!, $name: String!) {
-            repository(owner: $owner, name: $name) {
-                owner {
-                    login
-                }
-                name
-                url
-                description
-                forkCount
-                stargazerCount
-                primaryLanguage {
-                    name
-                    color
-                }
-                defaultBranchRef {
+    client = clients[token] = GitHubClient(token)
+    if len(clients) > MAX_CLIENTS_PER_THREAD:
+        _, evicted_client = clients.popitem(last=False)
+        evicted_client.close()
+    return client
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+query_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="github")
+"""Long-lived so its threads, and the clients they keep in `thread_clients`, are reused
+between calls instead of leaking a session per worker every run."""
+
+
+def map_concurrently(
+    fn: Callable[[GitHubClient, T], R],
+    items: list[T],
+    token: str = settings.GITHUB_API_TOKEN,
+) -> list[R]:
+    """Calls `fn(client, item)` for every item across `query_executor`'s threads, each with
+    its own pooled client, so independent queries run in parallel instead of one after
+    another. Exceptions propagate, so `fn` should handle the ones it can recover from.
+    `fn` must not call `map_concurrently` itself, since it would wait on its own pool."""
+    return list(query_executor.map(lambda item: fn(client_factory(token), item), items))
+
+
+def get_user_username(client: GitHubClient) -> str:
+    result = client.execute(USER_USERNAME_QUERY)
+    return result["viewer"]["login"]
+
+
+def parse_repository_url(repo_url: str):
+    owner, name = repo_url.rstrip("/").split("/")[-2:]
+    return owner, name.removesuffix(".git")
+
+
+def get_repository_details(client: GitHubClient, repo_url: str):
+    owner, name = parse_repository_url(repo_url)
+    return client.execute(
+        REPOSITORY_DETAILS_QUERY, variable_values={"owner": owner, "name": name}
+    )
+
+
+def get_repositories_details(client: GitHubClient, repo_urls: list[str]):
+    """Fetches the details of several repositories in a single GraphQL query by aliasing
+    one `repository` field per URL.
+
+    Returns
+    -------
+        the repository details in the same order as `repo_urls`, with None for any
+        repository that couldn't be found or accessed
+    """
+    if not repo_urls:
+        return []
+
+    variable_values = {}
+    for index, repo_url in enumerate(repo_urls):
+        owner, name = parse_repository_url(repo_url)
+        variable_values[f"owner{index}"] = owner
+        variable_values[f"name{index}"] = name
+
+    try:
+        result = client.execute(
+            get_repositories_details_query(len(repo_urls)),
+            variable_values=variable_values,
+        )
+    except TransportQueryError as e:
+        # Missing or private repositories error individually, the rest still resolve
+        if not e.data:
+            raise
+        result = e.data
+
+    return [result.get(f"repo{index}") for index in range(len(repo_urls))]
+
+
+REPOSITORY_COMMITS_QUERY = gql(
+    """
+    query RepositoryCommits($owner: String!, $name: String!, $since: GitTimestamp, $until: GitTimestamp, $after: String) {
+        repository(owner: $owner, name: $name) {
+            defaultBranchRef {
                 target {
                     ... on Commit {
-                    history(first: 5) {
-                        nodes {
-                        url
-                        author {
-                            name
-                            user {
-                                login
+                        history(first: 100, since: $since, until: $until, after: $after) {
+                            pageInfo {
+                                hasNextPage
+                                endCursor
+                            }
+                            nodes {
+                                oid
+                                url
+                                committedDate
+                                messageHeadline
+                                additions
+                                deletions
+                                author {
+                                    user {
+                                        login
+                                    }
+                                }
                             }
-                            avatarUrl
-                        }
-                        authoredDate
-                        additions
-                        deletions
-                        messageHeadline
-                        messageBody
                         }
                     }
-                    }
-                }
                 }
-                readme: object(expression: "main:README.md") {
-                ... on Blob {
-                    text
+            }
+        }
+    """
+    + RATE_LIMIT_FIELDS
+    + "}"
+)
+
+REPOSITORY_PULL_REQUESTS_QUERY = gql(
+    """
+    query RepositoryPullRequests($owner: String!, $name: String!, $after: String) {
+        repository(owner: $owner, name: $name) {
+            items: pullRequests(first: 100, after: $after, orderBy: {field: CREATED_AT, direction: ASC}) {
+                pageInfo {
+                    hasNextPage
+                    endCursor
                 }
+                nodes {
+                    number
+                    url
+                    title
+                    createdAt
+                    author {
+                        login
+                    }
                 }
-                license: object(expression: "main:LICENSE") {
-                ... on Blob {
-                    text
+            }
+        }
+    """
+    + RATE_LIMIT_FIELDS
+    + "}"
+)
+
+REPOSITORY_ISSUES_QUERY = gql(
+    """
+    query RepositoryIssues($owner: String!, $name: String!, $after: String) {
+        repository(owner: $owner, name: $name) {
+            items: issues(first: 100, after: $after, orderBy: {field: CREATED_AT, direction: ASC}) {
+                pageInfo {
+                    hasNextPage
+                    endCursor
                 }
+                nodes {
+                    number
+                    url
+                    title
+                    createdAt
+                    author {
+                        login
+                    }
                 }
             }
         }
-        """
-    )
+    """
+    + RATE_LIMIT_FIELDS
+    + "}"
+)
+
+
+def get_repository_commits(
+    client: GitHubClient,
+    repo_url: str,
+    since: str | None,
+    until: str | None = None,
+    max_pages: int = 10,
+) -> tuple[list[dict[str, Any]], bool]:
+    """Fetches the default branch's commits between the given ISO timestamps, newest first.
+
+    Returns
+    -------
+        the commits and whether they are all of them, which is False when `max_pages` ran out first
+    """
+    owner, name = parse_repository_url(repo_url)
+    commits = []
+    after = None
+    for _ in range(max_pages):
+        result = client.execute(
+            REPOSITORY_COMMITS_QUERY,
+            variable_values={
+                "owner": owner,
+                "name": name,
+                "since": since,
+                "until": until,
+                "after": after,
+            },
+        )
+        branch = result["repository"] and result["repository"]["defaultBranchRef"]
+        if not branch:
+            return commits, True
+        history = branch["target"]["history"]
+        commits.extend(history["nodes"])
+        if not history["pageInfo"]["hasNextPage"]:
+            return commits, True
+        after = history["pageInfo"]["endCursor"]
+    return commits, False
+
+
+def get_repository_items_after(
+    client: GitHubClient,
+    query: DocumentNode,
+    repo_url: str,
+    after: str | None,
+    max_pages: int = 10,
+) -> tuple[list[dict[str, Any]], str | None]:
+    """Fetches the pull requests or issues created after the given cursor, oldest first.
 
-    result = client.execute(query, variable_values={"owner": owner, "name": name})
-    return result
+    Returns
+    -------
+        the items and the cursor to resume from next time
+    """
+    owner, name = parse_repository_url(repo_url)
+    items = []
+    for _ in range(max_pages):
+        result = client.execute(
+            query, variable_values={"owner": owner, "name": name, "after": after}
+        )
+        if not result["repository"]:
+            break
+        connection = result["repository"]["items"]
+        items.extend(connection["nodes"])
+        after = connection["pageInfo"]["endCursor"] or after
+        if not connection["pageInfo"]["hasNextPage"]:
+            break
+    return items, after
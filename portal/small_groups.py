@@ -0,0 +1,177 @@
+"""This module maintains `SmallGroupMembership`, the precomputed index of which small group each user is
+in per semester.
+
+A user is in a small group when their enrollment for the small group's semester is on one of its
+projects, which takes a join from small groups through projects to enrollments to answer. The answer is
+stored per user instead, and signals sync it whenever enrollments, small groups, or the projects in
+small groups change. Checking membership is then one indexed lookup, or a set lookup with
+`get_small_group_member_ids`."""
+
+from collections.abc import Iterable
+
+from django.db.models import F, QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+
+from portal.cache import invalidate_tags, tagged_get_or_set
+from portal.models import Enrollment, Project, SmallGroup, SmallGroupMembership
+
+MEMBERSHIP_BATCH_SIZE = 1000
+
+Membership = tuple[str, int, int]
+"""(semester ID, user ID, small group ID)"""
+
+
+def small_group_membership_tag(small_group_id: int):
+    return f"small_group_membership:{small_group_id}"
+
+
+def get_small_group_member_ids(small_group_id: int) -> frozenset[int]:
+    """Returns the IDs of the small group's members, cached until its membership changes."""
+    return tagged_get_or_set(
+        f"small_group_member_ids:{small_group_id}",
+        lambda: frozenset(
+            SmallGroupMembership.objects.filter(
+                small_group_id=small_group_id
+            ).values_list("user_id", flat=True)
+        ),
+        [small_group_membership_tag(small_group_id)],
+    )
+
+
+def build_memberships(enrollments: QuerySet, **filters) -> set[Membership]:
+    """Derives the memberships of the enrollments. Filters on the small group (e.g.
+    `project__small_groups__in`) must be passed here to apply to the same join."""
+    return set(
+        enrollments.filter(
+            project__small_groups__semester_id=F("semester_id"), **filters
+        )
+        .order_by()
+        .values_list("semester_id", "user_id", "project__small_groups")
+    )
+
+
+def apply_memberships(
+    existing: QuerySet, memberships: set[Membership], membership_model
+) -> set[int]:
+    """Makes the existing memberships match the derived ones, returning the IDs of the small groups
+    whose members changed."""
+    stored = {
+        (semester_id, user_id, small_group_id): pk
+        for pk, semester_id, user_id, small_group_id in existing.values_list(
+            "pk", "semester_id", "user_id", "small_group_id"
+        )
+    }
+    removed = stored.keys() - memberships
+    added = memberships - stored.keys()
+
+    if removed:
+        membership_model.objects.filter(
+            pk__in=[stored[membership] for membership in removed]
+        ).delete()
+    membership_model.objects.bulk_create(
+        [
+            membership_model(
+                semester_id=semester_id, user_id=user_id, small_group_id=small_group_id
+            )
+            for semester_id, user_id, small_group_id in added
+        ],
+        batch_size=MEMBERSHIP_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+    return {small_group_id for _, _, small_group_id in removed | added}
+
+
+def sync_user_memberships(semester_id: str, user_ids: Iterable[int]):
+    user_ids = list(user_ids)
+    changed = apply_memberships(
+        SmallGroupMembership.objects.filter(
+            semester_id=semester_id, user_id__in=user_ids
+        ),
+        build_memberships(
+            Enrollment.objects.filter(semester_id=semester_id, user_id__in=user_ids)
+        ),
+        SmallGroupMembership,
+    )
+    invalidate_tags(*map(small_group_membership_tag, changed))
+
+
+def sync_small_group_memberships(small_group_ids: Iterable[int]):
+    small_group_ids = list(small_group_ids)
+    changed = apply_memberships(
+        SmallGroupMembership.objects.filter(small_group_id__in=small_group_ids),
+        build_memberships(
+            Enrollment.objects.all(), project__small_groups__in=small_group_ids
+        ),
+        SmallGroupMembership,
+    )
+    invalidate_tags(*map(small_group_membership_tag, changed))
+
+
+def rebuild_small_group_memberships() -> set[int]:
+    """Rebuilds every membership, returning the IDs of the small groups whose members changed.
+    Invalidating the cache is left to the caller."""
+    return apply_memberships(
+        SmallGroupMembership.objects.all(),
+        build_memberships(Enrollment.objects.all()),
+        SmallGroupMembership,
+    )
+
+
+def sync_enrollment_memberships(
+    sender, instance: Enrollment, update_fields=None, *args, **kwargs
+):
+    # Most enrollment saves (e.g. credits or roles) can't change membership
+    if update_fields is not None and not {"semester", "user", "project"} & set(
+        update_fields
+    ):
+        return
+    sync_user_memberships(instance.semester_id, [instance.user_id])
+
+
+def sync_saved_small_group_memberships(sender, instance: SmallGroup, *args, **kwargs):
+    # A small group moved to another semester has different members
+    sync_small_group_memberships([instance.pk])
+
+
+def remember_deleted_project_small_groups(sender, instance: Project, *args, **kwargs):
+    # Deleting a project clears its enrollments and small groups without any signals
+    instance._membership_small_group_pks = list(
+        instance.small_groups.values_list("pk", flat=True)
+    )
+
+
+def sync_deleted_project_memberships(sender, instance: Project, *args, **kwargs):
+    sync_small_group_memberships(
+        instance.__dict__.pop("_membership_small_group_pks", [])
+    )
+
+
+def sync_changed_small_group_projects(
+    sender, instance, action: str, reverse: bool, pk_set, **kwargs
+):
+    """Resyncs the small groups whose projects changed, whichever side they were changed from."""
+    if not reverse:
+        if action.startswith("post_"):
+            sync_small_group_memberships([instance.pk])
+    elif action == "pre_clear":
+        # The last chance to see which small groups a clear from the project's side affects
+        instance._membership_cleared_pks = list(
+            instance.small_groups.values_list("pk", flat=True)
+        )
+    elif action == "post_clear":
+        sync_small_group_memberships(
+            instance.__dict__.pop("_membership_cleared_pks", [])
+        )
+    elif action in ("post_add", "post_remove"):
+        sync_small_group_memberships(pk_set)
+
+
+post_save.connect(sync_enrollment_memberships, sender=Enrollment)
+post_delete.connect(sync_enrollment_memberships, sender=Enrollment)
+post_save.connect(sync_saved_small_group_memberships, sender=SmallGroup)
+pre_delete.connect(remember_deleted_project_small_groups, sender=Project)
+post_delete.connect(sync_deleted_project_memberships, sender=Project)
+m2m_changed.connect(
+    sync_changed_small_group_projects, sender=SmallGroup.projects.through
+)
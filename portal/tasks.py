@@ -1,13 +1,16 @@
+import logging
 import os
-import time
 
 from celery import shared_task
 from django.db.models import Manager
 from django.utils import timezone
 from requests import HTTPError
 
-from portal.models import Meeting
-from portal.services import discord
+from portal import attendance_codes, contributions, discord_sync, imports
+from portal.models import Meeting, Project, Semester
+from portal.services import discord, github
+
+logger = logging.getLogger(__name__)
 
 
 @shared_task
@@ -17,7 +20,71 @@ def delete_discord_channels(channel_ids: list[str]):
             discord.delete_channel(channel_id)
         except HTTPError as e:
             print(e, e.response)
-        time.sleep(2)
+
+@shared_task
+def run_import_job(job_id: str):
+    imports.run_import_job(job_id)
+
+@shared_task
+def run_discord_sync(job_id: str):
+    lanes = discord_sync.start_discord_sync_job(job_id)
+    for lane, operations in enumerate(lanes):
+        apply_discord_sync_operations.delay(job_id, lane, operations)
+
+@shared_task
+def apply_discord_sync_operations(job_id: str, lane: int, operations: list[dict]):
+    discord_sync.apply_discord_sync_operations(job_id, lane, operations)
+
+@shared_task
+def refresh_project_repositories(project_id: int):
+    project = Project.objects.get(pk=project_id)
+    project.refresh_repositories_cache(github.client_factory())
+
+@shared_task
+def refresh_active_project_repositories():
+    """Periodically refreshes the repository details of every project active this semester,
+    querying GitHub for several projects at once."""
+    semester = Semester.get_active()
+    if semester is None:
+        return
+
+    projects = list(
+        Project.objects.filter(
+            enrollments__semester=semester, repositories__isnull=False
+        )
+        .distinct()
+        .prefetch_related("repositories")
+    )
+
+    def fetch(client: github.GitHubClient, project: Project):
+        try:
+            return github.get_repositories_details(
+                client, [repo.url for repo in project.repositories.all()]
+            )
+        except Exception:
+            logger.exception(
+                "Failed to refresh repositories of project %s", project.pk
+            )
+            return None
+
+    for project, repositories in zip(
+        projects, github.map_concurrently(fetch, projects)
+    ):
+        if repositories is not None:
+            project.set_repositories_cache(
+                [repository for repository in repositories if repository]
+            )
+
+@shared_task
+def ingest_contributions():
+    """Periodically ingests new GitHub activity from active projects' repositories and
+    refreshes the weekly contribution aggregates shown on dashboards and profiles."""
+    contributions.ingest_active_project_contributions()
+
+@shared_task
+def flush_attendance_buffer():
+    """Inserts the submitted attendances waiting in the write-behind buffer in batches."""
+    attendance_codes.flush_buffered_attendances()
 
 @shared_task
 def meetings_alert():
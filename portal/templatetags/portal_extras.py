@@ -3,6 +3,7 @@ from typing import Any
 from django import template
 from django.utils import timezone
 
+from portal.checks import get_check_context
 from portal.models import User
 
 register = template.Library()
@@ -11,15 +12,19 @@ register = template.Library()
 @register.simple_tag
 def project_leads(project, semester):
     if semester and project:
-        return project.enrollments.filter(semester=semester, is_project_lead=True)
+        return project.enrollments.filter(
+            semester=semester, is_project_lead=True
+        ).select_related("user")
     return []
 
 
 @register.simple_tag
 def project_enrollments(project, semester):
     if semester and project:
-        return project.enrollments.filter(semester=semester).order_by(
-            "-is_project_lead"
+        return (
+            project.enrollments.filter(semester=semester)
+            .select_related("user")
+            .order_by("-is_project_lead")
         )
     return []
 
@@ -39,7 +44,7 @@ def is_mentor(user: User, semester=None):
 @register.simple_tag
 def user_enrollment(user, semester):
     if semester:
-        return user.enrollments.filter(semester=semester).first()
+        return get_check_context(user).get_enrollment(semester)
     return None
 
 
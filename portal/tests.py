@@ -1 +1,1239 @@
-# Create your tests here.
+"""Tests for the portal's derived data and bulk paths, plus query-count budget tests that render every
+named route in `portal.urls` for each persona.
+
+For the budgets, each route declares the most queries a single request may make (for any persona) in
+`ROUTE_QUERY_BUDGETS`. The test fails when a route goes over its budget or has no budget, and
+writes a JSON report of every measurement (queries, SQL time, and render time) to
+`$QUERY_BUDGET_REPORT` (default `query_budget_report.json`) so runs can be diffed across commits.
+"""
+
+import json
+import os
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+import redis
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Lower
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from portal import attendance_buffer, attendance_codes, imports, urls
+from portal.attendance import (
+    ATTENDED,
+    NEEDS_VERIFICATION,
+    NOT_ATTENDED,
+    SemesterAttendanceMatrix,
+    get_semester_attendance_matrix,
+    invalidate_semester_attendance_matrix,
+    update_semester_attendance_matrix_cells,
+)
+from portal.attendance_buffer import buffer_attendance, get_buffered_attendances
+from portal.attendance_codes import (
+    claim_attendance,
+    flush_buffered_attendances,
+    record_attendances,
+    remove_buffered_attendance,
+)
+from portal.cache import tagged_get_or_set
+from portal.checks import get_check_context
+from portal.contributions import (
+    COMMIT_SYNC_OVERLAP,
+    fetch_repository_activity,
+    get_week,
+    ingest_fetched_activity,
+)
+from portal.datasets import DatasetOptions, generate_dataset
+from portal.discord_sync import (
+    ADD_ROLE,
+    REMOVE_ROLE,
+    get_desired_member_state,
+    plan_member_operations,
+)
+from portal.exports import (
+    get_graded_meetings,
+    get_semester_gradebook,
+    iter_semester_submitty_rows,
+)
+from portal.imports import ImportRowResult, import_submitty_enrollments
+from portal.middleware import ActiveContext
+from portal.models import (
+    Enrollment,
+    Meeting,
+    MeetingAttendance,
+    Organization,
+    Project,
+    ProjectProposal,
+    ProjectRepository,
+    RepositoryActivity,
+    Semester,
+    SmallGroup,
+    StatusUpdate,
+    StatusUpdateSubmission,
+    User,
+)
+from portal.search import search
+from portal.services import discord, github
+from portal.views import KeysetPaginatedListView, encode_cursor
+
+PERSONAS = ("anonymous", "student", "mentor", "superuser")
+
+ROUTE_QUERY_BUDGETS = {
+    "index": 15,
+    "handbook": 3,
+    "profile": 3,
+    "impersonate": 5,
+    "discord_flow": 2,
+    "discord_flow_callback": 2,
+    "unlink_discord": 15,
+    "github_flow": 2,
+    "link_github_callback": 2,
+    "unlink_github": 18,
+    "users_index": 8,
+    "users_detail": 8,
+    "users_enroll": 3,
+    "export_semester_enrollments": 5,
+    "user_attendance": 8,
+    "projects_index": 12,
+    "project_lead_index": 5,
+    "new_project": 5,
+    "projects_detail": 14,
+    "modify_project_team": 6,
+    "projects_add_pitch": 6,
+    "projects_add_proposal": 6,
+    "meetings_index": 7,
+    "schedule_workshop": 6,
+    "submit_attendance": 3,
+    "verify_attendance": 3,
+    "semester_attendance": 9,
+    "export_semester_attendance": 9,
+    "meetings_detail": 15,
+    "export_meeting_attendance": 5,
+    "meetings_api": 6,
+    "mentor_applications": 8,
+    "mentors_apply": 5,
+    "small_groups_index": 11,
+    "small_groups_detail": 7,
+    "organizations_index": 4,
+    "discord_admin_index": 3,
+    "discord_admin_delete_channels": 3,
+    "discord_admin_sync": 3,
+    "discord_admin_sync_status": 3,
+    "import_enrollments": 4,
+    "export_semester_gradebook": 3,
+    "import_teams": 4,
+    "import_projects": 4,
+    "import_job_status": 3,
+}
+"""The most queries one request to each route may make, whichever persona makes it."""
+
+
+DATASET_OPTIONS = DatasetOptions(
+    semesters=3, users=300, projects=24, meetings_per_semester=12
+)
+"""Big enough that per-row queries stand out in query counts, small enough to generate quickly."""
+
+
+ROUTE_POST_DATA = {
+    "impersonate": lambda test: {"email": test.student.email},
+}
+"""Form data for routes that only respond to POST requests."""
+
+
+# Production caches in Redis, so cache reads and writes must not show up as SQL queries
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class QueryBudgetTests(TestCase):
+    report: list[dict] = []
+
+    @classmethod
+    def setUpTestData(cls):
+        dataset = generate_dataset(DATASET_OPTIONS)
+        cls.semester = dataset.semesters[0]
+        enrollments = Enrollment.objects.filter(semester=cls.semester).select_related(
+            "user", "project"
+        )
+        student_enrollment = enrollments.filter(
+            project__is_approved=True, is_project_lead=False, is_mentor=False
+        ).first()
+        cls.student = student_enrollment.user
+        cls.project = student_enrollment.project
+        cls.mentor = enrollments.filter(is_mentor=True).first().user
+        cls.superuser = User.objects.create_superuser(
+            "admin@rpi.edu", "password", is_approved=True, role=User.RPI
+        )
+        cls.meeting = Meeting.objects.filter(semester=cls.semester).first()
+        cls.small_group = SmallGroup.objects.filter(semester=cls.semester).first()
+
+    @classmethod
+    def tearDownClass(cls):
+        path = os.environ.get("QUERY_BUDGET_REPORT", "query_budget_report.json")
+        with open(path, "w") as report_file:
+            json.dump(
+                sorted(cls.report, key=lambda row: (row["route"], row["persona"])),
+                report_file,
+                indent=2,
+            )
+        super().tearDownClass()
+
+    def setUp(self):
+        # External services are out of scope; only the portal's own queries are measured
+        for patcher in (
+            mock.patch.object(
+                discord,
+                "get_guild_snapshot",
+                return_value=discord.GuildSnapshot([], [], [], timezone.now()),
+            ),
+            mock.patch.object(discord, "get_server_member", return_value=None),
+            mock.patch.object(discord, "get_user", return_value=None),
+            mock.patch("celery.app.task.Task.apply_async"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get_route_kwargs(self, pattern: URLPattern):
+        values = {
+            "pk": {
+                "users_detail": self.student.pk,
+                "users_enroll": self.student.pk,
+                "user_attendance": self.student.pk,
+                "meetings_detail": self.meeting.pk,
+                "export_meeting_attendance": self.meeting.pk,
+                "small_groups_detail": self.small_group.pk,
+            }.get(pattern.name),
+            "slug": self.project.slug,
+            "job_id": "missing",
+        }
+        return {name: values[name] for name in pattern.pattern.converters}
+
+    def measure(self, pattern: URLPattern, persona: str):
+        # Measure cold requests so results don't depend on the order routes run in. Sessions
+        # live in the cache too, so this has to happen before logging in.
+        cache.clear()
+        if persona != "anonymous":
+            self.client.force_login(getattr(self, persona))
+        else:
+            self.client.logout()
+
+        url = reverse(pattern.name, kwargs=self.get_route_kwargs(pattern))
+        query_string = f"?semester={self.semester.pk}"
+        get_post_data = ROUTE_POST_DATA.get(pattern.name)
+        # Roll back whatever the route changes (e.g. unlinking accounts) so every request
+        # sees the same dataset
+        with transaction.atomic():
+            started_at = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                if get_post_data:
+                    response = self.client.post(url + query_string, get_post_data(self))
+                else:
+                    response = self.client.get(url + query_string)
+                # Streamed exports only run their queries as they're consumed
+                if response.streaming:
+                    b"".join(response.streaming_content)
+            render_time = time.perf_counter() - started_at
+            transaction.set_rollback(True)
+
+        return {
+            "route": pattern.name,
+            "persona": persona,
+            "status": response.status_code,
+            "queries": len(queries),
+            "sql_time": round(sum(float(query["time"]) for query in queries), 4),
+            "render_time": round(render_time, 4),
+        }
+
+    def test_routes_within_query_budgets(self):
+        patterns = [pattern for pattern in urls.urlpatterns if pattern.name]
+        for pattern in patterns:
+            for persona in PERSONAS:
+                with self.subTest(route=pattern.name, persona=persona):
+                    result = self.measure(pattern, persona)
+                    self.report.append(result)
+
+                    self.assertIn(
+                        pattern.name, ROUTE_QUERY_BUDGETS, "Route has no query budget"
+                    )
+                    self.assertLessEqual(
+                        result["queries"],
+                        ROUTE_QUERY_BUDGETS[pattern.name],
+                        f"{pattern.name} as {persona} made {result['queries']} queries",
+                    )
+
+
+SMALL_DATASET_OPTIONS = DatasetOptions(
+    semesters=1, users=40, projects=4, meetings_per_semester=6
+)
+"""Enough rows to exercise the code paths below while keeping each test class fast."""
+
+
+def get_matrix_cells(matrix: SemesterAttendanceMatrix):
+    return {
+        user_id: (bytes(statuses), totals)
+        for user_id, statuses, totals in matrix.iter_rows()
+    }
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class SemesterAttendanceMatrixTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        dataset = generate_dataset(SMALL_DATASET_OPTIONS)
+        cls.semester = dataset.semesters[0]
+        cls.student = User.rpi.filter(enrollments__semester=cls.semester).first()
+        cls.meeting = Meeting.objects.create(
+            semester=cls.semester,
+            type=Meeting.SMALL_GROUP,
+            is_attendance_taken=True,
+            starts_at=timezone.now(),
+            ends_at=timezone.now(),
+        )
+        cls.mentor_meeting = Meeting.objects.create(
+            semester=cls.semester,
+            type=Meeting.MENTOR,
+            starts_at=timezone.now(),
+            ends_at=timezone.now(),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def assertMatchesRebuild(self, matrix: SemesterAttendanceMatrix):
+        self.assertEqual(
+            get_matrix_cells(matrix),
+            get_matrix_cells(SemesterAttendanceMatrix.build(self.semester.pk)),
+        )
+
+    def test_attendance_changes_update_cached_matrix(self):
+        get_semester_attendance_matrix(self.semester.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            attendance = MeetingAttendance.objects.create(
+                meeting=self.meeting, user=self.student, is_verified=False
+            )
+        with self.assertNumQueries(0):
+            matrix = get_semester_attendance_matrix(self.semester.pk)
+        self.assertEqual(
+            matrix.get_status(self.student.pk, self.meeting.pk), NEEDS_VERIFICATION
+        )
+        self.assertMatchesRebuild(matrix)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            attendance.is_verified = True
+            attendance.save()
+        matrix = get_semester_attendance_matrix(self.semester.pk)
+        self.assertEqual(matrix.get_status(self.student.pk, self.meeting.pk), ATTENDED)
+        self.assertMatchesRebuild(matrix)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            attendance.delete()
+        with self.assertNumQueries(0):
+            matrix = get_semester_attendance_matrix(self.semester.pk)
+        self.assertEqual(
+            matrix.get_status(self.student.pk, self.meeting.pk), NOT_ATTENDED
+        )
+        self.assertMatchesRebuild(matrix)
+
+    def test_attendance_at_other_meetings_keeps_cached_matrix(self):
+        get_semester_attendance_matrix(self.semester.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            MeetingAttendance.objects.create(
+                meeting=self.mentor_meeting, user=self.student
+            )
+        with self.assertNumQueries(0):
+            get_semester_attendance_matrix(self.semester.pk)
+
+    def test_outdated_update_leaves_matrix_to_rebuild(self):
+        get_semester_attendance_matrix(self.semester.pk)
+        # Another update bumped the version but hasn't stored its matrix yet
+        invalidate_semester_attendance_matrix(self.semester.pk)
+
+        MeetingAttendance.objects.create(meeting=self.meeting, user=self.student)
+        update_semester_attendance_matrix_cells(
+            self.semester.pk, [(self.student.pk, self.meeting.pk, ATTENDED)]
+        )
+
+        matrix = get_semester_attendance_matrix(self.semester.pk)
+        self.assertEqual(matrix.get_status(self.student.pk, self.meeting.pk), ATTENDED)
+        self.assertMatchesRebuild(matrix)
+
+    def test_new_meetings_rebuild_matrix(self):
+        get_semester_attendance_matrix(self.semester.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            meeting = Meeting.objects.create(
+                semester=self.semester,
+                type=Meeting.WORKSHOP,
+                is_attendance_taken=True,
+                starts_at=timezone.now(),
+                ends_at=timezone.now(),
+            )
+
+        matrix = get_semester_attendance_matrix(self.semester.pk)
+        self.assertIn(meeting.pk, matrix.meeting_columns)
+        self.assertMatchesRebuild(matrix)
+
+
+def submitty_row(email: str, first_name="", last_name="", credits=""):
+    return {
+        "First Name": first_name,
+        "Last Name": last_name,
+        "User ID": email.split("@")[0],
+        "Email": email,
+        "Secondary Email": "",
+        "Registration Section": credits,
+        "Rotation Section": "",
+        "Group": "",
+    }
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class SubmittyEnrollmentImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.semester = Semester.objects.create(
+            pk="202609",
+            name="Fall 2026",
+            start_date=timezone.now().date(),
+            end_date=timezone.now().date(),
+        )
+        cls.organization = Organization.objects.create(
+            name="Partner", email_domain="partner.com"
+        )
+        cls.existing = User.objects.create(
+            email="smithj@rpi.edu", first_name="", last_name="Smith"
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def import_rows(self, *rows):
+        with self.captureOnCommitCallbacks(execute=True):
+            return {
+                result.identifier: result
+                for result in import_submitty_enrollments(self.semester, rows)
+            }
+
+    def test_creates_users_with_email_defaults(self):
+        results = self.import_rows(
+            submitty_row("doej@RPI.edu", "Jane", "Doe", "4"),
+            submitty_row("ext@partner.com", "Ext", "Ernal"),
+        )
+
+        self.assertEqual(results["doej@rpi.edu"].status, ImportRowResult.CREATED)
+        student = User.objects.get(email="doej@rpi.edu")
+        self.assertEqual(
+            (student.role, student.rcs_id, student.is_approved),
+            (User.RPI, "doej", True),
+        )
+        self.assertEqual(student.enrollments.get(semester=self.semester).credits, 4)
+        external = User.objects.get(email="ext@partner.com")
+        self.assertEqual(external.organization, self.organization)
+        self.assertTrue(external.is_approved)
+
+    def get_cached_enrollment_count(self):
+        return tagged_get_or_set(
+            "enrollment_count", Enrollment.objects.count, ["enrollment"]
+        )
+
+    def test_refreshes_search_index_and_cache_tags(self):
+        self.assertEqual(self.get_cached_enrollment_count(), 0)
+
+        self.import_rows(
+            submitty_row("doej@rpi.edu", "Jane", "Doe"),
+            submitty_row("smithj@rpi.edu", "John", "Smith"),
+        )
+
+        self.assertEqual(self.get_cached_enrollment_count(), 2)
+        self.assertEqual(
+            list(search(User.objects.all(), "Jane Doe")),
+            [User.objects.get(email="doej@rpi.edu")],
+        )
+        # Names are only filled in where missing
+        self.assertEqual(list(search(User.objects.all(), "John")), [self.existing])
+
+    def test_skips_rows_resolving_to_the_same_user(self):
+        self.existing.rcs_id = "jsmith"
+        self.existing.save()
+
+        results = self.import_rows(
+            submitty_row("jsmith@rpi.edu", credits="4"),
+            submitty_row("SMITHJ@rpi.edu", credits="2"),
+        )
+
+        self.assertEqual(results["jsmith@rpi.edu"].status, ImportRowResult.CREATED)
+        self.assertEqual(results["smithj@rpi.edu"].status, ImportRowResult.SKIPPED)
+        self.assertEqual(results["smithj@rpi.edu"].message, "Duplicate of row 2.")
+        self.assertEqual(
+            self.existing.enrollments.get(semester=self.semester).credits, 4
+        )
+
+    def test_matches_existing_emails_case_insensitively(self):
+        # Stored with mixed case and no RCS ID to match on instead
+        external = User.objects.create(email="Ext.Ernal@partner.com")
+
+        results = self.import_rows(submitty_row("ext.ernal@PARTNER.com", "Ext"))
+
+        self.assertEqual(
+            results["ext.ernal@partner.com"].status, ImportRowResult.CREATED
+        )
+        self.assertEqual(User.objects.filter(email__iexact=external.email).count(), 1)
+        self.assertTrue(external.enrollments.filter(semester=self.semester).exists())
+
+    def test_updates_existing_enrollments(self):
+        self.import_rows(submitty_row("smithj@rpi.edu", credits="2"))
+        results = self.import_rows(submitty_row("smithj@rpi.edu", credits="4"))
+
+        self.assertEqual(results["smithj@rpi.edu"].status, ImportRowResult.UPDATED)
+        self.assertEqual(
+            self.existing.enrollments.get(semester=self.semester).credits, 4
+        )
+
+    def test_failed_job_reports_partially_applied_rows(self):
+        csv_text = (
+            "First Name,Last Name,User ID,Email\nJane,Doe,doej,doej@rpi.edu\n,,,bad\n"
+        )
+        job = imports.create_import_job("submitty_enrollments", self.semester, csv_text)
+        import_chunk = imports.IMPORT_JOB_KINDS["submitty_enrollments"]["importer"]
+
+        def fail_second_chunk(semester, rows, first_row_number):
+            if first_row_number > 2:
+                raise ValueError("Boom")
+            return import_chunk(semester, rows, first_row_number)
+
+        with (
+            mock.patch.object(imports, "IMPORT_JOB_CHUNK_SIZE", 1),
+            mock.patch.dict(
+                imports.IMPORT_JOB_KINDS["submitty_enrollments"],
+                importer=fail_second_chunk,
+            ),
+        ):
+            with self.assertLogs("portal.imports", "ERROR"):
+                imports.run_import_job(job["id"])
+
+        job = imports.get_import_job(job["id"])
+        self.assertEqual((job["status"], job["done"]), ("failed", 1))
+        self.assertIn("Stopped after importing 1 of 2 rows", job["error"])
+        self.assertTrue(User.objects.filter(email="doej@rpi.edu").exists())
+
+
+def discord_response(status_code=200, **headers):
+    response = mock.Mock(status_code=status_code, headers=headers)
+    response.json.return_value = {}
+    return response
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class DiscordClientRateLimitTests(TestCase):
+    path = "/channels/123456789012345678/messages"
+
+    def setUp(self):
+        cache.clear()
+        sleep_patcher = mock.patch.object(discord.time, "sleep")
+        self.sleep = sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+
+    def make_client(self, *responses):
+        client = discord.DiscordClient({})
+        client.session = mock.Mock()
+        client.session.request.side_effect = responses
+        return client
+
+    def test_waits_only_when_bucket_is_exhausted(self):
+        bucket_headers = {
+            "X-RateLimit-Bucket": "abc",
+            "X-RateLimit-Reset-After": "2",
+        }
+        client = self.make_client(
+            discord_response(**bucket_headers, **{"X-RateLimit-Remaining": "1"}),
+            discord_response(**bucket_headers, **{"X-RateLimit-Remaining": "0"}),
+            discord_response(**bucket_headers, **{"X-RateLimit-Remaining": "4"}),
+        )
+
+        client.request("POST", self.path)
+        client.request("POST", self.path)
+        self.sleep.assert_not_called()
+
+        client.request("POST", self.path)
+        self.sleep.assert_called_once()
+        self.assertAlmostEqual(self.sleep.call_args.args[0], 2, delta=0.5)
+
+    def test_bucket_state_is_shared_between_clients(self):
+        first = self.make_client(
+            discord_response(
+                **{
+                    "X-RateLimit-Bucket": "abc",
+                    "X-RateLimit-Remaining": "0",
+                    "X-RateLimit-Reset-After": "3",
+                }
+            )
+        )
+        # e.g. in a Celery worker instead of a web process
+        second = self.make_client(discord_response())
+
+        first.request("POST", self.path)
+        second.request("POST", self.path)
+
+        self.sleep.assert_called_once()
+        self.assertAlmostEqual(self.sleep.call_args.args[0], 3, delta=0.5)
+
+    def test_retries_after_429(self):
+        client = self.make_client(
+            discord_response(429, **{"Retry-After": "1.5"}),
+            discord_response(200),
+        )
+
+        response = client.request("GET", "/users/@me")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(client.session.request.call_count, 2)
+        self.sleep.assert_called_once_with(1.5)
+
+    def test_global_limit_delays_other_routes(self):
+        client = self.make_client(
+            discord_response(429, **{"Retry-After": "2", "X-RateLimit-Global": "true"}),
+            discord_response(200),
+            discord_response(200),
+        )
+
+        client.request("GET", "/users/@me")
+        client.request("GET", "/gateway")
+
+        self.assertEqual(self.sleep.call_count, 3)
+        self.assertAlmostEqual(self.sleep.call_args.args[0], 2, delta=0.5)
+
+
+@override_settings(DISCORD_VERIFIED_ROLE_ID="10", DISCORD_PROJECT_LEAD_ROLE_ID="20")
+class DiscordSyncPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        today = timezone.now().date()
+        cls.past_semester, cls.semester = (
+            Semester.objects.create(pk=pk, name=pk, start_date=today, end_date=today)
+            for pk in ("202501", "202509")
+        )
+        cls.old_project = Project.objects.create(
+            name="Old", slug="old", discord_role_id="100"
+        )
+        cls.project = Project.objects.create(
+            name="New", slug="new", discord_role_id="200"
+        )
+        cls.alumnus = User.objects.create(email="alum@rpi.edu", discord_user_id="1")
+        cls.student = User.objects.create(email="stud@rpi.edu", discord_user_id="2")
+        Enrollment.objects.create(
+            semester=cls.past_semester,
+            user=cls.alumnus,
+            project=cls.old_project,
+            is_project_lead=True,
+        )
+        Enrollment.objects.create(
+            semester=cls.past_semester, user=cls.student, project=cls.old_project
+        )
+        Enrollment.objects.create(
+            semester=cls.semester, user=cls.student, project=cls.project
+        )
+        # Still running this semester, led by someone without Discord
+        Enrollment.objects.create(
+            semester=cls.semester,
+            user=User.objects.create(email="lead@rpi.edu"),
+            project=cls.old_project,
+        )
+
+    def plan_role_operations(self, members: dict[str, list[str]]):
+        operations = plan_member_operations(
+            get_desired_member_state(self.semester, None),
+            [
+                {"user": {"id": member_id}, "roles": roles, "nick": None}
+                for member_id, roles in members.items()
+            ],
+        )
+        return {
+            (operation["type"], operation["member_id"], operation["role_id"])
+            for operation in operations
+            if operation["type"] in (ADD_ROLE, REMOVE_ROLE)
+        }
+
+    def test_only_enrolled_members_lose_semester_roles(self):
+        operations = self.plan_role_operations(
+            {"1": ["10", "100", "20"], "2": ["10", "100"]}
+        )
+
+        self.assertEqual(
+            operations, {(ADD_ROLE, "2", "200"), (REMOVE_ROLE, "2", "100")}
+        )
+
+
+class GitHubConcurrencyTests(TestCase):
+    def test_worker_clients_are_reused_between_calls(self):
+        with mock.patch.object(github, "GitHubClient") as client_class:
+            for _ in range(3):
+                github.map_concurrently(
+                    lambda client, item: item, list(range(16)), token="reuse-test"
+                )
+
+        # At most one client per pool thread, however many times it is used
+        self.assertLessEqual(
+            client_class.call_count, github.query_executor._max_workers
+        )
+
+
+class ContributionIngestionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.repository = ProjectRepository.objects.create(
+            project=Project.objects.create(name="Portal", slug="portal"),
+            url="https://github.com/rcos/portal",
+            commits_synced_until=timezone.now() - timedelta(days=1),
+        )
+        cls.user = User.objects.create(email="doej@rpi.edu")
+
+    def create_commit(self, key: str, author_login: str):
+        return RepositoryActivity.objects.create(
+            repository=self.repository,
+            type=RepositoryActivity.COMMIT,
+            key=key,
+            author_login=author_login,
+            occurred_at=timezone.now(),
+            week=get_week(timezone.now()),
+            url=f"https://github.com/rcos/portal/commit/{key}",
+            additions=3,
+        )
+
+    def test_linking_github_attributes_existing_activity(self):
+        commit = self.create_commit("abc", "JaneDev")
+
+        self.user.github_username = "janedev"
+        self.user.save()
+        commit.refresh_from_db()
+        self.assertEqual(commit.user, self.user)
+        self.assertEqual(
+            list(self.user.weekly_contributions.values_list("commits", "additions")),
+            [(1, 3)],
+        )
+
+        self.user.github_username = None
+        self.user.save()
+        commit.refresh_from_db()
+        self.assertIsNone(commit.user)
+        self.assertFalse(self.user.weekly_contributions.exists())
+
+    def test_truncated_commit_paging_resumes_below_fetched_commits(self):
+        synced_until = self.repository.commits_synced_until
+        since = (synced_until - COMMIT_SYNC_OVERLAP).isoformat()
+
+        def commit(oid: str, committed_at):
+            return {
+                "oid": oid,
+                "url": f"https://github.com/rcos/portal/commit/{oid}",
+                "committedDate": committed_at.isoformat(),
+                "messageHeadline": oid,
+                "additions": 1,
+                "deletions": 0,
+                "author": None,
+            }
+
+        def run(commits: list, complete: bool):
+            with (
+                mock.patch.object(
+                    github, "get_repository_commits", return_value=(commits, complete)
+                ) as get_repository_commits,
+                mock.patch.object(
+                    github, "get_repository_items_after", return_value=([], None)
+                ),
+            ):
+                fetched = fetch_repository_activity(
+                    mock.Mock(), self.repository, timezone.now()
+                )
+                ingest_fetched_activity(self.repository, fetched)
+            self.repository.refresh_from_db()
+            return fetched, get_repository_commits.call_args.args[2:]
+
+        newest = synced_until + timedelta(hours=12)
+        older = synced_until - timedelta(days=2)
+        first, bounds = run([commit("c", newest)], complete=False)
+        self.assertEqual(bounds, (since, None))
+        self.assertEqual(self.repository.commits_synced_until, synced_until)
+        self.assertEqual(self.repository.commits_backfill_until, newest)
+
+        _, bounds = run([commit("b", older)], complete=False)
+        self.assertEqual(bounds, (since, newest.isoformat()))
+        self.assertEqual(self.repository.commits_synced_until, synced_until)
+        self.assertEqual(self.repository.commits_backfill_until, older)
+
+        _, bounds = run([commit("a", older - timedelta(days=1))], complete=True)
+        self.assertEqual(bounds, (since, older.isoformat()))
+        # Newer commits were fetched by the first run, so the cursor skips up to it
+        self.assertEqual(self.repository.commits_synced_until, first.fetched_at)
+        self.assertIsNone(self.repository.commits_backfill_until)
+        self.assertIsNone(self.repository.commits_backfill_synced_until)
+        self.assertCountEqual(
+            self.repository.activity.values_list("key", flat=True), ["a", "b", "c"]
+        )
+
+        _, bounds = run([], complete=True)
+        self.assertEqual(
+            bounds, ((first.fetched_at - COMMIT_SYNC_OVERLAP).isoformat(), None)
+        )
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class ActiveSemesterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_caches_that_no_semester_is_active(self):
+        self.assertIsNone(Semester.get_active())
+        with self.assertNumQueries(0):
+            self.assertIsNone(Semester.get_active())
+
+    def test_creating_a_semester_replaces_the_cached_absence(self):
+        self.assertIsNone(Semester.get_active())
+        today = timezone.now().date()
+        semester = Semester.objects.create(
+            pk="202609", name="Fall 2026", start_date=today, end_date=today
+        )
+
+        self.assertEqual(Semester.get_active(), semester)
+        with self.assertNumQueries(0):
+            self.assertEqual(Semester.get_active(), semester)
+
+
+class ActiveContextTests(TestCase):
+    def test_clear_enrollment_forgets_memoized_enrollments(self):
+        today = timezone.now().date()
+        semester = Semester.objects.create(
+            pk="202609", name="Fall 2026", start_date=today, end_date=today
+        )
+        request = RequestFactory().get("/")
+        request.user = User.objects.create(email="doej@rpi.edu")
+        active = ActiveContext(request)
+        check_context = get_check_context(request.user)
+        self.assertIsNone(check_context.get_enrollment(semester))
+
+        enrollment = Enrollment.objects.create(semester=semester, user=request.user)
+        self.assertIsNone(check_context.get_enrollment(semester))
+        active.clear_enrollment()
+        self.assertEqual(check_context.get_enrollment(semester), enrollment)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class TaggedCacheTests(TestCase):
+    def test_logging_in_keeps_user_tags(self):
+        cache.clear()
+        user = User.objects.create(email="doej@rpi.edu", first_name="Jane")
+
+        def get_cached_name():
+            return tagged_get_or_set(
+                "first_name", lambda: User.objects.get(pk=user.pk).first_name, ["user"]
+            )
+
+        self.assertEqual(get_cached_name(), "Jane")
+        user.first_name = "Janet"
+        user.last_login = timezone.now()
+        user.save(update_fields=["last_login"])
+        self.assertEqual(get_cached_name(), "Jane")
+        user.save()
+        self.assertEqual(get_cached_name(), "Janet")
+
+
+class ProjectKeysetView(KeysetPaginatedListView):
+    keyset_ordering = (("name", Lower("name")), ("pk", F("pk")))
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Names that tie once lowercased, so pages have to seek on the pk as well
+        for slug, name in (
+            ("b1", "beta"),
+            ("a1", "Alpha"),
+            ("b2", "Beta"),
+            ("a2", "alpha"),
+            ("c1", "Gamma"),
+        ):
+            Project.objects.create(name=name, slug=slug, is_approved=True)
+        cls.expected = list(
+            Project.objects.order_by(Lower("name"), "pk").values_list("slug", flat=True)
+        )
+
+    def get_page(self, query_string: str = ""):
+        view = ProjectKeysetView()
+        view.setup(RequestFactory().get("/" + query_string))
+        return view.paginate_queryset(Project.objects.all(), 2)[1]
+
+    def test_pages_forward_and_backward_through_ties(self):
+        slugs: list[str] = []
+        page = self.get_page()
+        self.assertFalse(page.has_previous)
+        pages = [page]
+        while page.has_next:
+            page = self.get_page(page.next_url)
+            pages.append(page)
+        for page in pages:
+            slugs.extend(project.slug for project in page)
+        self.assertEqual(slugs, self.expected)
+
+        backward_pages = [page.object_list]
+        while page.has_previous:
+            page = self.get_page(page.previous_url)
+            backward_pages.insert(0, page.object_list)
+        self.assertEqual(
+            [[project.slug for project in rows] for rows in backward_pages],
+            [[project.slug for project in page] for page in pages],
+        )
+
+    def test_ignores_malformed_cursors(self):
+        first_page = [project.slug for project in self.get_page()]
+        for cursor in (
+            [None, None],
+            {"name": "alpha"},
+            ["alpha", "1"],
+            ["alpha", True],
+            [["alpha"], 1],
+            "alpha",
+        ):
+            with self.subTest(cursor=cursor):
+                page = self.get_page("?after=" + encode_cursor(cursor))
+                self.assertEqual([project.slug for project in page], first_page)
+        self.assertEqual(
+            [project.slug for project in self.get_page("?before=%%%")], first_page
+        )
+
+    def test_project_index_ignores_malformed_cursor(self):
+        response = self.client.get(
+            reverse("projects_index"), {"after": encode_cursor([None, None])}
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class AttendanceClaimTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        today = timezone.now().date()
+        cls.meeting = Meeting.objects.create(
+            semester=Semester.objects.create(
+                pk="202609", name="Fall 2026", start_date=today, end_date=today
+            ),
+            type=Meeting.SMALL_GROUP,
+            starts_at=timezone.now(),
+            ends_at=timezone.now(),
+        )
+        cls.user = User.objects.create(email="doej@rpi.edu")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_claims_each_attendance_once(self):
+        self.assertTrue(claim_attendance(self.meeting.pk, self.user.pk))
+        self.assertFalse(claim_attendance(self.meeting.pk, self.user.pk))
+
+    def test_rejects_attendance_stored_without_a_claim(self):
+        MeetingAttendance.objects.create(meeting=self.meeting, user=self.user)
+        cache.clear()
+
+        self.assertFalse(claim_attendance(self.meeting.pk, self.user.pk))
+
+
+@override_settings(
+    ATTENDANCE_WRITE_BEHIND=True,
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+)
+class AttendanceBufferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        today = timezone.now().date()
+        cls.meeting = Meeting.objects.create(
+            semester=Semester.objects.create(
+                pk="202609", name="Fall 2026", start_date=today, end_date=today
+            ),
+            type=Meeting.SMALL_GROUP,
+            starts_at=timezone.now(),
+            ends_at=timezone.now(),
+        )
+        cls.students = [
+            User.objects.create(email=f"student{index}@rpi.edu") for index in range(2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def use_redis(self):
+        client = attendance_buffer.get_client()
+        try:
+            client.ping()
+        except redis.ConnectionError:
+            self.skipTest("Redis is not available")
+
+        def clear_buffer():
+            client.delete(
+                attendance_buffer.STREAM_KEY,
+                attendance_buffer.FLUSH_LOCK_KEY,
+                attendance_buffer.pending_key(self.meeting.pk),
+            )
+
+        clear_buffer()
+        self.addCleanup(clear_buffer)
+
+    def flush(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return flush_buffered_attendances()
+
+    def test_flushes_buffered_attendances(self):
+        self.use_redis()
+        for student in self.students:
+            buffer_attendance(self.meeting.pk, student.pk, student == self.students[0])
+
+        self.assertEqual(self.flush(), 2)
+        self.assertEqual(
+            set(
+                self.meeting.meetingattendance_set.values_list("user_id", "is_verified")
+            ),
+            {(self.students[0].pk, True), (self.students[1].pk, False)},
+        )
+        self.assertEqual(get_buffered_attendances(self.meeting.pk), {})
+
+    def test_deletes_attendance_denied_while_flushing(self):
+        self.use_redis()
+        student, other = self.students
+        buffer_attendance(self.meeting.pk, student.pk, False)
+        buffer_attendance(self.meeting.pk, other.pk, False)
+
+        def deny_then_record(attendances, **kwargs):
+            # Denied after the flush read it, so there was no row to delete yet
+            self.assertTrue(remove_buffered_attendance(self.meeting.pk, student.pk))
+            MeetingAttendance.objects.filter(
+                meeting=self.meeting, user=student
+            ).delete()
+            record_attendances(attendances, **kwargs)
+
+        with mock.patch.object(
+            attendance_codes, "record_attendances", side_effect=deny_then_record
+        ):
+            self.assertEqual(self.flush(), 1)
+
+        self.assertEqual(
+            list(self.meeting.meetingattendance_set.values_list("user_id", flat=True)),
+            [other.pk],
+        )
+
+    @override_settings(ATTENDANCE_WRITE_BEHIND=False)
+    def test_flush_does_nothing_when_disabled(self):
+        with mock.patch.object(attendance_buffer, "get_client") as get_client:
+            self.assertEqual(flush_buffered_attendances(), 0)
+        get_client.assert_not_called()
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        today = timezone.now().date()
+        cls.semester = Semester.objects.create(
+            pk="202609", name="Fall 2026", start_date=today, end_date=today
+        )
+        cls.first, cls.external, cls.second, cls.third = (
+            User.objects.create(email=email, first_name=email[0])
+            for email in ("a@rpi.edu", "x@partner.com", "b@rpi.edu", "c@rpi.edu")
+        )
+        for user in (cls.first, cls.external, cls.second, cls.third):
+            Enrollment.objects.create(semester=cls.semester, user=user)
+
+        def create_meeting(type: str, days_ago: int, is_attendance_taken=True):
+            return Meeting.objects.create(
+                semester=cls.semester,
+                type=type,
+                is_attendance_taken=is_attendance_taken,
+                starts_at=timezone.now() - timedelta(days=days_ago),
+                ends_at=timezone.now() - timedelta(days=days_ago),
+            )
+
+        cls.small_group = create_meeting(Meeting.SMALL_GROUP, 3)
+        cls.large_group = create_meeting(Meeting.LARGE_GROUP, 2, False)
+        cls.workshop = create_meeting(Meeting.WORKSHOP, 1)
+        create_meeting(Meeting.SMALL_GROUP, -1)
+        create_meeting(Meeting.MENTOR, 1)
+
+        for meeting, user, is_verified in (
+            (cls.small_group, cls.first, True),
+            (cls.small_group, cls.external, True),
+            (cls.small_group, cls.second, False),
+            (cls.large_group, cls.second, True),
+            (cls.workshop, cls.second, True),
+        ):
+            MeetingAttendance.objects.create(
+                meeting=meeting, user=user, is_verified=is_verified
+            )
+
+    def test_submitty_rows_merge_students_with_verified_attendance(self):
+        meetings = get_graded_meetings(self.semester.pk)
+        self.assertEqual(
+            [meeting_id for meeting_id, _ in meetings],
+            [self.small_group.pk, self.large_group.pk, self.workshop.pk],
+        )
+
+        # Everyone gets the large group's grade since its attendance wasn't taken, and the
+        # external user isn't a student
+        self.assertEqual(
+            list(iter_semester_submitty_rows(self.semester.pk, meetings)),
+            [
+                ("a", "a", "", 1, 1, 0, 2),
+                ("b", "b", "", 0, 1, 1, 2),
+                ("c", "c", "", 0, 1, 0, 1),
+            ],
+        )
+
+    def test_gradebook_counts_only_taken_meetings_and_open_status_updates(self):
+        project = Project.objects.create(name="Portal", slug="portal")
+        Enrollment.objects.filter(user__in=[self.first, self.second]).update(
+            project=project
+        )
+        ProjectProposal.objects.create(
+            semester=self.semester,
+            project=project,
+            url="https://example.com/proposal",
+            grade=Decimal("9.5"),
+        )
+        opened, _ = (
+            StatusUpdate.objects.create(
+                semester=self.semester,
+                opens_at=timezone.now() + timedelta(days=days),
+                closes_at=timezone.now() + timedelta(days=days + 1),
+            )
+            for days in (-2, 2)
+        )
+        for user, grade in ((self.first, Decimal("0.5")), (self.second, None)):
+            StatusUpdateSubmission.objects.create(
+                user=user,
+                status_update=opened,
+                previous_week="",
+                next_week="",
+                blockers="",
+                grade=grade,
+            )
+
+        columns = (
+            "small_group_attended",
+            "small_group_total",
+            "large_group_attended",
+            "large_group_total",
+            "workshop_attended",
+            "workshop_total",
+            "status_updates_submitted",
+            "status_updates_total",
+            "status_update_grade",
+            "proposal_grade",
+        )
+        self.assertEqual(
+            list(
+                get_semester_gradebook(self.semester.pk).values_list(
+                    "user_id", *columns
+                )
+            ),
+            [
+                (self.first.pk, 1, 2, 0, 0, 0, 1, 1, 1, Decimal("0.5"), Decimal("9.5")),
+                (self.second.pk, 0, 2, 0, 0, 1, 1, 1, 1, None, Decimal("9.5")),
+                (self.third.pk, 0, 2, 0, 0, 0, 1, 0, 1, None, None),
+            ],
+        )
+
+
+class SmallGroupAttendanceCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        today = timezone.now().date()
+        semester = Semester.objects.create(
+            pk="202609", name="Fall 2026", start_date=today, end_date=today
+        )
+        first_project, second_project = (
+            Project.objects.create(name=slug, slug=slug) for slug in ("one", "two")
+        )
+        for name, projects in (
+            ("Group 1", [first_project]),
+            ("Group 2", [second_project]),
+            ("Group 3", []),
+        ):
+            SmallGroup.objects.create(semester=semester, name=name).projects.set(
+                projects
+            )
+
+        cls.students = {}
+        for email, project in (
+            ("verified@rpi.edu", first_project),
+            ("unverified@rpi.edu", first_project),
+            ("absent@rpi.edu", second_project),
+            ("unassigned@rpi.edu", None),
+            ("external@partner.com", first_project),
+        ):
+            user = User.objects.create(email=email)
+            Enrollment.objects.create(semester=semester, user=user, project=project)
+            cls.students[email.split("@")[0]] = user
+
+        cls.meeting = Meeting.objects.create(
+            semester=semester,
+            type=Meeting.LARGE_GROUP,
+            starts_at=timezone.now(),
+            ends_at=timezone.now(),
+        )
+        for name, is_verified in (
+            ("verified", True),
+            ("unverified", False),
+            ("unassigned", True),
+            ("external", True),
+        ):
+            MeetingAttendance.objects.create(
+                meeting=cls.meeting, user=cls.students[name], is_verified=is_verified
+            )
+
+    def test_counts_each_small_group_in_constant_queries(self):
+        with self.assertNumQueries(2):
+            counts = self.meeting.get_small_group_attendance_counts()
+
+        self.assertEqual(
+            counts,
+            {
+                "Group 1": {
+                    "expected": 2,
+                    "attended": 1,
+                    "needs_verification": 1,
+                    "attendance_ratio": 0.5,
+                },
+                "Group 2": {
+                    "expected": 1,
+                    "attended": 0,
+                    "needs_verification": 0,
+                    "attendance_ratio": 0,
+                },
+                "Group 3": {
+                    "expected": 0,
+                    "attended": 0,
+                    "needs_verification": 0,
+                    "attendance_ratio": 0,
+                },
+            },
+        )
+        self.assertEqual(
+            self.meeting.get_small_group_attendance_ratios(),
+            {"Group 1": 0.5, "Group 2": 0, "Group 3": 0},
+        )
@@ -1,11 +1,18 @@
 from django.urls import path
 
 from portal.views.admin import (
+    export_semester_gradebook,
     import_google_form_projects,
+    import_job_status,
     import_submitty_enrollments,
     import_submitty_teams,
 )
-from portal.views.discord import DiscordAdminIndex, delete_discord_channels
+from portal.views.discord import (
+    DiscordAdminIndex,
+    delete_discord_channels,
+    discord_sync_index,
+    discord_sync_status,
+)
 from portal.views.mentors import MentorApplicationView, mentor_applications_index
 from portal.views.organizations import organizations_index
 from portal.views.small_groups import SmallGroupIndexView, small_group_detail
@@ -25,10 +32,12 @@ from .views.meetings import (
     MeetingDetailView,
     SubmitAttendanceFormView,
     export_meeting_attendance,
+    export_semester_attendance,
     manually_add_or_verify_attendance,
     meetings_api,
     meetings_index,
     schedule_workshop,
+    semester_attendance,
     user_attendance,
 )
 from .views.projects import (
@@ -40,7 +49,12 @@ from .views.projects import (
     project_detail,
     project_lead_index,
 )
-from .views.users import UserIndexView, enroll_user, user_detail
+from .views.users import (
+    UserIndexView,
+    enroll_user,
+    export_semester_enrollments,
+    user_detail,
+)
 
 urlpatterns = [
     path("", IndexView.as_view(), name="index"),
@@ -60,6 +74,9 @@ urlpatterns = [
     path("auth/github/unlink", unlink_github, name="unlink_github"),
     # User Routes
     path("users/", UserIndexView.as_view(), name="users_index"),
+    path(
+        "users/export", export_semester_enrollments, name="export_semester_enrollments"
+    ),
     path("users/<int:pk>", user_detail, name="users_detail"),
     path("users/<int:pk>/enroll", enroll_user, name="users_enroll"),
     path("users/<int:pk>/attendance", user_attendance, name="user_attendance"),
@@ -92,6 +109,16 @@ urlpatterns = [
         manually_add_or_verify_attendance,
         name="verify_attendance",
     ),
+    path(
+        "meetings/attendance/semester",
+        semester_attendance,
+        name="semester_attendance",
+    ),
+    path(
+        "meetings/attendance/semester/export",
+        export_semester_attendance,
+        name="export_semester_attendance",
+    ),
     path("meetings/<int:pk>", MeetingDetailView.as_view(), name="meetings_detail"),
     path(
         "meetings/<int:pk>/export",
@@ -126,6 +153,12 @@ urlpatterns = [
         delete_discord_channels,
         name="discord_admin_delete_channels",
     ),
+    path("admin/discord/sync", discord_sync_index, name="discord_admin_sync"),
+    path(
+        "admin/discord/sync/<str:job_id>",
+        discord_sync_status,
+        name="discord_admin_sync_status",
+    ),
     # Admin Routes
     path(
         "admin/import/enrollments",
@@ -142,4 +175,14 @@ urlpatterns = [
         import_google_form_projects,
         name="import_projects",
     ),
+    path(
+        "admin/import/jobs/<str:job_id>",
+        import_job_status,
+        name="import_job_status",
+    ),
+    path(
+        "admin/export/gradebook",
+        export_semester_gradebook,
+        name="export_semester_gradebook",
+    ),
 ]
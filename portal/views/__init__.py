@@ -1,29 +1,48 @@
+import base64
+import binascii
+import json
+from collections import defaultdict
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Any
+
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.mixins import UserPassesTestMixin
-from django.contrib.postgres.search import SearchVector
-from django.core.cache import cache
+from django.db.models import (
+    Expression,
+    F,
+    Field,
+    FloatField,
+    IntegerField,
+    Q,
+    QuerySet,
+)
 from django.http import Http404, HttpRequest
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse
 from django.views.generic import DetailView, ListView
 
+from ..cache import tagged_get_or_set
 from ..models import Organization, Semester
+from ..search import search
+from ..semesters import get_semester_registry
 
 
-def load_semesters(request):
-    semesters = cache.get_or_set("semesters", Semester.objects.all(), 60 * 60 * 24)
-    active_semester = (
-        cache.get_or_set(
-            "active_semester",
-            next((semester for semester in semesters if semester.is_active), None),
-            60 * 60 * 24,
-        )
-        if semesters
-        else None
-    )
+def group_related_rows(rows: Iterable[Any], key: str) -> defaultdict[Any, list]:
+    """Groups rows (e.g. a queryset, evaluated once) by an attribute such as a foreign key ID,
+    so each object's related rows are a dictionary lookup instead of a scan over every row."""
+    groups = defaultdict(list)
+    for row in rows:
+        groups[getattr(row, key)].append(row)
+    return groups
 
-    return {"semesters": semesters, "active_semester": active_semester}
+
+def load_semesters(request):
+    return {
+        "semesters": get_semester_registry().semesters,
+        "active_semester": request.active.semester,
+    }
 
 def target_semester_context(request: HttpRequest, default_to_active_semester=False):
     target_semester = None
@@ -32,7 +51,7 @@ def target_semester_context(request: HttpRequest, default_to_active_semester=Fal
     if semester_id:
         target_semester = get_object_or_404(Semester, pk=semester_id)
     elif default_to_active_semester:
-        target_semester = Semester.get_active()
+        target_semester = request.active.semester
 
     return { "target_semester": target_semester } if target_semester else {}
 
@@ -87,7 +106,7 @@ class SemesterFilteredListView(ListView):
 
         if not self.target_semester and self.require_semester:
             # If not semester requested and one must be set, fetch active semester or 404
-            self.target_semester = Semester.get_active()
+            self.target_semester = self.request.active.semester
 
             if not self.target_semester:
                 self.target_semester = Semester.objects.latest("start_date")
@@ -145,7 +164,7 @@ class SearchableListView(ListView):
     """Render some list of objects, set by self.model or self.queryset. self.queryset can actually be any iterable of items, not just a queryset.
 
     If `search` query parameter is present AND valid:
-        - filters queryset by searching through columns `self.search_fields`
+        - filters queryset to objects whose search document (see `portal.search`) matches every word
 
     Example:
     -------
@@ -156,22 +175,16 @@ class SearchableListView(ListView):
 
         # Default to all approved projects
         queryset = Project.objects.filter(is_approved=True)
-        # If search is passed in URL, search that value on these fields
-        search_fields = ("name", "description", "owner__rcs_id)
     ```
     """
 
-    search_fields = tuple()
-
     def get_queryset(self):
         """Apply search."""
         queryset = super().get_queryset()
 
         self.search = self.request.GET.get("search")
         if self.search:
-            queryset = queryset.annotate(
-                search=SearchVector(*self.search_fields),
-            ).filter(search=self.search)
+            queryset = search(queryset, self.search)
 
         return queryset.distinct()
 
@@ -181,6 +194,170 @@ class SearchableListView(ListView):
         return data
 
 
+@dataclass
+class KeysetPage:
+    """A page of rows found by keyset pagination, with links to its neighbors."""
+
+    object_list: list
+    total_count: int
+    next_url: str | None
+    previous_url: str | None
+
+    @property
+    def has_next(self):
+        return self.next_url is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_url is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def encode_cursor(values: list[Any]):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Any:
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError):
+        return None
+
+
+def get_cursor_value_type(field: Field) -> type | tuple[type, ...]:
+    """The JSON type a keyset value of the field is encoded as in cursors."""
+    if isinstance(field, FloatField):
+        return (int, float)
+    if isinstance(field, IntegerField):
+        return int
+    return str
+
+
+class KeysetPaginatedListView(ListView):
+    """Render some list of objects a page at a time, seeking from the last row shown (`?after=`) or
+    the first row shown (`?before=`) instead of using OFFSET, so every page costs the same as the first.
+
+    Rows are ordered by `keyset_ordering`, which must end with a unique field. When the queryset was
+    searched with ranking (see `portal.search`), the best matches come first. The total count is
+    cached until anything in `count_cache_tags` changes.
+
+    Example:
+    -------
+    ```
+    class ProjectIndexView(KeysetPaginatedListView):
+        paginate_by = 25
+        keyset_ordering = (("name_key", Lower("name")), ("pk", F("pk")))
+        count_cache_tags = ("project", "enrollment")
+    ```
+    """
+
+    keyset_ordering: tuple[tuple[str, Expression], ...] = (("pk", F("pk")),)
+    """(name, expression) pairs the rows are ordered by ascending."""
+    count_cache_tags: tuple[str, ...] = ()
+
+    def get_keys(self, queryset: QuerySet) -> list[tuple[str, Expression, bool]]:
+        """The (alias, expression, is descending) keys the rows are ordered by."""
+        keys = [
+            (f"keyset_{name}", expression, False)
+            for name, expression in self.keyset_ordering
+        ]
+        if "search_rank" in queryset.query.annotations:
+            keys.insert(0, ("keyset_search_rank", F("search_rank"), True))
+        return keys
+
+    def get_total_count(self, queryset: QuerySet) -> int:
+        query_string = self.request.GET.copy()
+        query_string.pop("after", None)
+        query_string.pop("before", None)
+        return tagged_get_or_set(
+            f"{type(self).__name__}:count:{query_string.urlencode()}",
+            queryset.count,
+            self.count_cache_tags,
+            timeout=60 * 60,
+        )
+
+    def get_page_url(self, direction: str, row) -> str:
+        query_string = self.request.GET.copy()
+        query_string.pop("after", None)
+        query_string.pop("before", None)
+        query_string[direction] = encode_cursor(
+            [getattr(row, alias) for alias, _, _ in self.keys]
+        )
+        return "?" + query_string.urlencode()
+
+    def get_cursor(self, queryset: QuerySet, direction: str) -> list[Any] | None:
+        """Decodes the `?after=` or `?before=` cursor, ignoring any that `get_page_url` couldn't
+        have made (e.g. edited by hand) rather than letting them fail in the seek."""
+        cursor = decode_cursor(self.request.GET.get(direction, ""))
+        if not isinstance(cursor, list) or len(cursor) != len(self.keys):
+            return None
+        for value, (alias, _, _) in zip(cursor, self.keys):
+            expected = get_cursor_value_type(
+                queryset.query.annotations[alias].output_field
+            )
+            if isinstance(value, bool) or not isinstance(value, expected):
+                return None
+        return cursor
+
+    def paginate_queryset(self, queryset: QuerySet, page_size: int):
+        total_count = self.get_total_count(queryset)
+        self.keys = self.get_keys(queryset)
+        queryset = queryset.annotate(
+            **{alias: expression for alias, expression, _ in self.keys}
+        )
+
+        cursor = self.get_cursor(queryset, "after")
+        is_backward = False
+        if cursor is None:
+            cursor = self.get_cursor(queryset, "before")
+            is_backward = cursor is not None
+
+        if cursor is not None:
+            # Rows after the cursor: (a > x) OR (a = x AND b > y) OR ...
+            seek = Q(pk__in=[])
+            for index, (alias, _, is_descending) in enumerate(self.keys):
+                lookup = "lt" if is_descending != is_backward else "gt"
+                seek |= Q(
+                    **{
+                        earlier_alias: cursor[earlier_index]
+                        for earlier_index, (earlier_alias, _, _) in enumerate(
+                            self.keys[:index]
+                        )
+                    },
+                    **{f"{alias}__{lookup}": cursor[index]},
+                )
+            queryset = queryset.filter(seek)
+
+        queryset = queryset.order_by(
+            *(
+                "-" + alias if is_descending != is_backward else alias
+                for alias, _, is_descending in self.keys
+            )
+        )
+        rows = list(queryset[: page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if is_backward:
+            rows.reverse()
+
+        has_next = has_more if not is_backward else cursor is not None
+        has_previous = has_more if is_backward else cursor is not None
+        page = KeysetPage(
+            object_list=rows,
+            total_count=total_count,
+            next_url=self.get_page_url("after", rows[-1]) if rows and has_next else None,
+            previous_url=self.get_page_url("before", rows[0])
+            if rows and has_previous
+            else None,
+        )
+        return (None, page, rows, page.has_next or page.has_previous)
+
+
 class UserRequiresSetupMixin(UserPassesTestMixin):
     def test_func(self):
         if settings.DEBUG:
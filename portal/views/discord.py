@@ -2,13 +2,14 @@
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.http import HttpRequest, HttpResponse
-from django.shortcuts import redirect
+from django.core.cache import cache
+from django.http import Http404, HttpRequest, HttpResponse, JsonResponse
+from django.shortcuts import redirect, render
 from django.urls import reverse
 from django.utils.decorators import method_decorator
 from django.views.generic.base import TemplateView
 
-from portal import tasks
+from portal import discord_sync, tasks
 from portal.services import discord
 from portal.views.admin import is_admin
 
@@ -23,29 +24,23 @@ class DiscordAdminIndex(TemplateView):
     def get_context_data(self, **kwargs):
         data = super().get_context_data(**kwargs)
 
-        # Fetch all channels from server
-        channels = discord.get_server_channels()
+        if self.request.GET.get("refresh"):
+            discord.invalidate_guild_snapshot()
+        snapshot = discord.get_guild_snapshot()
 
         # Build hierarchy of channels in the following format:
         # (id, name): [child channels]
         categories = {}
-        for channel in [
-            c for c in channels if c["type"] == discord.CATEGORY_CHANNEL_TYPE
-        ]:
-            key = (channel["id"], channel["name"] if "name" in channel else "")
-            categories[key] = [
-                c
-                for c in channels
-                if "parent_id" in c and c["parent_id"] == channel["id"]
-            ]
+        for channel in snapshot.categories:
+            key = (channel["id"], channel.get("name", ""))
+            categories[key] = snapshot.channels_by_parent_id.get(channel["id"], [])
         categories[(None, "No category")] = [
             c
-            for c in channels
-            if "parent_id" not in c
-            or c["parent_id"] is None
-            and c["type"] != discord.CATEGORY_CHANNEL_TYPE
+            for c in snapshot.channels_by_parent_id.get(None, [])
+            if c["type"] != discord.CATEGORY_CHANNEL_TYPE
         ]
 
+        data["snapshot"] = snapshot
         data["categories"] = categories.items()
 
         return data
@@ -68,3 +63,34 @@ def delete_discord_channels(request: HttpRequest) -> HttpResponse:
         messages.success(request, "Deleting the Discord channels in the background...")
 
     return redirect(reverse("discord_admin_index"))
+
+
+@login_required
+@user_passes_test(is_admin)
+def discord_sync_index(request: HttpRequest) -> HttpResponse:
+    """Starts a full Discord sync for the active semester and shows the progress of the latest sync."""
+    if request.method == "POST":
+        semester = request.active.semester
+        if semester is None:
+            messages.error(request, "There is no active semester to sync.")
+        else:
+            job = discord_sync.create_discord_sync_job(semester)
+            tasks.run_discord_sync.delay(job["id"])
+            messages.success(request, "Syncing the Discord server in the background...")
+        return redirect(reverse("discord_admin_sync"))
+
+    job_id = request.GET.get("job") or cache.get(
+        discord_sync.LATEST_DISCORD_SYNC_JOB_CACHE_KEY
+    )
+    job = discord_sync.get_discord_sync_job(job_id) if job_id else None
+
+    return render(request, "portal/admin/discord/sync.html", {"job": job})
+
+
+@login_required
+@user_passes_test(is_admin)
+def discord_sync_status(request: HttpRequest, job_id: str) -> JsonResponse:
+    job = discord_sync.get_discord_sync_job(job_id)
+    if job is None:
+        raise Http404()
+    return JsonResponse(job)
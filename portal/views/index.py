@@ -1,13 +1,20 @@
-from django.core.cache import cache
 from django.db.models import Q
 from django.http import HttpRequest, HttpResponse
 from django.template.response import TemplateResponse
 from django.utils import timezone
 from django.views.generic.base import TemplateView
 
+from portal.cache import tagged_get_or_set
 from portal.checks import CheckUserCanCreateProject, CheckUserCanEnroll, CheckUserRPI
+from portal.contributions import get_week
 from portal.forms import SubmitAttendanceForm
-from portal.models import Enrollment, Meeting, Project
+from portal.models import (
+    Enrollment,
+    Meeting,
+    Project,
+    SmallGroup,
+    WeeklyContribution,
+)
 
 
 class IndexView(TemplateView):
@@ -18,7 +25,7 @@ class IndexView(TemplateView):
     def get_context_data(self, **kwargs):
         data = super().get_context_data(**kwargs)
 
-        active_semester = cache.get("active_semester")
+        active_semester = self.request.active.semester
         data["next_meeting"] = (
             Meeting.get_user_queryset(self.request.user)
             .filter(ends_at__gte=timezone.now())
@@ -36,11 +43,7 @@ class IndexView(TemplateView):
                 self.request.user, active_semester
             )
 
-            data["enrollment"] = (
-                self.request.user.enrollments.filter(semester=active_semester).first()
-                if active_semester is not None
-                else None
-            )
+            data["enrollment"] = self.request.active.enrollment
             data["project_team_enrollments"] = (
                 data["enrollment"]
                 .project.enrollments.filter(semester=active_semester)
@@ -49,25 +52,49 @@ class IndexView(TemplateView):
                 if data["enrollment"] and data["enrollment"].project
                 else []
             )
+            data["small_group"] = (
+                SmallGroup.objects.filter(
+                    memberships__semester=active_semester,
+                    memberships__user=self.request.user,
+                )
+                .prefetch_related("mentors")
+                .first()
+                if data["enrollment"]
+                else None
+            )
+            data["project_pitches"] = (
+                active_semester.project_pitches.select_related("project")
+                .prefetch_related("project__tags")
+                if active_semester
+                else []
+            )
+            data["week_contribution"] = WeeklyContribution.objects.filter(
+                user=self.request.user, week=get_week(timezone.now())
+            ).first()
         else:
             data["submit_attendance_form"] = SubmitAttendanceForm()
 
             # Fetch and cache ongoing meeting and stats for the splash page
-            # We cache it since it doesn't matter if it's slightly outdated
+            # They are invalidated whenever enrollments or projects change
             data["ongoing_meeting"] = None
-            data["enrollment_count"] = cache.get_or_set(
-                "enrollment_count", Enrollment.objects.count(), 60 * 60 * 24
+            data["enrollment_count"] = tagged_get_or_set(
+                "enrollment_count", Enrollment.objects.count, ["enrollment"]
             )
-            data["project_count"] = cache.get_or_set(
-                "project_count", Project.objects.count(), 60 * 60 * 24
+            data["project_count"] = tagged_get_or_set(
+                "project_count", Project.objects.count, ["project"]
             )
-            data["active_semester_admins"] = cache.get_or_set(
-                "active_semester_admins",
-                Enrollment.objects.filter(
-                    Q(is_faculty_advisor=True) | Q(is_coordinator=True),
-                    semester=active_semester,
+            data["active_semester_admins"] = tagged_get_or_set(
+                f"active_semester_admins:{active_semester.pk if active_semester else None}",
+                lambda: list(
+                    Enrollment.objects.filter(
+                        Q(is_faculty_advisor=True) | Q(is_coordinator=True),
+                        semester=active_semester,
+                    ).select_related("user")
                 ),
-                60 * 60 * 24,
+                [
+                    f"enrollment:semester:{active_semester.pk if active_semester else None}",
+                    "user",
+                ],
             )
 
         return data
@@ -1,4 +1,3 @@
-import csv
 from datetime import datetime
 import logging
 import random
@@ -6,6 +5,7 @@ import re
 import string
 from typing import Any, cast
 
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.mixins import LoginRequiredMixin
@@ -27,9 +27,37 @@ from django.views.generic import DetailView
 from django.views.generic.edit import FormView
 from sentry_sdk import capture_exception, capture_message
 
+from portal import tasks
+from portal.attendance import (
+    ATTENDED,
+    NEEDS_VERIFICATION,
+    NOT_ATTENDED,
+    get_semester_attendance_matrix,
+)
+from portal.attendance_buffer import (
+    buffer_attendance,
+    get_buffered_attendance,
+)
+from portal.attendance_codes import (
+    claim_attendance,
+    ensure_enrolled,
+    get_attendance_code,
+    record_attendances,
+    release_attendance,
+    remove_buffered_attendance,
+)
+from portal.cache import tagged_get_or_set
 from portal.checks import CheckUserCanScheduleWorkshop
+from portal.exports import (
+    AttendanceExportRow,
+    get_graded_meetings,
+    iter_meeting_attendance_rows,
+    iter_semester_attendance_rows,
+    iter_semester_submitty_rows,
+    streaming_csv_response,
+)
 from portal.forms import SubmitAttendanceForm, WorkshopCreateForm
-from portal.views import UserRequiresSetupMixin
+from portal.views import UserRequiresSetupMixin, target_semester_context
 from portal.views.admin import is_admin
 
 from ..models import (
@@ -68,7 +96,7 @@ def meeting_to_event(meeting: Meeting) -> dict[str, Any]:
 
 def meetings_index(request: HttpRequest) -> HttpResponse:
     now = timezone.now()
-    active_semester = Semester.get_active()
+    active_semester = request.active.semester
 
     return TemplateResponse(request, "portal/meetings/index.html", {
         "ongoing_meetings":  Meeting.get_user_queryset(request.user)
@@ -80,7 +108,7 @@ def meetings_index(request: HttpRequest) -> HttpResponse:
             .filter(starts_at__gte=now)
             .order_by("starts_at")
             .select_related()[:3],
-        "is_enrolled": bool(request.user.enrollments.filter(semester=active_semester).first()) if request.user.is_authenticated else False,
+        "is_enrolled": request.active.enrollment is not None,
         "can_schedule_workshops_check": CheckUserCanScheduleWorkshop().check(request.user, active_semester)
     })
 
@@ -126,7 +154,19 @@ class MeetingDetailView(DetailView):
                     meeting=self.object, user=self.request.user
                 )
             except MeetingAttendance.DoesNotExist:
-                data["user_attendance"] = None
+                # Show a submission still waiting in the write-behind buffer as if it were inserted
+                is_verified = get_buffered_attendance(
+                    self.object.pk, self.request.user.pk
+                )
+                data["user_attendance"] = (
+                    None
+                    if is_verified is None
+                    else MeetingAttendance(
+                        meeting=self.object,
+                        user=self.request.user,
+                        is_verified=is_verified,
+                    )
+                )
 
             data["submit_attendance_form"] = SubmitAttendanceForm()
         else:
@@ -134,10 +174,14 @@ class MeetingDetailView(DetailView):
 
         data["can_manage_attendance"] = False
 
-        can_manage_attendance = cache.get_or_set(
+        can_manage_attendance = tagged_get_or_set(
             f"can_manage_attendance:{self.object.pk}:{self.request.user.pk}",
-            default=self.can_manage_attendance,
-            timeout=60 * 60 * 24,
+            self.can_manage_attendance,
+            [
+                f"meeting:{self.object.pk}",
+                f"user:{self.request.user.pk}",
+                f"enrollment:user:{self.request.user.pk}",
+            ],
         )
 
         if can_manage_attendance:
@@ -182,10 +226,11 @@ class MeetingDetailView(DetailView):
                 return code
 
             if self.object.is_ongoing:
-                code = cache.get_or_set(
+                code = tagged_get_or_set(
                     f"attendance_codes:{self.object.pk}:{small_group.pk if small_group else 'none'}",
-                    default=get_or_create_attendance_code,
-                    timeout=60 * 30,
+                    get_or_create_attendance_code,
+                    [f"meeting_attendance_code:meeting:{self.object.pk}"],
+                    timeout=60 * 60 * 24,
                 )
             else:
                 code = None
@@ -193,10 +238,15 @@ class MeetingDetailView(DetailView):
             data["code"] = code
 
             if self.request.user.is_superuser:
-                data["small_group_attendance_ratios"] = cache.get_or_set(
+                data["small_group_attendance_ratios"] = tagged_get_or_set(
                     f"small_group_attendance_ratios:{self.object.pk}",
                     self.object.get_small_group_attendance_ratios,
-                    60 * 30,
+                    [
+                        f"meeting:{self.object.pk}",
+                        f"meeting_attendance:meeting:{self.object.pk}",
+                        f"enrollment:semester:{self.object.semester_id}",
+                        "small_group",
+                    ],
                 )
 
             data = {
@@ -218,85 +268,101 @@ def meetings_api(request: HttpRequest) -> HttpResponse:
     return JsonResponse(events, safe=False)
 
 
+def schedule_attendance_buffer_flush():
+    """Schedules a flush of the write-behind attendance buffer unless one is already scheduled, so a
+    burst of submissions is inserted in a few batches rather than a task each."""
+    if cache.add(
+        "attendance_buffer_flush_scheduled", True, settings.ATTENDANCE_BUFFER_FLUSH_DELAY
+    ):
+        tasks.flush_attendance_buffer.apply_async(
+            countdown=settings.ATTENDANCE_BUFFER_FLUSH_DELAY
+        )
+
+
 class SubmitAttendanceFormView(LoginRequiredMixin, UserRequiresSetupMixin, FormView):
     template_name = "portal/meetings/attendance/submit.html"
     form_class = SubmitAttendanceForm
     success_url = "/meetings"
 
     def form_valid(self, form: SubmitAttendanceForm):
-        code = form.cleaned_data["code"]
         user = self.request.user
 
-        # Search for attendance code
-        try:
-            meeting_attendance_code = MeetingAttendanceCode.objects.select_related(
-                "meeting", "small_group"
-            ).get(pk__iexact=code)
-        except MeetingAttendanceCode.DoesNotExist:
+        # Everything up to the insert is answered from the cache, since the whole class
+        # submits within the first minute or two of a meeting
+        attendance_code = get_attendance_code(form.cleaned_data["code"])
+        if attendance_code is None:
             messages.error(
                 self.request,
                 "Attendance code not recognized. Your attendance was not recorded.",
             )
             return super().form_valid(form)
 
-        user.enrollments.get_or_create(
-            semester_id=meeting_attendance_code.meeting.semester_id
-        )
-
-        if meeting_attendance_code.is_valid:
-            # Confirm user is in small group if it is for a small group
-            if (
-                meeting_attendance_code.small_group
-                and not meeting_attendance_code.small_group.has_user(user)
-            ):
-                messages.warning(
-                    self.request,
-                    "That is not your Small Group's attendance code... Nice try. If we're wrong about this, let your Mentor know immediately!",
-                )
-                capture_message(
-                    f"User {self.request.user} submitted attendance code {meeting_attendance_code} for meeting {meeting_attendance_code.meeting} from wrong Small Group"
-                )
-                return redirect(reverse("submit_attendance"))
+        ensure_enrolled(user, attendance_code.semester_id)
 
-            new_attendance = MeetingAttendance(
-                meeting=meeting_attendance_code.meeting,
-                user=user,
-                is_verified=random.random()
-                > meeting_attendance_code.meeting.attendance_chance_verification_required,
+        if not attendance_code.is_valid:
+            messages.error(
+                self.request,
+                "That attendance code is not currently valid. Your attendance was not recorded.",
             )
+            return redirect(attendance_code.meeting_url)
 
-            # If the user has previously failed verification, require verification
-            # until they get explicitly verified.
-            # This cache key is cleared when a Mentor verifies them.
-            if cache.has_key(f"failed-verification:{user.pk}"):
-                new_attendance.is_verified = False
+        # Confirm user is in small group if it is for a small group
+        if not attendance_code.allows(user.pk):
+            messages.warning(
+                self.request,
+                "That is not your Small Group's attendance code... Nice try. If we're wrong about this, let your Mentor know immediately!",
+            )
+            capture_message(
+                f"User {self.request.user} submitted attendance code {attendance_code.code} for meeting {attendance_code.meeting_name} from wrong Small Group"
+            )
+            return redirect(reverse("submit_attendance"))
 
-            try:
-                new_attendance.save()
-            except IntegrityError:
-                messages.warning(
-                    self.request,
-                    "You've already submitted attendance for this meeting!",
-                )
-                return redirect(reverse("submit_attendance"))
+        if not claim_attendance(attendance_code.meeting_id, user.pk):
+            messages.warning(
+                self.request,
+                "You've already submitted attendance for this meeting!",
+            )
+            return redirect(reverse("submit_attendance"))
+
+        # If the user has previously failed verification, require verification
+        # until they get explicitly verified.
+        # This cache key is cleared when a Mentor verifies them.
+        is_verified = (
+            random.random() > attendance_code.verification_chance
+            and not cache.has_key(f"failed-verification:{user.pk}")
+        )
 
-            if new_attendance.is_verified:
-                messages.success(
-                    self.request,
-                    f"Your attendance at {meeting_attendance_code.meeting} has been recorded!",
-                )
+        try:
+            if settings.ATTENDANCE_WRITE_BEHIND:
+                buffer_attendance(attendance_code.meeting_id, user.pk, is_verified)
+                schedule_attendance_buffer_flush()
             else:
-                messages.warning(
-                    self.request,
-                    f"VERIFICATION REQUIRED! Contact your Small Group Mentor to verify your attendance at {meeting_attendance_code.meeting}.",
+                record_attendances(
+                    [
+                        MeetingAttendance(
+                            meeting_id=attendance_code.meeting_id,
+                            user=user,
+                            is_verified=is_verified,
+                        )
+                    ]
                 )
+        except Exception:
+            # Let them try again rather than being told they already submitted
+            release_attendance(attendance_code.meeting_id, user.pk)
+            raise
+
+        if is_verified:
+            messages.success(
+                self.request,
+                f"Your attendance at {attendance_code.meeting_name} has been recorded!",
+            )
         else:
-            messages.error(
+            messages.warning(
                 self.request,
-                "That attendance code is not currently valid. Your attendance was not recorded.",
+                f"VERIFICATION REQUIRED! Contact your Small Group Mentor to verify your attendance at {attendance_code.meeting_name}.",
             )
 
-        return redirect(meeting_attendance_code.meeting.get_absolute_url())
+        return redirect(attendance_code.meeting_url)
 
 
 @login_required
@@ -368,6 +434,14 @@ def manually_add_or_verify_attendance(request: HttpRequest) -> HttpResponse:
             user.enrollments.get_or_create(semester_id=meeting.semester_id)
 
             if action == "accept":
+                # A submission still waiting in the write-behind buffer is inserted now, verified,
+                # and the flush skips it later. Discarding it instead would make a flush that
+                # already read it delete the row again
+                if get_buffered_attendance(meeting.pk, user.pk) is not None:
+                    record_attendances(
+                        [MeetingAttendance(meeting=meeting, user=user, is_verified=True)]
+                    )
+
                 try:
                     attendance = MeetingAttendance.objects.get(
                         user=user, meeting=meeting
@@ -398,9 +472,11 @@ def manually_add_or_verify_attendance(request: HttpRequest) -> HttpResponse:
                 cache.set(
                     f"failed-verification:{user.pk}", 1, 60 * 60 * 24 * 30 * 3
                 )  # 3 months
+                remove_buffered_attendance(meeting.pk, user.pk)
                 MeetingAttendance.objects.filter(user=user, meeting=meeting).delete()
                 messages.success(request, f"Denied attendance verification for {user}!")
             elif action == "delete":
+                remove_buffered_attendance(meeting.pk, user.pk)
                 MeetingAttendance.objects.filter(user=user, meeting=meeting).delete()
                 messages.success(request, f"Removed attendance for {user}!")
 
@@ -429,9 +505,12 @@ def user_attendance(request: HttpRequest, pk: Any) -> HttpResponse:
 
     # Fetch target user's meeting attendance along with the meetings they *should* be attending
     user_expected_meetings = target_user.get_expected_meetings(target_semester)
-    user_attendances = MeetingAttendance.objects.filter(
-        user=target_user, meeting__in=user_expected_meetings
-    )
+    user_attendances_by_meeting = {
+        attendance.meeting_id: attendance
+        for attendance in MeetingAttendance.objects.filter(
+            user=target_user, meeting__in=user_expected_meetings
+        )
+    }
 
     # Counts
     group_meetings_total = 0
@@ -445,9 +524,7 @@ def user_attendance(request: HttpRequest, pk: Any) -> HttpResponse:
         meeting: Meeting
         row = {
             "meeting": meeting,
-            "attendance": next(
-                (ua for ua in user_attendances if ua.meeting_id == meeting.pk), None
-            ),
+            "attendance": user_attendances_by_meeting.get(meeting.pk),
         }
 
         # Increment counts
@@ -486,34 +563,135 @@ def user_attendance(request: HttpRequest, pk: Any) -> HttpResponse:
     )
 
 
+def get_semester_attendance_rows(semester: Semester):
+    """Joins the semester's attendance matrix with the students and meetings it refers to."""
+    matrix = get_semester_attendance_matrix(semester.pk)
+    users_by_id = User.objects.in_bulk(matrix.user_ids)
+    meetings_by_id = Meeting.objects.in_bulk([meeting[0] for meeting in matrix.meetings])
+
+    meetings = [meetings_by_id[meeting[0]] for meeting in matrix.meetings]
+    rows = [
+        {"user": users_by_id[user_id], "statuses": statuses, **totals}
+        for user_id, statuses, totals in matrix.iter_rows()
+    ]
+    return meetings, rows
+
+
 @login_required
 @user_passes_test(is_admin)
-def export_meeting_attendance(request: HttpRequest, pk: Any) -> HttpResponse:
-    meeting = get_object_or_404(Meeting, pk=pk)
+def semester_attendance(request: HttpRequest) -> HttpResponse:
+    """Renders every student's attendance at every expected meeting of a semester."""
+    context = target_semester_context(request, default_to_active_semester=True)
+    if "target_semester" not in context:
+        messages.error(request, "No such semester found.")
+        return redirect(reverse("meetings_index"))
+
+    context["meetings"], context["rows"] = get_semester_attendance_rows(
+        context["target_semester"]
+    )
+    return TemplateResponse(
+        request, "portal/meetings/attendance/semester.html", context
+    )
 
-    filename = "RCOS " + str(meeting) + " Attendance"
 
-    # Set the appropriate response headers so the browser expects a CSV file download
-    response = HttpResponse(
-        content_type="text/csv",
-        headers={"Content-Disposition": f'attachment; filename="{filename}.csv"'},
+@login_required
+@user_passes_test(is_admin)
+def export_semester_attendance(request: HttpRequest) -> HttpResponse:
+    """Exports every student's attendance totals and per-meeting statuses for a semester as CSV or JSON,
+    or their attendance grades in Submitty's format. CSVs are streamed."""
+    context = target_semester_context(request, default_to_active_semester=True)
+    if "target_semester" not in context:
+        messages.error(request, "No such semester found.")
+        return redirect(reverse("meetings_index"))
+
+    semester: Semester = context["target_semester"]
+    export_format = request.GET.get("format")
+    status_names = {
+        NOT_ATTENDED: "not attended",
+        NEEDS_VERIFICATION: "needs verification",
+        ATTENDED: "attended",
+    }
+    total_keys = (
+        "group_meetings_attended",
+        "group_meetings_total",
+        "workshops_attended",
+        "workshops_total",
     )
 
-    # Create a CSV writer that writes to the response
-    writer = csv.writer(response)
+    if export_format == "submitty":
+        meetings = get_graded_meetings(semester.pk)
+        return streaming_csv_response(
+            f"RCOS {semester} Attendance Grades",
+            [
+                "user id",
+                "given name",
+                "family name",
+                *(f"grade{number}" for number in range(1, len(meetings) + 1)),
+                "totalgrade",
+            ],
+            iter_semester_submitty_rows(semester.pk, meetings),
+        )
+
+    if export_format == "json":
+        meetings, rows = get_semester_attendance_rows(semester)
+        return JsonResponse(
+            {
+                "semester": semester.pk,
+                "meetings": [
+                    {"id": meeting.pk, "name": str(meeting), "type": meeting.type}
+                    for meeting in meetings
+                ],
+                "students": [
+                    {
+                        "user_id": row["user"].pk,
+                        "rcs_id": row["user"].rcs_id,
+                        **{key: row[key] for key in total_keys},
+                        "attendance": {
+                            meeting.pk: status_names[status]
+                            for meeting, status in zip(meetings, row["statuses"])
+                        },
+                    }
+                    for row in rows
+                ],
+            }
+        )
 
-    # Write the headers
-    writer.writerow(["user id", "given name", "family name", "grade1", "totalgrade"])
+    matrix = get_semester_attendance_matrix(semester.pk)
+    meetings_by_id = Meeting.objects.in_bulk([meeting[0] for meeting in matrix.meetings])
+    return streaming_csv_response(
+        f"RCOS {semester} Attendance",
+        [
+            "rcs id",
+            "given name",
+            "family name",
+            *total_keys,
+            *(str(meetings_by_id[meeting[0]]) for meeting in matrix.meetings),
+        ],
+        (
+            (
+                *student,
+                *(totals[key] for key in total_keys),
+                *(status_names[status] for status in statuses),
+            )
+            for student, statuses, totals in iter_semester_attendance_rows(matrix)
+        ),
+    )
 
-    # Iterate through every **verified** attendance and write a CSV row
-    for user in meeting.attendances.filter(meetingattendance__is_verified=True):
-        writer.writerow([user.rcs_id, user.first_name, user.last_name, 1, 1])
 
-    return response
+@login_required
+@user_passes_test(is_admin)
+def export_meeting_attendance(request: HttpRequest, pk: Any) -> HttpResponse:
+    """Streams the meeting's verified attendees as a CSV in Submitty's grade format."""
+    meeting = get_object_or_404(Meeting, pk=pk)
+    return streaming_csv_response(
+        f"RCOS {meeting} Attendance",
+        AttendanceExportRow.__annotations__.keys(),
+        iter_meeting_attendance_rows(meeting.pk),
+    )
 
 @login_required
 def schedule_workshop(request: HttpRequest) -> HttpResponse:
-    active_semester = Semester.get_active()
+    active_semester = request.active.semester
 
     # Check that user can create meetings
     check = CheckUserCanScheduleWorkshop().check(request.user, active_semester)
@@ -46,7 +46,7 @@ class MentorApplicationView(
     success_url = reverse_lazy("users_index")
 
     def get(self, request, *args, **kwargs):
-        active_semester = Semester.get_active()
+        active_semester = self.request.active.semester
 
         check = CheckUserCanApplyAsMentor().check(self.request.user, active_semester)
         if not check.passed:
@@ -60,7 +60,7 @@ class MentorApplicationView(
         return super().get(request, *args, **kwargs)
 
     def form_valid(self, form):
-        active_semester = Semester.get_active()
+        active_semester = self.request.active.semester
         check = CheckUserCanApplyAsMentor().check(self.request.user, active_semester)
         if not check.passed:
             messages.error(
@@ -1,4 +1,5 @@
 """Views related to external organizations."""
+from django.db.models import Count
 from django.http import HttpRequest, HttpResponse
 from django.template.response import TemplateResponse
 from django.shortcuts import get_object_or_404
@@ -8,5 +9,8 @@ from ..models import Organization
 def organizations_index(request: HttpRequest) -> HttpResponse:
     """Renders a list of the organizations that have users and projects in RCOS."""
     return TemplateResponse(request, "portal/organizations/index.html", {
-        "organizations": Organization.objects.all()
+        "organizations": Organization.objects.annotate(
+            project_count=Count("projects", distinct=True),
+            user_count=Count("users", distinct=True),
+        )
     })
\ No newline at end of file
@@ -1,12 +1,13 @@
 """Views related to projects."""
+from collections import defaultdict
 from typing import Any
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.messages.views import SuccessMessageMixin
-from django.core.cache import cache
-from django.core.paginator import EmptyPage, InvalidPage, PageNotAnInteger, Paginator
+from django.db.models import F
+from django.db.models.functions import Lower
 from django.http import (
     HttpRequest,
     HttpResponse,
@@ -17,15 +18,15 @@ from django.shortcuts import get_object_or_404, redirect
 from django.template.response import TemplateResponse
 from django.urls import reverse
 from django.views.generic.edit import CreateView
-from gql.transport.exceptions import TransportServerError
 
+from portal import tasks
 from portal.checks import (
     CheckUserCanCreateProject,
     CheckUserCanPitchProject,
     CheckUserCanSubmitProjectProposal,
 )
 from portal.forms import ProjectCreateForm
-from portal.services import github
+from portal.semesters import get_semester_registry
 
 from ..models import (
     Enrollment,
@@ -37,10 +38,12 @@ from ..models import (
     User,
 )
 from . import (
+    KeysetPaginatedListView,
     OrganizationFilteredListView,
     SearchableListView,
     SemesterFilteredListView,
     UserRequiresSetupMixin,
+    group_related_rows,
     target_semester_context,
 )
 
@@ -50,7 +53,7 @@ def project_lead_index(request: HttpRequest) -> HttpResponse:
     """Shows users options to either start a new project or continue an owned project."""
 
     check = CheckUserCanCreateProject().check(
-        request.user, semester=cache.get("active_semester")
+        request.user, semester=request.active.semester
     )
 
     if not check.passed:
@@ -64,27 +67,24 @@ def project_lead_index(request: HttpRequest) -> HttpResponse:
 
 
 class ProjectIndexView(
-    SearchableListView, OrganizationFilteredListView, SemesterFilteredListView
+    KeysetPaginatedListView,
+    SearchableListView,
+    OrganizationFilteredListView,
+    SemesterFilteredListView,
 ):
     template_name = "portal/projects/index.html"
     context_object_name = "projects"
     paginate_by = 25
+    keyset_ordering = (("name", Lower("name")), ("pk", F("pk")))
+    count_cache_tags = ("project", "enrollment", "project_pitch")
 
     # Default to all approved projects
     queryset = (
         Project.objects.filter(is_approved=True)
-        .prefetch_related("tags", "pitches")
+        .prefetch_related("tags")
         .select_related("owner", "organization")
     )
     semester_filter_key = "enrollments__semester"
-    search_fields = (
-        "name",
-        "owner__first_name",
-        "owner__last_name",
-        "owner__rcs_id",
-        "description",
-        "tags__name",
-    )
 
     def get_queryset(self):
         """Apply filters (semester is already handled)."""
@@ -101,53 +101,60 @@ class ProjectIndexView(
         data = super().get_context_data(**kwargs)
         data["organizations"] = Organization.objects.all()
         data["is_seeking_members"] = self.is_seeking_members
-        data["total_count"] = self.get_queryset().count()
-        paginator = Paginator(self.get_queryset(), self.paginate_by)
-
-        page = self.request.GET.get("page")
-
-        try:
-            projects = paginator.page(page)
-        except PageNotAnInteger:
-            projects = paginator.page(1)
-        except (EmptyPage, InvalidPage):
-            projects = paginator.page(paginator.num_pages)
+        data["total_count"] = data["page_obj"].total_count
 
+        projects = data["projects"]
         projects_rows = []
-        enrollments = Enrollment.objects.filter(project__in=projects).select_related(
+        enrollments = Enrollment.objects.filter(
+            project__in=[project.pk for project in projects]
+        ).select_related(
             "user"
         )
         if self.target_semester:
             enrollments = enrollments.filter(
                 semester=self.target_semester
             ).select_related("semester")
+            pitches_by_project_id = group_related_rows(
+                ProjectPitch.objects.filter(
+                    project__in=[project.pk for project in projects],
+                    semester=self.target_semester,
+                ),
+                "project_id",
+            )
 
             if self.request.user.is_authenticated:
                 data["can_create_project_check"] = CheckUserCanCreateProject().check(
                     self.request.user, self.target_semester
                 )
+        enrollments_by_project_id = group_related_rows(enrollments, "project_id")
+        if not self.target_semester:
+            # Every semester each project ran, resolved from the semester registry
+            semester_ids_by_project_id = defaultdict(set)
+            for project_id, semester_id in (
+                enrollments.values_list("project_id", "semester_id").distinct().order_by()
+            ):
+                semester_ids_by_project_id[project_id].add(semester_id)
+            semester_registry = get_semester_registry()
 
         for project in projects:
+            project_enrollments = enrollments_by_project_id.get(project.pk, [])
             projects_row = {
                 "project": project,
-                "enrollments": len(
-                    [e for e in enrollments if e.project_id == project.pk]
-                ),
+                "enrollments": len(project_enrollments),
             }
             if self.target_semester:
                 projects_row["leads"] = [
-                    e
-                    for e in enrollments
-                    if e.project_id == project.pk and e.is_project_lead is True
+                    e for e in project_enrollments if e.is_project_lead is True
                 ]
                 projects_row["pitch"] = next(
-                    (
-                        pitch
-                        for pitch in project.pitches.all()
-                        if pitch.semester_id == self.target_semester.pk
-                    ),
-                    None,
+                    iter(pitches_by_project_id.get(project.pk, [])), None
                 )
+            else:
+                projects_row["semesters"] = [
+                    semester
+                    for semester in semester_registry.semesters
+                    if semester.pk in semester_ids_by_project_id[project.pk]
+                ]
             projects_rows.append(projects_row)
 
         data["projects_rows"] = projects_rows
@@ -167,7 +174,7 @@ def project_detail(request: HttpRequest, slug: str) -> HttpResponse:
     context: dict[str, Any] = {"project": project} | target_semester_context(request)
 
     if request.user.is_authenticated:
-        active_enrollment = request.user.get_active_enrollment()
+        active_enrollment = request.active.enrollment
         is_owner_or_lead = (
             (active_enrollment.project == project and active_enrollment.is_project_lead)
             if active_enrollment
@@ -189,11 +196,13 @@ def project_detail(request: HttpRequest, slug: str) -> HttpResponse:
     else:
         context["enrollments_by_semester"] = project.get_all_teams()
 
-    # Fetch project repositories
-    try:
-        context["repositories"] = project.get_repositories(github.client_factory())
-    except TransportServerError:
-        context["repositories"] = []
+    # Repository details are fetched from GitHub in the background, never during the request
+    repositories, is_stale = project.get_cached_repositories()
+    if is_stale and project.claim_repositories_refresh():
+        tasks.refresh_project_repositories.delay(project.pk)
+    context["repositories"] = repositories
+    if repositories is None:
+        context["repository_urls"] = project.repositories.values_list("url", flat=True)
 
     return TemplateResponse(request, "portal/projects/detail.html", context)
 
@@ -249,7 +258,7 @@ class ProjectCreateView(
     )
 
     def get(self, request, *args, **kwargs):
-        active_semester = Semester.get_active()
+        active_semester = self.request.active.semester
 
         check = CheckUserCanCreateProject().check(self.request.user, active_semester)
 
@@ -263,7 +272,7 @@ class ProjectCreateView(
         return super().get(request, *args, **kwargs)
 
     def form_valid(self, form):
-        active_semester = Semester.get_active()
+        active_semester = self.request.active.semester
         if not CheckUserCanCreateProject().passes(self.request.user, active_semester, None):
             messages.error(
                 self.request, "You are not currently eligible to create new projects."
@@ -281,6 +290,7 @@ class ProjectCreateView(
             user=self.request.user,
             defaults={"is_project_lead": True, "project": form.instance},
         )
+        self.request.active.clear_enrollment()
         return response
 
 
@@ -298,7 +308,7 @@ class ProjectAddPitch(CreateView, LoginRequiredMixin, SuccessMessageMixin):
         return data
 
     def get(self, request, *args: str, **kwargs: Any):
-        self.semester = Semester.get_active()
+        self.semester = self.request.active.semester
         self.project = Project.objects.get(slug=self.kwargs["slug"])
 
         check = CheckUserCanPitchProject().check(
@@ -314,7 +324,7 @@ class ProjectAddPitch(CreateView, LoginRequiredMixin, SuccessMessageMixin):
         return super().get(request, *args, **kwargs)
 
     def form_valid(self, form):
-        self.semester = Semester.get_active()
+        self.semester = self.request.active.semester
         self.project = Project.objects.get(slug=self.kwargs["slug"])
 
         check = CheckUserCanPitchProject().check(
@@ -346,7 +356,7 @@ class ProjectAddProposal(CreateView, LoginRequiredMixin, SuccessMessageMixin):
         return data
 
     def get(self, request, *args: str, **kwargs: Any):
-        self.semester = Semester.get_active()
+        self.semester = self.request.active.semester
         self.project = Project.objects.get(slug=self.kwargs["slug"])
 
         # Check permission to submit proposal
@@ -363,7 +373,7 @@ class ProjectAddProposal(CreateView, LoginRequiredMixin, SuccessMessageMixin):
         return super().get(request, *args, **kwargs)
 
     def form_valid(self, form):
-        self.semester = Semester.get_active()
+        self.semester = self.request.active.semester
         self.project = Project.objects.get(slug=self.kwargs["slug"])
 
         # Check permission to submit proposal
@@ -1,9 +1,10 @@
 """Views related to small groups."""
+from django.db.models import Prefetch, prefetch_related_objects
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import get_object_or_404
 from django.template.response import TemplateResponse
 
-from ..models import SmallGroup
+from ..models import Enrollment, SmallGroup
 from . import SearchableListView, SemesterFilteredListView
 
 
@@ -12,16 +13,22 @@ class SmallGroupIndexView(SearchableListView, SemesterFilteredListView):
     template_name = "portal/small_groups/index.html"
     context_object_name = "small_groups"
     queryset = SmallGroup.objects.select_related()
-    search_fields = (
-        "name",
-        "projects__name",
-        "mentors__rcs_id",
-        "mentors__first_name",
-        "mentors__last_name",
-    )
 
 def small_group_detail(request: HttpRequest, pk: int) -> HttpResponse:
     """Fetches and displays an overview for a particular small group."""
+    small_group = get_object_or_404(SmallGroup.objects.select_related("semester"), pk=pk)
+    # Each project card lists that project's team for the small group's semester
+    prefetch_related_objects(
+        [small_group],
+        "mentors",
+        Prefetch(
+            "projects__enrollments",
+            queryset=Enrollment.objects.filter(semester_id=small_group.semester_id)
+            .select_related("user", "semester")
+            .order_by("-is_project_lead"),
+            to_attr="semester_enrollments",
+        ),
+    )
     return TemplateResponse(request, "portal/small_groups/detail.html", {
-        "small_group": get_object_or_404(SmallGroup, pk=pk)
+        "small_group": small_group
     })
@@ -1,80 +1,82 @@
 from typing import Any
 
 from django.contrib import messages
-from django.contrib.auth.decorators import login_required
-from django.core.paginator import EmptyPage, InvalidPage, PageNotAnInteger, Paginator
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.db.models import F
+from django.db.models.functions import Lower
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.template.response import TemplateResponse
 from django.urls import reverse
 
+from portal.exports import (
+    ENROLLMENT_EXPORT_COLUMNS,
+    iter_semester_enrollment_rows,
+    streaming_csv_response,
+)
+from portal.views.admin import is_admin
+
 from ..models import Enrollment, Organization, Project, Semester, User
 from . import (
+    KeysetPaginatedListView,
     OrganizationFilteredListView,
     SearchableListView,
     SemesterFilteredListView,
+    group_related_rows,
     target_semester_context,
 )
 
 
-class UserIndexView(SearchableListView, OrganizationFilteredListView, SemesterFilteredListView):
+class UserIndexView(
+    KeysetPaginatedListView,
+    SearchableListView,
+    OrganizationFilteredListView,
+    SemesterFilteredListView,
+):
     template_name = "portal/users/index.html"
     context_object_name = "users"
     paginate_by = 50
+    keyset_ordering = (
+        ("first_name", Lower("first_name")),
+        ("last_name", Lower("last_name")),
+        ("pk", F("pk")),
+    )
+    count_cache_tags = ("user", "enrollment")
 
     # Default to all active RPI members
     queryset = User.objects.approved().select_related("organization")
 
     semester_filter_key = "enrollments__semester"
-    search_fields = (
-        "first_name",
-        "last_name",
-        "rcs_id",
-        "graduation_year",
-        "enrollments__project__name",
-    )
 
     def get_context_data(self, **kwargs):
         data = super().get_context_data(**kwargs)
 
         data["organizations"] = Organization.objects.all()
-        data["total_count"] = self.get_queryset().count()
-
-        paginator = Paginator(self.get_queryset(), self.paginate_by)
+        data["total_count"] = data["page_obj"].total_count
 
-        page = self.request.GET.get("page")
-
-        try:
-            users = paginator.page(page)
-        except PageNotAnInteger:
-            users = paginator.page(1)
-        except (EmptyPage, InvalidPage):
-            users = paginator.page(paginator.num_pages)
-
-        enrollments = Enrollment.objects.filter(user__in=users).select_related(
+        users = data["users"]
+        enrollments = Enrollment.objects.filter(user__in=[user.pk for user in users]).select_related(
             "semester", "project"
         )
 
         if self.target_semester:
             enrollments = enrollments.filter(semester=self.target_semester)
+        enrollments_by_user_id = group_related_rows(enrollments, "user_id")
 
         user_rows = []
         for user in users:
             user_row = {
                 "user": user,
             }
+            user_enrollments = enrollments_by_user_id.get(user.pk, [])
 
             if self.target_semester:
-                user_row["enrollment"] = next(
-                    (e for e in enrollments if e.user_id == user.pk), None
-                )
+                user_row["enrollment"] = next(iter(user_enrollments), None)
                 user_row["project"] = (
                     user_row["enrollment"].project if user_row["enrollment"] else None
                 )
             else:
-                user_row["enrollments"] = [
-                    e for e in enrollments if e.user_id == user.pk
-                ]
+                user_row["enrollments"] = user_enrollments
 
             user_rows.append(user_row)
 
@@ -94,6 +96,7 @@ def user_detail(request: HttpRequest, pk: int) -> HttpResponse:
         context["enrollment"] = Enrollment.objects.filter(semester_id=context["target_semester"].pk, user_id=user.pk).first()
     else:
         context["enrollments"] = user.enrollments.select_related("semester", "project")
+    context["weekly_contributions"] = user.weekly_contributions.all()[:8]
 
     return TemplateResponse(request, "portal/users/detail.html", context)
 
@@ -127,5 +130,24 @@ def enroll_user(request, pk: str):
             semester=semester,
             defaults={"project": project, "credits": credits, "is_project_lead": is_project_lead},
         )
+        if user.pk == request.user.pk:
+            request.active.clear_enrollment()
 
     return redirect("/")
+
+
+@login_required
+@user_passes_test(is_admin)
+def export_semester_enrollments(request: HttpRequest) -> HttpResponse:
+    """Streams every enrollment of a semester, with the user's name and project, as a CSV."""
+    context = target_semester_context(request, default_to_active_semester=True)
+    if "target_semester" not in context:
+        messages.error(request, "No such semester found.")
+        return redirect(reverse("users_index"))
+
+    semester: Semester = context["target_semester"]
+    return streaming_csv_response(
+        f"RCOS {semester} Enrollments",
+        ENROLLMENT_EXPORT_COLUMNS.keys(),
+        iter_semester_enrollment_rows(semester.pk),
+    )
@@ -103,6 +103,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "portal.middleware.ActiveContextMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -330,6 +331,13 @@ else:
         }
     }
 
+# Buffer submitted attendance in a Redis stream and insert it in batches from a Celery worker,
+# instead of inserting a row per submission (see portal/attendance_buffer.py)
+ATTENDANCE_WRITE_BEHIND = os.environ.get("ATTENDANCE_WRITE_BEHIND", "false") == "true"
+ATTENDANCE_BUFFER_REDIS_URL = os.environ["REDIS_URL"]
+# How long submissions wait in the buffer, at most, before the flush they scheduled runs
+ATTENDANCE_BUFFER_FLUSH_DELAY = 5
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -353,3 +361,18 @@ LOGGING = {
 
 CELERY_BROKER_URL = os.environ["REDIS_URL"]
 CELERY_RESULT_BACKEND = os.environ["REDIS_URL"]
+CELERY_BEAT_SCHEDULE = {
+    "refresh-active-project-repositories": {
+        "task": "portal.tasks.refresh_active_project_repositories",
+        "schedule": 60 * 30,
+    },
+    "ingest-contributions": {
+        "task": "portal.tasks.ingest_contributions",
+        "schedule": 60 * 60,
+    },
+    # Submissions schedule their own flush, this only catches ones left by a failed flush
+    "flush-attendance-buffer": {
+        "task": "portal.tasks.flush_attendance_buffer",
+        "schedule": 60,
+    },
+}
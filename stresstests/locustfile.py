@@ -1,171 +1,244 @@
-from locust import FastHttpUser, run_single_user, task
-
-
-class rcos_up_railway_app(FastHttpUser):
-    host = "https://rcos.up.railway.app"
-    default_headers = {
-        "accept-encoding": "gzip, deflate, br",
-        "accept-language": "en-US,en;q=0.9",
-        "sec-ch-ua": '"Not_A Brand";v="99", "Google Chrome";v="109", "Chromium";v="109"',
-        "sec-ch-ua-mobile": "?0",
-        "sec-ch-ua-platform": '"macOS"',
-        "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/109.0.0.0 Safari/537.36",
-    }
-
-    @task
-    def t(self):
-        with self.client.request(
-            "GET",
-            "/projects/?semester=",
-            headers={
-                "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9",
-                "referer": "https://rcos.up.railway.app/projects/?semester=202301",
-                "sec-fetch-dest": "document",
-                "sec-fetch-mode": "navigate",
-                "sec-fetch-site": "same-origin",
-                "sec-fetch-user": "?1",
-                "upgrade-insecure-requests": "1",
-            },
-            catch_response=True,
-        ):
-            pass
-        with self.client.request(
-            "GET",
-            "/",
-            headers={
-                "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9",
-                "referer": "https://rcos.up.railway.app/",
-                "sec-fetch-dest": "document",
-                "sec-fetch-mode": "navigate",
-                "sec-fetch-site": "same-origin",
-                "sec-fetch-user": "?1",
-                "upgrade-insecure-requests": "1",
-            },
-            catch_response=True,
-        ):
-            pass
-        with self.client.request(
-            "GET",
-            "/users/?semester=202301",
-            headers={
-                "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9",
-                "referer": "https://rcos.up.railway.app/",
-                "sec-fetch-dest": "document",
-                "sec-fetch-mode": "navigate",
-                "sec-fetch-site": "same-origin",
-                "sec-fetch-user": "?1",
-                "upgrade-insecure-requests": "1",
-            },
-            catch_response=True,
-        ):
-            pass
-        with self.client.request(
-            "GET",
-            "/projects/?semester=202301",
-            headers={
-                "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9",
-                "referer": "https://rcos.up.railway.app/users/?semester=202301",
-                "sec-fetch-dest": "document",
-                "sec-fetch-mode": "navigate",
-                "sec-fetch-site": "same-origin",
-                "sec-fetch-user": "?1",
-                "upgrade-insecure-requests": "1",
-            },
-            catch_response=True,
-        ):
-            pass
-        with self.client.request(
-            "GET",
-            "/projects/aihwkit?semester=202301",
-            headers={
-                "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9",
-                "referer": "https://rcos.up.railway.app/projects/?semester=202301",
-                "sec-fetch-dest": "document",
-                "sec-fetch-mode": "navigate",
-                "sec-fetch-site": "same-origin",
-                "sec-fetch-user": "?1",
-                "upgrade-insecure-requests": "1",
-            },
-            catch_response=True,
-        ):
-            pass
-        with self.client.request(
-            "GET",
-            "/projects/bidos?semester=202301",
-            headers={
-                "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9",
-                "referer": "https://rcos.up.railway.app/projects/?semester=202301",
-                "sec-fetch-dest": "document",
-                "sec-fetch-mode": "navigate",
-                "sec-fetch-site": "same-origin",
-                "sec-fetch-user": "?1",
-                "upgrade-insecure-requests": "1",
-            },
-            catch_response=True,
-        ):
-            pass
-        with self.client.request(
-            "GET",
-            "/meetings/?semester=202301",
-            headers={
-                "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9",
-                "referer": "https://rcos.up.railway.app/projects/bidos?semester=202301",
-                "sec-fetch-dest": "document",
-                "sec-fetch-mode": "navigate",
-                "sec-fetch-site": "same-origin",
-                "sec-fetch-user": "?1",
-                "upgrade-insecure-requests": "1",
-            },
-            catch_response=True,
-        ):
-            pass
-        with self.client.request(
-            "GET",
-            "/meetings/15",
-            headers={
-                "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9",
-                "referer": "https://rcos.up.railway.app/meetings/?semester=202301",
-                "sec-fetch-dest": "document",
-                "sec-fetch-mode": "navigate",
-                "sec-fetch-site": "same-origin",
-                "sec-fetch-user": "?1",
-                "upgrade-insecure-requests": "1",
-            },
-            catch_response=True,
-        ):
-            pass
-
-        with self.client.request(
-            "GET",
-            "/projects/?semester=202301",
-            headers={
-                "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9",
-                "referer": "https://rcos.up.railway.app/meetings/15",
-                "sec-fetch-dest": "document",
-                "sec-fetch-mode": "navigate",
-                "sec-fetch-site": "same-origin",
-                "sec-fetch-user": "?1",
-                "upgrade-insecure-requests": "1",
-            },
-            catch_response=True,
-        ):
-            pass
-        with self.client.request(
-            "GET",
-            "/projects/?semester=",
-            headers={
-                "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9",
-                "referer": "https://rcos.up.railway.app/projects/?semester=202301",
-                "sec-fetch-dest": "document",
-                "sec-fetch-mode": "navigate",
-                "sec-fetch-site": "same-origin",
-                "sec-fetch-user": "?1",
-                "upgrade-insecure-requests": "1",
+"""Load test suite for the portal.
+
+Simulates four kinds of visitors, weighted roughly like real traffic: anonymous browsers, students (who
+submit the attendance code of the ongoing meeting when they arrive), mentors verifying attendance, and
+admins exporting attendance. Everything it requests comes from the manifest written by
+`manage.py prepare_load_test`, and a p50/p95/p99 summary per route is written when the run ends.
+"""
+
+import json
+import random
+import secrets
+from itertools import cycle
+
+from locust import FastHttpUser, between, events, task
+from locust.runners import WorkerRunner
+from requests.cookies import create_cookie
+
+manifest: dict = {}
+personas: dict[str, cycle] = {}
+
+
+@events.init_command_line_parser.add_listener
+def add_arguments(parser):
+    parser.add_argument(
+        "--manifest",
+        default="stresstests/manifest.json",
+        help="The manifest written by `manage.py prepare_load_test`",
+    )
+    parser.add_argument(
+        "--percentile-report",
+        default="stresstests/percentiles.json",
+        help="Where to write the p50/p95/p99 response times of every route",
+    )
+
+
+@events.init.add_listener
+def load_manifest(environment, **kwargs):
+    with open(environment.parsed_options.manifest) as manifest_file:
+        manifest.update(json.load(manifest_file))
+    for persona in ("students", "mentors", "admins"):
+        personas[persona] = cycle(manifest[persona])
+
+
+@events.quitting.add_listener
+def write_percentile_report(environment, **kwargs):
+    if isinstance(environment.runner, WorkerRunner):
+        # Only the master has the aggregated stats
+        return
+
+    report = [
+        {
+            "route": entry.name,
+            "method": entry.method,
+            "requests": entry.num_requests,
+            "failures": entry.num_failures,
+            "rps": round(entry.total_rps, 2),
+            "p50": entry.get_response_time_percentile(0.5),
+            "p95": entry.get_response_time_percentile(0.95),
+            "p99": entry.get_response_time_percentile(0.99),
+        }
+        for entry in sorted(
+            environment.stats.entries.values(), key=lambda entry: entry.name
+        )
+        if entry.num_requests
+    ]
+    with open(environment.parsed_options.percentile_report, "w") as report_file:
+        json.dump(report, report_file, indent=2)
+
+    print(f"{'Route':<48} {'Reqs':>7} {'Fails':>6} {'p50':>7} {'p95':>7} {'p99':>7}")
+    for row in report:
+        print(
+            f"{row['method'] + ' ' + row['route']:<48} {row['requests']:>7} {row['failures']:>6} "
+            f"{row['p50']:>7} {row['p95']:>7} {row['p99']:>7}"
+        )
+
+
+class PortalUser(FastHttpUser):
+    """Browses the public pages. Subclasses log in as one of the manifest's personas."""
+
+    abstract = True
+    wait_time = between(3, 10)
+    persona: str | None = None
+
+    def on_start(self):
+        self.semester = manifest["semester"]
+        self.csrf_token = secrets.token_hex(16)
+        # Django accepts any well-formed token as long as the cookie and header match
+        self.set_cookie("csrftoken", self.csrf_token)
+        if self.persona:
+            self.account = next(personas[self.persona])
+            self.set_cookie("sessionid", self.account["session"])
+
+    def set_cookie(self, name: str, value: str):
+        # The portal's cookies are `Secure`, which would keep them off plain HTTP hosts like
+        # a local runserver, so they're added to the jar without the flag (or a domain, since
+        # every request goes to the one host)
+        self.client.cookiejar.set_cookie(create_cookie(name, value))
+
+    def post(self, path: str, data: dict, name: str):
+        return self.client.post(
+            path,
+            data=data,
+            headers={"X-CSRFToken": self.csrf_token, "Referer": self.host + path},
+            name=name,
+        )
+
+    @task(4)
+    def index(self):
+        self.client.get("/", name="/")
+
+    @task(3)
+    def projects_index(self):
+        self.client.get(f"/projects/?semester={self.semester}", name="/projects/")
+
+    @task(3)
+    def project_detail(self):
+        slug = random.choice(manifest["project_slugs"])
+        self.client.get(
+            f"/projects/{slug}?semester={self.semester}", name="/projects/[slug]"
+        )
+
+    @task(2)
+    def users_index(self):
+        self.client.get(f"/users/?semester={self.semester}", name="/users/")
+
+    @task(1)
+    def user_detail(self):
+        user_id = random.choice(manifest["user_ids"])
+        self.client.get(
+            f"/users/{user_id}?semester={self.semester}", name="/users/[id]"
+        )
+
+    @task(2)
+    def meetings_index(self):
+        self.client.get("/meetings/", name="/meetings/")
+
+    @task(1)
+    def small_groups(self):
+        self.client.get(
+            f"/small_groups/?semester={self.semester}", name="/small_groups/"
+        )
+        small_group_id = random.choice(manifest["small_group_ids"])
+        self.client.get(f"/small_groups/{small_group_id}", name="/small_groups/[id]")
+
+    @task(1)
+    def organizations(self):
+        self.client.get("/organizations/", name="/organizations/")
+
+    @task(1)
+    def handbook(self):
+        self.client.get("/handbook", name="/handbook")
+
+
+class AnonymousUser(PortalUser):
+    weight = 12
+
+
+class StudentUser(PortalUser):
+    """Submits the ongoing meeting's attendance code on arrival, then browses the portal. Spawning
+    many at once (see meeting_burst.py) reproduces the start-of-meeting spike."""
+
+    weight = 6
+    persona = "students"
+
+    def on_start(self):
+        super().on_start()
+        self.submit_attendance()
+
+    def submit_attendance(self):
+        self.client.get("/attend", name="/attend")
+        self.post(
+            "/attend", {"code": manifest["burst"]["code"]}, name="/attend [submit]"
+        )
+
+    @task(2)
+    def user_attendance(self):
+        self.client.get(
+            f"/users/{self.account['user_id']}/attendance?semester={self.semester}",
+            name="/users/[id]/attendance",
+        )
+
+
+class MentorUser(PortalUser):
+    """Watches the ongoing meeting's attendance and verifies students in small batches."""
+
+    weight = 1
+    persona = "mentors"
+
+    @task(6)
+    def meeting_detail(self):
+        self.client.get(
+            f"/meetings/{manifest['burst']['meeting_id']}", name="/meetings/[id]"
+        )
+
+    @task(4)
+    def verify_attendance(self):
+        students = random.sample(
+            manifest["students"], k=min(3, len(manifest["students"]))
+        )
+        self.post(
+            "/meetings/attendance/verify",
+            {
+                "meeting": manifest["burst"]["meeting_id"],
+                "rcs_id": ", ".join(student["rcs_id"] for student in students),
+                "action": "accept",
             },
-            catch_response=True,
-        ):
-            pass
+            name="/meetings/attendance/verify",
+        )
+
+
+class AdminUser(PortalUser):
+    """Pulls the semester's attendance pages and exports while everyone else is busy."""
+
+    fixed_count = 2
+    persona = "admins"
+    wait_time = between(10, 30)
+
+    @task(2)
+    def semester_attendance(self):
+        self.client.get(
+            f"/meetings/attendance/semester?semester={self.semester}",
+            name="/meetings/attendance/semester",
+        )
+
+    @task(2)
+    def export_semester_attendance_csv(self):
+        self.client.get(
+            f"/meetings/attendance/semester/export?semester={self.semester}",
+            name="/meetings/attendance/semester/export [csv]",
+        )
 
+    @task(1)
+    def export_semester_attendance_json(self):
+        self.client.get(
+            f"/meetings/attendance/semester/export?semester={self.semester}&format=json",
+            name="/meetings/attendance/semester/export [json]",
+        )
 
-if __name__ == "__main__":
-    run_single_user(rcos_up_railway_app)
+    @task(2)
+    def export_meeting_attendance(self):
+        meeting_id = random.choice(
+            [*manifest["meeting_ids"], manifest["burst"]["meeting_id"]]
+        )
+        self.client.get(f"/meetings/{meeting_id}/export", name="/meetings/[id]/export")
@@ -0,0 +1,44 @@
+"""Runs the load suite in the shape of a meeting: steady background browsing, then every student
+arriving (and submitting the attendance code) within the first minute, then the meeting winding down.
+
+    locust -f stresstests/meeting_burst.py --host https://staging.example.com --headless
+"""
+
+from locust import LoadTestShape, events
+from locustfile import *  # noqa: F403 (the user classes and the manifest and report listeners)
+
+
+@events.init_command_line_parser.add_listener
+def add_burst_arguments(parser):
+    parser.add_argument("--baseline-users", type=int, default=50)
+    parser.add_argument(
+        "--burst-users",
+        type=int,
+        default=600,
+        help="How many users are online at the height of the attendance spike",
+    )
+    parser.add_argument(
+        "--burst-seconds",
+        type=int,
+        default=60,
+        help="How quickly the burst users all arrive",
+    )
+
+
+class MeetingBurstShape(LoadTestShape):
+    def tick(self):
+        options = self.runner.environment.parsed_options
+        burst_spawn_rate = options.burst_users / options.burst_seconds
+        stages = (
+            # (until, users, spawn rate)
+            (120, options.baseline_users, 10),
+            (120 + options.burst_seconds, options.burst_users, burst_spawn_rate),
+            (600, options.burst_users, burst_spawn_rate),
+            (720, options.baseline_users, 50),
+        )
+
+        run_time = self.get_run_time()
+        for ends_at, users, spawn_rate in stages:
+            if run_time < ends_at:
+                return users, spawn_rate
+        return None